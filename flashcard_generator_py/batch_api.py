@@ -0,0 +1,401 @@
+# batch_api.py
+#
+# Offline deck builds through the OpenAI Batch API. Every chunk of every document becomes
+# one line of a JSONL request file; the batch runs within 24 hours at half the price and
+# outside the per-minute rate limits; collect_batches() maps the answers back to their
+# documents and writes the decks. Everything needed between those steps is kept in
+# <work>/manifest.json, so submit, status and collect can be separate runs (or machines).
+#
+# LocalBatchBackend stands in for the API and answers with cards made from each chunk's own
+# sentences, so the whole flow can be tried without network access or an API key. Those
+# placeholder cards never go near the response cache: they're keyed like real answers and
+# would be served to later live runs.
+
+import json
+import os
+import re
+import shutil
+import time
+
+from cards import Flashcard
+from chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from clients import get_client
+from dedup import dedupe_flashcards, DEFAULT_DEDUP_THRESHOLD
+from engine import build_messages, json_response_format
+from parsing import merge_flashcards, IncrementalCardParser, JsonCardParser
+from pipeline import pdf_pages
+from preprocess import useful_chunks, SkipReport, DEFAULT_MIN_DENSITY
+from tracing import get_tracer, price_for
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# OpenAI takes at most 50,000 requests and 200 MB per batch file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 190 * 1024 * 1024
+# Batch requests are billed at half the normal price
+BATCH_PRICE_FACTOR = 0.5
+DEFAULT_POLL_INTERVAL = 60
+FINISHED = ('completed', 'failed', 'expired', 'cancelled')
+MANIFEST = 'manifest.json'
+
+_SENTENCE = re.compile(r'[^.!?\n]{20,}[.!?]')
+
+
+def read_document(path, pages=None):
+    if path.lower().endswith('.pdf'):
+        return pdf_pages(path, pages)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return [f.read()]
+
+
+def load_manifest(work_dir):
+    path = os.path.join(work_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(work_dir, manifest):
+    path = os.path.join(work_dir, MANIFEST)
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.part', path)
+
+
+def request_line(engine, key, text):
+    model = engine.models[0]
+    body = dict(engine.params, model=model, messages=build_messages(text, engine.response_format))
+    if engine.response_format == 'json':
+        body['response_format'] = json_response_format(model)
+    # The cache key doubles as custom_id, so a chunk shared by two documents is only sent once
+    return json.dumps({"custom_id": key, "method": "POST", "url": BATCH_ENDPOINT, "body": body}) + "\n"
+
+
+def prepare_batches(documents, work_dir, engine, pages=None, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                    overlap_tokens=DEFAULT_OVERLAP_TOKENS, dedup_threshold=DEFAULT_DEDUP_THRESHOLD,
+                    deck_options=None, backend='openai', skip_boilerplate=True, min_density=DEFAULT_MIN_DENSITY):
+    # documents is a list of (source path, output file). Chunks already in engine.cache are
+    # not sent again, which is also how a resubmit only retries what failed last time.
+    # The request goes to the first model; results are cached under the whole chain's key,
+    # like a live run where the first model answered.
+    cache = engine.cache if backend != 'local' else None
+    os.makedirs(work_dir, exist_ok=True)
+    manifest = {
+        'backend': backend,
+        'models': list(engine.models),
+        'params': engine.params,
+        'response_format': engine.response_format,
+        'dedup_threshold': dedup_threshold,
+        'deck_options': deck_options or {},
+        'created': time.time(),
+        'collected': False,
+        'documents': [],
+        'batches': [],
+    }
+    sent = set()
+    batch_file = None
+
+    def start_batch():
+        path = os.path.join(work_dir, f"requests-{len(manifest['batches']):03d}.jsonl")
+        manifest['batches'].append({'file': os.path.basename(path), 'requests': 0, 'bytes': 0, 'id': None,
+                                    'status': None, 'output_file_id': None, 'error_file_id': None})
+        return open(path, 'w', encoding='utf-8')
+
+    try:
+        for source, output_file in documents:
+            keys = []
+            cached = 0
+            report = SkipReport()
+            for text in useful_chunks(iter(read_document(source, pages)), chunk_tokens, overlap_tokens, report,
+                                      skip_boilerplate, min_density):
+                key = engine.chunk_cache_key(text)
+                keys.append(key)
+                if key in sent:
+                    continue
+                if cache is not None and cache.get(key) is not None:
+                    cached += 1
+                    continue
+                line = request_line(engine, key, text)
+                size = len(line.encode('utf-8'))
+                batch = manifest['batches'][-1] if manifest['batches'] else None
+                if batch is None or batch['requests'] >= MAX_BATCH_REQUESTS or batch['bytes'] + size > MAX_BATCH_BYTES:
+                    if batch_file is not None:
+                        batch_file.close()
+                    batch_file = start_batch()
+                    batch = manifest['batches'][-1]
+                batch_file.write(line)
+                batch['requests'] += 1
+                batch['bytes'] += size
+                sent.add(key)
+            if skip_boilerplate:
+                report.finish(os.path.basename(source))
+            manifest['documents'].append({'source': source, 'output_file': output_file, 'chunks': keys,
+                                          'cached': cached, 'status': None, 'cards': None,
+                                          'skipped_chars': report.chars_skipped})
+    finally:
+        if batch_file is not None:
+            batch_file.close()
+    save_manifest(work_dir, manifest)
+    return manifest
+
+
+def submit_batches(manifest, work_dir, backend):
+    for batch in manifest['batches']:
+        if batch['id'] is None:
+            batch['id'] = backend.submit(os.path.join(work_dir, batch['file']))
+            batch['status'] = 'validating'
+            # Saved after every upload so a crash midway doesn't submit the same file twice
+            save_manifest(work_dir, manifest)
+    return manifest
+
+
+def refresh_batches(manifest, work_dir, backend):
+    for batch in manifest['batches']:
+        if batch['id'] is None or batch['status'] in FINISHED:
+            continue
+        batch.update(backend.retrieve(batch['id']))
+    save_manifest(work_dir, manifest)
+    return manifest
+
+
+def batches_finished(manifest):
+    return all(batch['status'] in FINISHED for batch in manifest['batches'])
+
+
+def wait_for_batches(manifest, work_dir, backend, poll_interval=DEFAULT_POLL_INTERVAL, on_poll=None):
+    while True:
+        refresh_batches(manifest, work_dir, backend)
+        if on_poll:
+            on_poll(manifest)
+        if batches_finished(manifest):
+            return manifest
+        time.sleep(poll_interval)
+
+
+def _new_parser(response_format):
+    return JsonCardParser() if response_format == 'json' else IncrementalCardParser()
+
+
+def read_results(manifest, work_dir, backend):
+    # {custom_id: cards} for every request that came back with usable cards, plus the errors
+    # and {custom_id: model} saying which model answered
+    results = {}
+    errors = {}
+    models = {}
+    tracer = get_tracer()
+    for batch in manifest['batches']:
+        for kind in ('output_file_id', 'error_file_id'):
+            file_id = batch.get(kind)
+            if not file_id:
+                continue
+            local = os.path.join(work_dir, f"{os.path.splitext(batch['file'])[0]}.{kind.split('_')[0]}.jsonl")
+            if not os.path.exists(local):
+                with open(local + '.part', 'w', encoding='utf-8') as f:
+                    f.write(backend.download(file_id))
+                os.replace(local + '.part', local)
+            with open(local, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    key = item.get('custom_id')
+                    response = item.get('response') or {}
+                    body = response.get('body') or {}
+                    if item.get('error') or response.get('status_code') != 200:
+                        error = item.get('error') or body.get('error') or {}
+                        errors[key] = error.get('message') or f"HTTP {response.get('status_code')}"
+                        continue
+                    usage = body.get('usage') or {}
+                    models[key] = body.get('model') or manifest['models'][0]
+                    tracer.add_usage(models[key], usage.get('prompt_tokens'), usage.get('completion_tokens'))
+                    content = ((body.get('choices') or [{}])[0].get('message') or {}).get('content') or ''
+                    parser = _new_parser(manifest['response_format'])
+                    cards = parser.feed(content) + parser.close()
+                    if cards:
+                        results[key] = cards
+                    else:
+                        errors[key] = "No valid flashcards generated"
+    return results, errors, models
+
+
+def collect_batches(manifest, work_dir, backend, cache=None):
+    # Writes every document whose chunks all have cards; the rest are reported and can be
+    # resubmitted (their finished chunks are in the cache by then, so only the gaps go out)
+    from flashcard_generator import create_html
+
+    if manifest['backend'] == 'local':
+        cache = None
+    results, errors, models = read_results(manifest, work_dir, backend)
+    if cache is not None:
+        for key, cards in results.items():
+            cache.put(key, cards)
+    for document in manifest['documents']:
+        card_lists = []
+        missing = []
+        for seq, key in enumerate(document['chunks']):
+            cards = results.get(key)
+            if cards is None and cache is not None:
+                cards = cache.get(key)
+            if cards is None:
+                missing.append(errors.get(key, "no result"))
+            else:
+                card_lists.append([Flashcard.from_text(card, document['source'], seq, model=models.get(key))
+                                   for card in cards])
+        if missing:
+            document['status'] = 'failed'
+            document['error'] = f"{len(missing)} of {len(document['chunks'])} chunks have no cards: {missing[0]}"
+            continue
+        cards = merge_flashcards(card_lists)
+        if manifest['dedup_threshold']:
+            cards = dedupe_flashcards(cards, manifest['dedup_threshold'])
+        ok, _ = create_html(cards, document['output_file'], **manifest['deck_options'])
+        document['status'] = 'done' if ok else 'failed'
+        document['cards'] = len(cards) if ok else None
+        document['error'] = None if ok else "Could not write the deck"
+    manifest['collected'] = True
+    save_manifest(work_dir, manifest)
+    return manifest
+
+
+def estimated_cost(summary):
+    # summary is tracing's run summary; returns (cost at batch prices, models without a price)
+    cost = 0.0
+    unpriced = []
+    for model, usage in summary['tokens'].items():
+        price = price_for(model)
+        if price is None:
+            unpriced.append(model)
+            continue
+        cost += (usage['prompt'] * price[0] + usage['completion'] * price[1]) / 1e6 * BATCH_PRICE_FACTOR
+    return cost, unpriced
+
+
+class OpenAIBatchBackend:
+    def __init__(self, client=None):
+        self.client = client
+
+    def _client(self):
+        if self.client is None:
+            self.client = get_client()
+        return self.client
+
+    def submit(self, path):
+        client = self._client()
+        with open(path, 'rb') as f:
+            uploaded = client.files.create(file=f, purpose='batch')
+        return client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=COMPLETION_WINDOW
+        ).id
+
+    def retrieve(self, batch_id):
+        batch = self._client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'completed': counts.completed if counts else None,
+            'failed': counts.failed if counts else None,
+        }
+
+    def download(self, file_id):
+        return self._client().files.content(file_id).text
+
+
+def make_cards(text, count=5):
+    # Made-up but deterministic (question, answer) pairs from the text's sentences; the
+    # benchmarks' mock API answers with these too
+    cards = []
+    for sentence in _SENTENCE.findall(text)[:count]:
+        words = sentence.split()
+        cards.append((f"What is meant by {' '.join(words[:4])}?", sentence.strip()))
+    return cards or [("What is this text about?", text.strip()[:200] or "Nothing.")]
+
+
+def render_cards(cards, json_mode=False):
+    if json_mode:
+        return json.dumps({"cards": [{"question": q, "answer": a} for q, a in cards]})
+    return "\n\n".join(f"Q: {q}\nA: {a}" for q, a in cards)
+
+
+def canned_response(body):
+    prompt = body['messages'][-1]['content']
+    text = prompt.split('\n\n', 1)[-1].rsplit('\n\n', 1)[0]
+    return render_cards(make_cards(text), bool(body.get('response_format')))
+
+
+class LocalBatchBackend:
+    # Same interface as OpenAIBatchBackend, but batches live in `root` and are answered by
+    # responder(request body) -> content once `delay` seconds have passed
+    def __init__(self, root, responder=canned_response, delay=0.0):
+        self.root = root
+        self.responder = responder
+        self.delay = delay
+        os.makedirs(root, exist_ok=True)
+
+    def _state_path(self, batch_id):
+        return os.path.join(self.root, f"{batch_id}.json")
+
+    def submit(self, path):
+        batch_id = f"local_batch_{int(time.time() * 1000)}_{os.path.splitext(os.path.basename(path))[0]}"
+        shutil.copyfile(path, os.path.join(self.root, f"{batch_id}.input.jsonl"))
+        with open(self._state_path(batch_id), 'w', encoding='utf-8') as f:
+            json.dump({'status': 'validating', 'created': time.time()}, f)
+        return batch_id
+
+    def retrieve(self, batch_id):
+        with open(self._state_path(batch_id), encoding='utf-8') as f:
+            state = json.load(f)
+        if state['status'] == 'completed':
+            return state['result']
+        if time.time() - state['created'] < self.delay:
+            return {'status': 'in_progress', 'output_file_id': None, 'error_file_id': None,
+                    'completed': 0, 'failed': 0}
+
+        completed = failed = 0
+        with open(os.path.join(self.root, f"{batch_id}.input.jsonl"), encoding='utf-8') as source, \
+                open(os.path.join(self.root, f"{batch_id}.output.jsonl"), 'w', encoding='utf-8') as output:
+            for line in source:
+                request = json.loads(line)
+                body = request['body']
+                try:
+                    content = self.responder(body)
+                except Exception as e:
+                    # A failing responder stands in for a request the API couldn't answer
+                    output.write(json.dumps({
+                        "id": f"{batch_id}_{completed + failed}", "custom_id": request['custom_id'],
+                        "response": {"status_code": 500, "body": {"error": {"message": str(e)}}}, "error": None,
+                    }) + "\n")
+                    failed += 1
+                    continue
+                usage = {"prompt_tokens": sum(len(m['content']) for m in body['messages']) // 4,
+                         "completion_tokens": len(content) // 4}
+                output.write(json.dumps({
+                    "id": f"{batch_id}_{completed + failed}",
+                    "custom_id": request['custom_id'],
+                    "response": {"status_code": 200, "request_id": f"local_{completed}", "body": {
+                        "object": "chat.completion", "model": body['model'],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": usage,
+                    }},
+                    "error": None,
+                }) + "\n")
+                completed += 1
+        state['status'] = 'completed'
+        state['result'] = {'status': 'completed', 'output_file_id': f"{batch_id}.output.jsonl",
+                           'error_file_id': None, 'completed': completed, 'failed': failed}
+        with open(self._state_path(batch_id), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        return state['result']
+
+    def download(self, file_id):
+        with open(os.path.join(self.root, file_id), encoding='utf-8') as f:
+            return f.read()
+
+
+def make_backend(kind, work_dir):
+    if kind == 'local':
+        return LocalBatchBackend(os.path.join(work_dir, 'local'))
+    return OpenAIBatchBackend()
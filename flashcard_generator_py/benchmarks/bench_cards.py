@@ -0,0 +1,91 @@
+# bench_cards.py
+#
+# Round-trips decks of 1k / 10k / 100k cards through the JSON lines deck format and
+# reports save/load/stream times and the memory a loaded Deck takes.
+#
+#   python benchmarks/bench_cards.py [--sizes 1000 10000 100000] [--json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import Deck, Flashcard, iter_jsonl  # noqa: E402
+
+SYLLABLES = "ba ce di fo gu ka le mi no pu ra se ti vo zu".split()
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def make_deck(count, seed=1):
+    rng = random.Random(seed)
+    return Deck(
+        Flashcard(
+            f"What is {' '.join(rng.choice(WORDS) for _ in range(4))}?",
+            " ".join(rng.choice(WORDS) for _ in range(25)),
+            "lecture.pdf", i // 8, i // 20 + 1, "gpt-4o-mini",
+        )
+        for i in range(count)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deck file format")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            deck = make_deck(size)
+            path = os.path.join(tmp, f"deck_{size}.jsonl")
+
+            started = time.perf_counter()
+            deck.save(path)
+            save_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            streamed = sum(1 for _ in iter_jsonl(path))
+            stream_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            loaded = Deck.load(path)
+            load_seconds = time.perf_counter() - started
+            del loaded
+
+            # Again under tracemalloc, which slows loading down too much to time it at the same time
+            tracemalloc.start()
+            loaded = Deck.load(path)
+            memory, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            assert streamed == size and len(loaded) == size and loaded[-1] == deck[-1]
+            results.append({
+                "cards": size,
+                "file_mb": os.path.getsize(path) / 1e6,
+                "save_seconds": save_seconds,
+                "stream_seconds": stream_seconds,
+                "load_seconds": load_seconds,
+                "loaded_mb": memory / 1e6,
+                "load_peak_mb": peak / 1e6,
+                "bytes_per_card": memory / size,
+            })
+            del deck, loaded
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'cards':>8} {'file MB':>8} {'save s':>8} {'stream s':>9} {'load s':>8} {'mem MB':>8} {'peak MB':>8} {'B/card':>7}")
+    for r in results:
+        print(f"{r['cards']:>8} {r['file_mb']:>8.1f} {r['save_seconds']:>8.3f} {r['stream_seconds']:>9.3f} "
+              f"{r['load_seconds']:>8.3f} {r['loaded_mb']:>8.1f} {r['load_peak_mb']:>8.1f} {r['bytes_per_card']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench_clients.py
+#
+# What the shared client pool in clients.py saves: back-to-back generate calls (like the
+# GUI or a script making one deck after another) against the local mock API, once with a
+# fresh client and event loop per call (how it worked before) and once on the shared
+# pool. The mock adds --connect-latency to every new connection, standing in for the
+# TCP + TLS handshake to the real API. Reports latency per call and connections opened.
+#
+#   python benchmarks/bench_clients.py [--calls 20] [--chunks 4] [--latency 0.05]
+#                                      [--connect-latency 0.05] [--stream] [--json]
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai import make_server  # noqa: E402
+
+
+def measure(server, calls, chunks, stream, call):
+    server.RequestHandlerClass.state.reset()
+    times = []
+    for i in range(calls):
+        # Different text every call so nothing could come from a cache
+        texts = [f"Call {i} chunk {n}: the mitochondria is the powerhouse of the cell, it makes ATP." for n in range(chunks)]
+        started = time.perf_counter()
+        cards = call(texts, stream)
+        times.append(time.perf_counter() - started)
+        assert cards, "no cards generated"
+    stats = server.RequestHandlerClass.state.stats()
+    return {
+        "calls": calls,
+        "requests": stats["requests"],
+        "connections": stats["connections"],
+        "mean_ms": statistics.mean(times) * 1000,
+        "p50_ms": statistics.median(times) * 1000,
+        "max_ms": max(times) * 1000,
+        "total_s": sum(times),
+    }
+
+
+def fresh_client(texts, stream):
+    from engine import generate_flashcards_async
+    # A loop of its own, so the engine makes (and closes) a client of its own
+    return asyncio.run(generate_flashcards_async(texts, stream=stream))
+
+
+def shared_client(texts, stream):
+    from clients import run
+    from engine import generate_flashcards_async
+    return run(generate_flashcards_async(texts, stream=stream))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shared API client pool")
+    parser.add_argument("--calls", type=int, default=20, help="generate calls made one after another")
+    parser.add_argument("--chunks", type=int, default=4, help="Chunks (parallel requests) per call")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock API latency in seconds")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="Mock cost of opening a connection")
+    parser.add_argument("--stream", action="store_true", help="Use streaming responses")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    server = make_server(latency=args.latency, jitter=0, connect_latency=args.connect_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock"
+
+    results = {}
+    try:
+        # One throwaway call so imports aren't counted against the first mode
+        fresh_client(["Warm up: nothing to see here, just loading the openai package."], args.stream)
+        for name, call in (("fresh", fresh_client), ("shared", shared_client)):
+            results[name] = measure(server, args.calls, args.chunks, args.stream, call)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.calls} calls of {args.chunks} chunks, {args.latency * 1000:.0f} ms per answer, "
+          f"{args.connect_latency * 1000:.0f} ms per new connection")
+    print(f"{'client':>8} {'requests':>9} {'conns':>6} {'mean ms':>8} {'p50 ms':>7} {'max ms':>7} {'total s':>8}")
+    for name, r in results.items():
+        print(f"{name:>8} {r['requests']:>9} {r['connections']:>6} {r['mean_ms']:>8.1f} {r['p50_ms']:>7.1f} "
+              f"{r['max_ms']:>7.1f} {r['total_s']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
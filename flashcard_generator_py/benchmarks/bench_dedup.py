@@ -0,0 +1,75 @@
+# bench_dedup.py
+#
+# Times near-duplicate clustering on synthetic decks where a share of the cards are
+# rewordings of earlier ones, to check it stays well below quadratic as decks grow.
+#
+#   python benchmarks/bench_dedup.py [--sizes 1000 10000 40000] [--duplicates 0.2] [--json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import dedupe_flashcards, DEFAULT_DEDUP_THRESHOLD  # noqa: E402
+
+# A few thousand made-up words, so unrelated cards share about as much as real ones do
+SYLLABLES = "ba ce di fo gu ka le mi no pu ra se ti vo zu".split()
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+TEMPLATES = ("What is {}?", "Define {}.", "Explain {}.", "Describe {}.")
+
+
+def make_cards(count, duplicate_share, seed=1):
+    rng = random.Random(seed)
+    originals = []
+    cards = []
+    for i in range(count):
+        if originals and rng.random() < duplicate_share:
+            topic, answer = rng.choice(originals)
+            # Reword the question and drop a word from the answer
+            words = answer.split()
+            words.pop(rng.randrange(len(words)))
+            cards.append(f"Q: {rng.choice(TEMPLATES).format(topic)}\nA: {' '.join(words)}")
+            continue
+        topic = f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        answer = " ".join(rng.choice(WORDS) for _ in range(12))
+        originals.append((topic, answer))
+        cards.append(f"Q: {TEMPLATES[0].format(topic)}\nA: {answer}")
+    return cards, len(originals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate card detection")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 40000])
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Share of cards that are rewordings")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        cards, originals = make_cards(size, args.duplicates)
+        started = time.perf_counter()
+        kept = dedupe_flashcards(cards, args.threshold)
+        seconds = time.perf_counter() - started
+        results.append({
+            "cards": size,
+            "unique": originals,
+            "kept": len(kept),
+            "seconds": seconds,
+            "cards_per_second": size / seconds if seconds else None,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'cards':>8} {'unique':>8} {'kept':>8} {'s':>8} {'cards/s':>10}")
+    for r in results:
+        print(f"{r['cards']:>8} {r['unique']:>8} {r['kept']:>8} {r['seconds']:>8.2f} {r['cards_per_second']:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
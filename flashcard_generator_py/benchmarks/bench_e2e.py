@@ -0,0 +1,230 @@
+# bench_e2e.py
+#
+# End-to-end timing of process_pdf -> generate_flashcards -> create_html on synthetic PDFs
+# of growing size, against the local mock API in mock_openai.py so nothing is billed.
+# Every size runs in its own process, so peak RSS is measured per size.
+#
+#   python benchmarks/bench_e2e.py [--pages 5 50 200] [--runs 3] [--latency 0.3] [--jitter 0.4]
+#                                  [--error-rate 0] [--rate-limit-rate 0] [--stream] [--json]
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOCK_SERVER = os.path.join(APP_DIR, "benchmarks", "mock_openai.py")
+
+SYLLABLES = "ba ce di fo gu ka le mi no pu ra se ti vo zu".split()
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+LINES_PER_PAGE = 45
+
+
+def make_page_lines(rng):
+    sentences = []
+    for _ in range(28):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+        sentences.append(" ".join(words).capitalize() + ".")
+    return textwrap.wrap(" ".join(sentences), 90)[:LINES_PER_PAGE]
+
+
+def write_pdf(path, page_count, seed=1):
+    rng = random.Random(seed)
+    write_pages_pdf(path, [make_page_lines(rng) for _ in range(page_count)])
+
+
+def _pdf_string(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pages_pdf(path, pages):
+    # Bare-bones PDF: one Helvetica text stream per page (a list of lines), enough for pdfminer to extract
+    page_count = len(pages)
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for i, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        shown = " ".join(f"({_pdf_string(line)}) '" for line in lines)
+        data = f"BT /F1 10 Tf 14 TL 50 780 Td {shown} ET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data)
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        kids.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    # Nearest rank, so p95 of three runs is simply the slowest one
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(values):
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "max": max(values) if values else None}
+
+
+def mock_stats(base_url, reset=False):
+    url = base_url.rsplit("/v1", 1)[0] + "/stats" + ("?reset=1" if reset else "")
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None, None
+    # ru_maxrss is KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+def run_worker(args):
+    # One size, several runs; prints a JSON result on stdout
+    sys.path.insert(0, APP_DIR)
+    from flashcard_generator import process_pdf, generate_flashcards, create_html
+
+    base_url = os.environ["OPENAI_BASE_URL"]
+    stages = {"process_pdf": [], "generate_flashcards": [], "create_html": []}
+    service_times = []
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(args.runs):
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                started = time.perf_counter()
+                text = process_pdf(args.worker)
+                stages["process_pdf"].append(time.perf_counter() - started)
+                if not text:
+                    raise SystemExit(f"Extraction failed: {log.getvalue()}")
+
+                mock_stats(base_url, reset=True)
+                started = time.perf_counter()
+                cards = generate_flashcards(text, cache=False, stream=args.stream)
+                stages["generate_flashcards"].append(time.perf_counter() - started)
+                api = mock_stats(base_url)
+
+                started = time.perf_counter()
+                ok, _ = create_html(cards, os.path.join(tmp, f"deck{run}.html"))
+                stages["create_html"].append(time.perf_counter() - started)
+            service_times.extend(api.pop("service_times"))
+            runs.append({"chars": len(text), "cards": len(cards), "html_ok": ok, **api})
+
+    own_rss, child_rss = peak_rss_mb()
+    last = runs[-1]
+    generate = summarize(stages["generate_flashcards"])
+    result = {
+        "pages": args.pages_in_worker,
+        "chars": last["chars"],
+        "cards": last["cards"],
+        "runs": args.runs,
+        "stages": {name: summarize(times) for name, times in stages.items()},
+        "pages_per_second": args.pages_in_worker / summarize(stages["process_pdf"])["p50"],
+        "cards_per_second": last["cards"] / generate["p50"] if generate["p50"] else None,
+        "api_calls": last["requests"],
+        "errors": last["errors"],
+        "rate_limited": last["rate_limited"],
+        "prompt_tokens": last["prompt_tokens"],
+        "completion_tokens": last["completion_tokens"],
+        "request_latency": {
+            "p50": percentile(service_times, 50),
+            "p95": percentile(service_times, 95),
+            "p99": percentile(service_times, 99),
+        },
+        "peak_rss_mb": own_rss,
+        "peak_child_rss_mb": child_rss,
+    }
+    print(json.dumps(result))
+
+
+def start_mock(args):
+    command = [
+        sys.executable, MOCK_SERVER, "--port", "0", "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return server, server.stdout.readline().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a local mock API")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 50, 200], help="Synthetic PDF sizes")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per size")
+    parser.add_argument("--latency", type=float, default=0.3, help="Median mock API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.4, help="Spread of the mock latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="Use streaming responses")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--pages-in-worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    server, base_url = start_mock(args)
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="mock")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for pages in args.pages:
+                pdf = os.path.join(tmp, f"synthetic_{pages}.pdf")
+                write_pdf(pdf, pages)
+                command = [sys.executable, os.path.abspath(__file__), "--worker", pdf, "--pages-in-worker", str(pages),
+                           "--runs", str(args.runs)] + (["--stream"] if args.stream else [])
+                output = subprocess.run(command, env=env, cwd=APP_DIR, capture_output=True, text=True)
+                if output.returncode:
+                    sys.exit(f"{pages} pages failed:\n{output.stderr}")
+                results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'pages':>6} {'cards':>6} {'pdf s':>7} {'gen s':>7} {'html s':>7} {'pages/s':>8} {'cards/s':>8} "
+          f"{'calls':>6} {'req p50':>8} {'req p95':>8} {'rss MB':>7}")
+    for r in results:
+        s = r["stages"]
+        print(f"{r['pages']:>6} {r['cards']:>6} {s['process_pdf']['p50']:>7.2f} {s['generate_flashcards']['p50']:>7.2f} "
+              f"{s['create_html']['p50']:>7.3f} {r['pages_per_second']:>8.1f} {r['cards_per_second'] or 0:>8.1f} "
+              f"{r['api_calls']:>6} {r['request_latency']['p50'] or 0:>8.2f} {r['request_latency']['p95'] or 0:>8.2f} "
+              f"{r['peak_rss_mb'] or 0:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
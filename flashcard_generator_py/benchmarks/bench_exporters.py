@@ -0,0 +1,79 @@
+# bench_exporters.py
+#
+# Time and peak memory of each export format for 1k / 10k / 50k card decks. Cards are
+# generated on the fly, so the memory column is what the exporter itself holds.
+#
+#   python benchmarks/bench_exporters.py [--sizes 1000 10000 50000] [--json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import Flashcard  # noqa: E402
+from exporters import DeckExporter, EXPORT_FORMATS  # noqa: E402
+
+SYLLABLES = "ba ce di fo gu ka le mi no pu ra se ti vo zu".split()
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def make_cards(count, seed=1):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield Flashcard(
+            f"What is {' '.join(rng.choice(WORDS) for _ in range(4))}?",
+            " ".join(rng.choice(WORDS) for _ in range(25)),
+            "lecture.pdf", i // 8, None, "gpt-4o-mini",
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the deck exporters")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            for fmt in EXPORT_FORMATS:
+                output_file = os.path.join(tmp, f"deck_{size}.html")
+                options = {'viewer': 'virtual'} if fmt == 'html' else {}
+                started = time.perf_counter()
+                with DeckExporter(output_file, [fmt], flush_each=False, **options) as exporter:
+                    exporter.write_all(make_cards(size))
+                seconds = time.perf_counter() - started
+
+                # Peak memory in a second run, tracemalloc slows it down too much to time it
+                tracemalloc.start()
+                with DeckExporter(output_file, [fmt], flush_each=False, **options) as exporter:
+                    exporter.write_all(make_cards(size))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                results.append({
+                    "cards": size,
+                    "format": fmt,
+                    "seconds": seconds,
+                    "cards_per_second": size / seconds,
+                    "file_mb": os.path.getsize(exporter.output_files[0]) / 1e6,
+                    "peak_mb": peak / 1e6,
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'cards':>8} {'format':>7} {'seconds':>8} {'cards/s':>9} {'file MB':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['cards']:>8} {r['format']:>7} {r['seconds']:>8.3f} {r['cards_per_second']:>9.0f} "
+              f"{r['file_mb']:>8.1f} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench_html.py
+#
+# Compares the old build-one-big-string create_html with the streaming DeckWriter
+# on 10 / 1k / 50k card decks. Note the legacy renderer doesn't HTML-escape, and
+# CPython's in-place str += keeps it linear as long as nothing else holds a reference.
+#
+#   python benchmarks/bench_html.py [--sizes 10 1000 50000] [--repeat 3] [--json]
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_deck import DeckWriter, HEAD_START, STYLE, SCRIPT, BODY_START, HTML_FOOTER  # noqa: E402
+
+
+def make_cards(count):
+    return [
+        f"Q: What is concept number {i} in chapter {i % 40}?\n"
+        f"A: Concept {i} is explained in section {i % 12} & relates to <item {i - 1}>."
+        for i in range(count)
+    ]
+
+
+def legacy_render(flashcards, output_file):
+    # What create_html used to do: grow one string card by card, then write it
+    html_content = HEAD_START + f"    <style>\n{STYLE}    </style>\n    <script>\n{SCRIPT}    </script>\n" + BODY_START
+    for flashcard in flashcards:
+        if flashcard.strip() and 'Q:' in flashcard and 'A:' in flashcard:
+            question_part, answer_part = flashcard.split('A:', 1)
+            question = question_part.replace('Q:', '').strip()
+            answer = answer_part.strip()
+            html_content += f'''
+        <div class="flashcard" onclick="toggleAnswer(event)">
+            <div class="question">{question}</div>
+            <div class="answer">{answer}</div>
+        </div>'''
+    html_content += HTML_FOOTER
+    with open(output_file, "w", encoding='utf-8') as file:
+        file.write(html_content)
+
+
+def streaming_render(flashcards, output_file):
+    with DeckWriter(output_file, flush_each=False) as writer:
+        writer.write_all(flashcards)
+
+
+def time_it(render, cards, output_file, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(cards, output_file)
+        timings.append(time.perf_counter() - started)
+    # Separate pass for memory: tracemalloc slows everything down, so it isn't timed
+    tracemalloc.start()
+    render(cards, output_file)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), os.path.getsize(output_file), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML deck rendering")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, "deck.html")
+        for size in args.sizes:
+            cards = make_cards(size)
+            for name, render in (("legacy", legacy_render), ("streaming", streaming_render)):
+                seconds, size_bytes, peak = time_it(render, cards, output_file, args.repeat)
+                results.append({
+                    "renderer": name,
+                    "cards": size,
+                    "seconds": seconds,
+                    "cards_per_second": size / seconds if seconds else None,
+                    "mb_per_second": size_bytes / 1e6 / seconds if seconds else None,
+                    "peak_mb": peak / 1e6,
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'renderer':<10} {'cards':>8} {'ms':>10} {'cards/s':>12} {'MB/s':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['renderer']:<10} {r['cards']:>8} {r['seconds'] * 1000:>10.2f} "
+              f"{r['cards_per_second']:>12,.0f} {r['mb_per_second']:>8.1f} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
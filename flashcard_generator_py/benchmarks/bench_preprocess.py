@@ -0,0 +1,128 @@
+# bench_preprocess.py
+#
+# How much preprocess.py keeps out of the API on a synthetic textbook PDF: title page,
+# table of contents, chapters with running headers and page numbers (plus the odd page
+# of numeric tables), a reference list and an index. The PDF goes through pdfminer like
+# a real one. Reports chunks and tokens that would be sent with and without
+# preprocessing, how much of the actual chapter text survived, and the time it took.
+#
+#   python benchmarks/bench_preprocess.py [--chapters 8] [--pages-per-chapter 12] [--json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from bench_e2e import WORDS, make_page_lines, write_pages_pdf  # noqa: E402
+from chunking import count_tokens, iter_chunks  # noqa: E402
+from pdf_extract import iter_page_texts  # noqa: E402
+from preprocess import SkipReport, useful_chunks  # noqa: E402
+
+BOOK_TITLE = "Principles of Synthetic Biology"
+SURNAMES = ["Smith", "Garcia", "Chen", "Okafor", "Novak", "Silva", "Kim", "Haddad", "Larsen", "Moreau"]
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def build_book(rng, chapters, pages_per_chapter):
+    pages = [["", "", BOOK_TITLE, "", "Second Edition"]]
+    body_lines = set()
+
+    toc = ["Contents", ""]
+    page = 4
+    for chapter in range(1, chapters + 1):
+        toc.append(f"{chapter} {words(rng, 3).title()} {'.' * 30} {page}")
+        for section in range(1, 4):
+            toc.append(f"   {chapter}.{section} {words(rng, 2).title()} {'.' * 26} {page + section * 3}")
+        page += pages_per_chapter
+    toc += [f"References {'.' * 30} {page}", f"Index {'.' * 35} {page + 4}"]
+    pages += [toc[:30], toc[30:]] if len(toc) > 30 else [toc]
+
+    for chapter in range(1, chapters + 1):
+        chapter_title = f"Chapter {chapter}. {words(rng, 2).title()}"
+        for i in range(pages_per_chapter):
+            number = len(pages) + 1
+            header = BOOK_TITLE if number % 2 == 0 else chapter_title.upper()
+            if i == pages_per_chapter // 2:
+                # A page of measurements: numbers in, nothing to make cards from
+                lines = [f"Table {chapter}.{i}: measured rates"] + [
+                    "  ".join(f"{rng.uniform(0, 100):6.2f}" for _ in range(8)) for _ in range(38)]
+            else:
+                lines = make_page_lines(rng)[:36]
+                lines.insert(18, "")
+                body_lines.update(line.strip() for line in lines if line.strip())
+            pages.append([header, ""] + lines + ["", str(number)])
+
+    references = ["References", ""]
+    for n in range(1, 121):
+        authors = f"{rng.choice(SURNAMES)}, {chr(65 + n % 26)}., & {rng.choice(SURNAMES)}, {chr(66 + n % 24)}."
+        references.append(f"[{n}] {authors} ({rng.randint(1990, 2024)}). {words(rng, 6).capitalize()}.")
+        references.append(f"    Journal of {words(rng, 2).title()}, {rng.randint(1, 40)}, pp. {rng.randint(1, 300)}-{rng.randint(301, 600)}.")
+    index = ["Index", ""]
+    for term in sorted(rng.sample(WORDS, 150)):
+        pages_list = ", ".join(str(p) for p in sorted(rng.sample(range(4, len(pages)), 3)))
+        index.append(f"{term}, {pages_list}")
+    for block in (references, index):
+        for start in range(0, len(block), 45):
+            number = len(pages) + 1
+            pages.append([BOOK_TITLE if number % 2 == 0 else "BACK MATTER", ""] + block[start:start + 45]
+                         + ["", str(number)])
+    return pages, body_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark boilerplate skipping on a synthetic textbook")
+    parser.add_argument("--chapters", type=int, default=8)
+    parser.add_argument("--pages-per-chapter", type=int, default=12)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    book, body_lines = build_book(rng, args.chapters, args.pages_per_chapter)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "textbook.pdf")
+        write_pages_pdf(pdf, book)
+        pages = [text for _, text in iter_page_texts(pdf, workers=1)]
+
+    raw_chunks = list(iter_chunks(pages))
+    report = SkipReport()
+    started = time.perf_counter()
+    kept_chunks = list(useful_chunks(pages, report=report))
+    seconds = time.perf_counter() - started
+
+    kept_text = "\n".join(kept_chunks)
+    kept_lines = set(line.strip() for line in kept_text.split("\n"))
+    raw_tokens = sum(count_tokens(chunk) for chunk in raw_chunks)
+    kept_tokens = sum(count_tokens(chunk) for chunk in kept_chunks)
+    result = {
+        "pages": len(pages),
+        "chunks": len(raw_chunks),
+        "chunks_sent": len(kept_chunks),
+        "tokens": raw_tokens,
+        "tokens_sent": kept_tokens,
+        "tokens_saved": 1 - kept_tokens / raw_tokens,
+        "body_lines_kept": sum(1 for line in body_lines if line in kept_lines) / len(body_lines),
+        "seconds": seconds,
+        "pages_per_second": len(pages) / seconds,
+        "report": report.to_dict(),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['pages']} pages: {report.describe()}")
+    print(f"chunks sent: {result['chunks_sent']} of {result['chunks']}, tokens sent: {kept_tokens:,} of "
+          f"{raw_tokens:,} ({result['tokens_saved']:.0%} fewer)")
+    print(f"chapter text kept: {result['body_lines_kept']:.1%}")
+    print(f"preprocessing took {seconds * 1000:.0f} ms ({result['pages_per_second']:.0f} pages/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# bench_startup.py
+#
+# Measures cold import time of each entry point with `python -X importtime`
+# and fails if a budget is blown or a heavy dependency is imported eagerly.
+#
+#   python benchmarks/bench_startup.py [--runs 5] [--top 15] [--json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (entry module, budget in ms, modules that must NOT be imported)
+ENTRY_POINTS = [
+    ("flashcard_generator", 150, ("openai", "pdfminer", "customtkinter", "tkinter")),
+    ("cli", 200, ("openai", "pdfminer", "customtkinter", "tkinter")),
+    ("gui", 1500, ("openai", "pdfminer")),
+]
+
+
+def parse_importtime(stderr):
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return parse_importtime(result.stderr), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of each entry point")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    report = {}
+    failed = False
+    for name, budget_ms, forbidden in ENTRY_POINTS:
+        totals = []
+        modules = None
+        for _ in range(args.runs):
+            modules, error = measure(name)
+            if modules is None:
+                break
+            totals.append(modules[name][1] / 1000)
+        if modules is None:
+            report[name] = {"skipped": error}
+            if not args.json:
+                print(f"{name}: skipped ({error})")
+            continue
+
+        total_ms = statistics.median(totals)
+        eager = sorted(m for m in modules if m.split(".")[0] in forbidden)
+        over_budget = total_ms > budget_ms
+        failed = failed or over_budget or bool(eager)
+        slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+        report[name] = {
+            "median_ms": round(total_ms, 1),
+            "budget_ms": budget_ms,
+            "eager_heavy_imports": sorted(set(m.split(".")[0] for m in eager)),
+            "slowest": [{"module": m, "self_ms": s / 1000, "cumulative_ms": c / 1000} for m, (s, c) in slowest],
+        }
+        if args.json:
+            continue
+
+        status = "OVER BUDGET" if over_budget else "ok"
+        print(f"\n{name}: {total_ms:.1f} ms median over {len(totals)} runs (budget {budget_ms} ms) {status}")
+        if eager:
+            print(f"  imported eagerly, should be lazy: {', '.join(report[name]['eager_heavy_imports'])}")
+        print(f"  {'module':<45} {'self ms':>9} {'cumul ms':>9}")
+        for module, (self_us, cumulative_us) in slowest:
+            print(f"  {module:<45} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
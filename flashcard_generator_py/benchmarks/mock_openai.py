@@ -0,0 +1,238 @@
+# mock_openai.py
+#
+# Local stand-in for the chat completions endpoint, so benchmarks (and manual runs) never
+# touch the paid API. Cards are made from the sentences of the request text, so the same
+# chunk always gets the same cards and the cache and dedup behave like they do for real.
+#
+#   python benchmarks/mock_openai.py [--port 8765] [--latency 0.8] [--jitter 0.4]
+#                                    [--error-rate 0.01] [--rate-limit-rate 0.05] [--seed 1]
+#                                    [--connect-latency 0.1]
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python -m flashcard_generator ...
+#
+# GET /stats returns request and connection counts and service times as JSON (?reset=1
+# clears them). --connect-latency delays every new connection, like a TLS handshake to a
+# faraway API would, so connection reuse shows up in the timings.
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The same made-up cards the local batch backend answers with
+from batch_api import make_cards, render_cards  # noqa: E402
+
+# How many pieces a streamed answer is cut into
+STREAM_PIECES = 20
+RATE_LIMIT_RETRY_MS = 200
+
+
+class MockState:
+    def __init__(self, latency, jitter, error_rate, rate_limit_rate, cards, seed, connect_latency=0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.cards = cards
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.streamed = 0
+            self.errors = 0
+            self.rate_limited = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.service_times = []
+
+    def draw(self):
+        # Lognormal around the median latency: most answers are quick, a few are very slow
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            delay = self.latency * math.exp(self.random.gauss(0, self.jitter)) if self.jitter else self.latency
+        if roll < self.rate_limit_rate:
+            return 'rate_limit', delay
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error', delay
+        return 'ok', delay
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+
+    def record(self, outcome, seconds, streamed=False, prompt_tokens=0, completion_tokens=0):
+        with self.lock:
+            self.service_times.append(seconds)
+            self.streamed += streamed
+            self.errors += outcome == 'error'
+            self.rate_limited += outcome == 'rate_limit'
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'connections': self.connections,
+                'streamed': self.streamed,
+                'errors': self.errors,
+                'rate_limited': self.rate_limited,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'service_times': list(self.service_times),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, a kept-alive connection
+    # waits out the client's delayed ACK (~40 ms) between them
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # One handler per connection, however many requests come over it
+        super().setup()
+        self.state.connected()
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/stats':
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+        self.send_json(200, self.state.stats())
+        if parse_qs(url.query).get('reset'):
+            self.state.reset()
+
+    def do_POST(self):
+        started = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+        outcome, delay = self.state.draw()
+        if outcome == 'rate_limit':
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                           {'retry-after-ms': str(RATE_LIMIT_RETRY_MS)})
+            self.state.record(outcome, time.monotonic() - started)
+            return
+        if outcome == 'error':
+            time.sleep(delay / 2)
+            self.send_json(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+            self.state.record(outcome, time.monotonic() - started)
+            return
+
+        text = body['messages'][-1]['content']
+        content = render_cards(make_cards(text, self.state.cards), body.get('response_format') is not None)
+        # ~4 characters per token, like the chunker assumes
+        usage = {
+            "prompt_tokens": sum(len(m['content']) for m in body['messages']) // 4,
+            "completion_tokens": len(content) // 4,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get('model', 'mock')
+
+        if not body.get('stream'):
+            time.sleep(delay)
+            self.send_json(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+            self.state.record(outcome, time.monotonic() - started, False, usage["prompt_tokens"], usage["completion_tokens"])
+            return
+
+        # First token after a third of the latency, the rest spread over the remainder. Chunked
+        # like the real API, so the connection stays open for the next request
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.end_headers()
+        time.sleep(delay / 3)
+        size = max(1, -(-len(content) // STREAM_PIECES))
+        for i in range(0, len(content), size):
+            self.send_event(model, {"content": content[i:i + size]}, None)
+            time.sleep(delay * 2 / 3 / STREAM_PIECES)
+        self.send_event(model, {}, "stop")
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self.send_event(model, None, None, usage)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+        self.state.record(outcome, time.monotonic() - started, True, usage["prompt_tokens"], usage["completion_tokens"])
+
+    def send_event(self, model, delta, finish_reason, usage=None):
+        chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        if usage is not None:
+            chunk["usage"] = usage
+        self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def write_chunk(self, data):
+        # An empty chunk ends the response
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def make_server(port=0, latency=0.8, jitter=0.4, error_rate=0.0, rate_limit_rate=0.0, cards=4, seed=1,
+                connect_latency=0.0):
+    # port=0 picks a free port; the real one is server.server_address[1]
+    state = MockState(latency, jitter, error_rate, rate_limit_rate, cards, seed, connect_latency)
+    handler = type('Handler', (MockHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat completions API")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.8, help="Median seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.4, help="Spread of the lognormal latency (0 = fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--cards", type=int, default=4, help="Cards per response")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--connect-latency", type=float, default=0.0,
+                        help="Seconds added to every new connection, like a TLS handshake")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.cards, args.seed,
+                         args.connect_latency)
+    # First line is machine-readable so benchmarks can start this with --port 0
+    print(f"http://127.0.0.1:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
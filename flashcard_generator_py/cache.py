@@ -0,0 +1,198 @@
+# cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600  # 30 days
+# Expired entries are only looked for this often; the size budget is checked on every put
+# against a running total
+EVICT_EVERY = 256
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def default_cache_path():
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'flashcard_generator', 'responses.sqlite3')
+
+
+def normalize_text(text):
+    # Re-extracting the same PDF can shuffle whitespace; that shouldn't cost a request
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def cache_key(text, model, prompt, params):
+    payload = json.dumps({
+        'text': normalize_text(text),
+        'model': model,
+        'prompt': prompt,
+        'params': params,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FlashcardCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._connections = []
+        self._stats_lock = threading.Lock()
+        # Running total of the entry sizes, None until the first full eviction pass counts them
+        self._size = None
+        self._puts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    cards TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_created ON responses (created)')
+            # Which sections (response keys) each document had on its last run
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    document TEXT PRIMARY KEY,
+                    sections TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )''')
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread.
+        # check_same_thread=False only so close() can close the other threads' ones too
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets readers carry on while another process or thread is writing
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._stats_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._stats_lock:
+            connections, self._connections = self._connections, []
+            # Every thread reconnects on its next use
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT cards, created FROM responses WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.max_age and now - row[1] > self.max_age):
+            self._count(False)
+            return None
+        with conn:
+            conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        self._count(True)
+        return json.loads(row[0])
+
+    def put(self, key, cards):
+        data = json.dumps(cards, ensure_ascii=False)
+        now = time.time()
+        size = len(data.encode('utf-8'))
+        conn = self._connect()
+        with conn:
+            old = conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, cards, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, data, size, now, now)
+            )
+        with self._stats_lock:
+            self._puts += 1
+            if self._size is not None:
+                self._size += size - (old[0] if old else 0)
+            due = (self._size is None or self._puts % EVICT_EVERY == 0
+                   or (self.max_bytes and self._size > self.max_bytes))
+        if due:
+            self.evict()
+
+    def evict(self):
+        # A full pass: the total is counted again from the table, since other processes
+        # (the GUI and a CLI run, say) write to the same cache file
+        conn = self._connect()
+        with conn:
+            if self.max_age:
+                conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.max_age,))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                # Drop least recently used entries until we're back under budget
+                excess = total - self.max_bytes
+                freed = 0
+                doomed = []
+                for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed'):
+                    doomed.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany('DELETE FROM responses WHERE key = ?', doomed)
+                total -= freed
+        with self._stats_lock:
+            self._size = total
+
+    def update_document(self, document, keys):
+        # Records this run's section keys and compares them with the previous run's.
+        # Unchanged sections were answered from the cache; only the changed ones cost a request.
+        conn = self._connect()
+        row = conn.execute('SELECT sections FROM documents WHERE document = ?', (document,)).fetchone()
+        previous = set(json.loads(row[0])) if row else set()
+        current = set(keys)
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO documents (document, sections, updated) VALUES (?, ?, ?)',
+                (document, json.dumps(list(keys)), time.time())
+            )
+        return {
+            'first_run': row is None,
+            'sections': len(current),
+            'unchanged': len(current & previous),
+            'changed': len(current - previous),
+            'removed': len(previous - current),
+        }
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM responses')
+            conn.execute('DELETE FROM documents')
+        with self._stats_lock:
+            self._size = 0
+
+    def stats(self):
+        conn = self._connect()
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
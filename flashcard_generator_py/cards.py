@@ -0,0 +1,195 @@
+# cards.py
+#
+# Flashcard and Deck: a card's question and answer plus where it came from (document,
+# chunk, page) and which model wrote it. Generation still passes "Q: ...\nA: ..." strings
+# around, since that's what the response cache and the job store hold; split_card() is
+# the one place those strings are taken apart.
+#
+# Decks are saved as JSON lines: a header object, then one compact
+# [question, answer, source, chunk, page, model] array per card. Files are written and
+# read a card at a time (reading goes through mmap), so a 100k card deck never needs a
+# second copy of itself in memory.
+
+import json
+import mmap
+import os
+
+FORMAT = "flashcards"
+VERSION = 1
+FIELDS = ('question', 'answer', 'source', 'chunk', 'page', 'model')
+
+
+def split_card(card):
+    # "Q: ...\nA: ..." -> (question, answer). The answer starts at the first line that begins
+    # with "A:", so "A:" inside the text ("vitamin A: ...") doesn't move the split
+    if isinstance(card, Flashcard):
+        return card.question, card.answer
+    text = card.strip()
+    if text.startswith('Q:'):
+        text = text[2:]
+    question, found, answer = text.partition('\nA:')
+    if not found:
+        # Everything on one line: "Q: ... A: ..."
+        question, found, answer = text.partition('A:')
+    return question.strip(), answer.strip()
+
+
+class Flashcard:
+    __slots__ = FIELDS
+
+    def __init__(self, question, answer, source=None, chunk=None, page=None, model=None):
+        self.question = question
+        self.answer = answer
+        self.source = source
+        self.chunk = chunk
+        self.page = page
+        self.model = model
+
+    @classmethod
+    def from_text(cls, card, source=None, chunk=None, page=None, model=None):
+        question, answer = split_card(card)
+        return cls(question, answer, source, chunk, page, model)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_row(self):
+        # Trailing empty fields are left out; most cards have no page or model
+        row = [self.question, self.answer, self.source, self.chunk, self.page, self.model]
+        while len(row) > 2 and row[-1] is None:
+            row.pop()
+        return row
+
+    def text(self):
+        return f"Q: {self.question}\nA: {self.answer}"
+
+    # Two cards are the same card if they ask and answer the same thing, wherever they came from
+    def __eq__(self, other):
+        if not isinstance(other, Flashcard):
+            return NotImplemented
+        return self.question == other.question and self.answer == other.answer
+
+    def __hash__(self):
+        return hash((self.question, self.answer))
+
+    def __repr__(self):
+        return f"Flashcard({self.question!r}, {self.answer!r})"
+
+
+class Deck:
+    __slots__ = ('cards', 'title')
+
+    def __init__(self, cards=(), title=None):
+        self.cards = list(cards)
+        self.title = title
+
+    @classmethod
+    def from_texts(cls, texts, title=None, **meta):
+        return cls((Flashcard.from_text(text, **meta) for text in texts), title)
+
+    @classmethod
+    def load(cls, path):
+        return cls(iter_jsonl(path), read_header(path).get('title'))
+
+    def save(self, path):
+        return write_jsonl(path, self.cards, self.title)
+
+    def texts(self):
+        return [card.text() for card in self.cards]
+
+    def append(self, card):
+        self.cards.append(card)
+
+    def extend(self, cards):
+        self.cards.extend(cards)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+
+class JsonlWriter:
+    # Writes a deck file a card at a time; lines are joined and written in batches
+    def __init__(self, path, title=None, batch_size=1000):
+        self.output_file = path
+        self.batch_size = batch_size
+        self.count = 0
+        self._dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        self._lines = []
+        self._file = open(path, 'w', encoding='utf-8', buffering=1024 * 1024)
+        self._file.write(self._dumps({"format": FORMAT, "version": VERSION, "title": title,
+                                      "fields": list(FIELDS)}) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush_lines(self):
+        if self._lines:
+            self._file.write('\n'.join(self._lines) + '\n')
+            self._lines = []
+
+    def write(self, card):
+        if not isinstance(card, Flashcard):
+            card = Flashcard.from_text(card)
+        self._lines.append(self._dumps(card.to_row()))
+        self.count += 1
+        if len(self._lines) >= self.batch_size:
+            self._flush_lines()
+        return True
+
+    def write_all(self, cards):
+        for card in cards:
+            self.write(card)
+        return self.count
+
+    def close(self):
+        if self._file is not None:
+            self._flush_lines()
+            self._file.close()
+            self._file = None
+
+
+def write_jsonl(path, cards, title=None, batch_size=1000):
+    # Streams any iterable of Flashcards (or Q:/A: strings) to disk; returns the card count
+    with JsonlWriter(path, title, batch_size) as writer:
+        return writer.write_all(cards)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline() or b'{}')
+    if header.get('format') != FORMAT:
+        raise ValueError(f"{path} is not a flashcard deck file")
+    if header.get('version', 0) > VERSION:
+        raise ValueError(f"{path} was written by a newer version (format {header['version']})")
+    return header
+
+
+def iter_jsonl(path):
+    # Yields Flashcards one at a time straight from a memory map of the file
+    read_header(path)
+    # Source and model repeat on every card; keep one copy of each instead of one per card
+    shared = {}
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            data.readline()
+            for line in iter(data.readline, b''):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if len(row) > 2:
+                    row[2] = shared.setdefault(row[2], row[2])
+                if len(row) > 5:
+                    row[5] = shared.setdefault(row[5], row[5])
+                yield Flashcard.from_row(row)
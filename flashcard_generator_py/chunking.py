@@ -0,0 +1,154 @@
+# chunking.py
+
+import re
+import zlib
+
+# Rough chars-per-token for English prose, used when tiktoken isn't installed
+CHARS_PER_TOKEN = 4
+
+DEFAULT_CHUNK_TOKENS = 3000
+DEFAULT_OVERLAP_TOKENS = 200
+# Roughly one paragraph in this many is a content-defined cut point (see is_cut_point)
+CUT_POINT_EVERY = 4
+
+_PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_HEADING = re.compile(
+    r'^(#{1,6}\s+\S|'                                   # markdown headings
+    r'(chapter|section|part|unit|lecture)\s+[\dIVXLC]+\b|'  # Chapter 3, Part II
+    r'\d+(\.\d+)*\.?\s+[A-Z])',                          # 1.2 Introduction
+    re.IGNORECASE
+)
+
+_encoding = None
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_heading(block):
+    first_line = block.strip().split('\n', 1)[0].strip()
+    if not first_line or len(first_line) > 80:
+        return False
+    if _HEADING.match(first_line):
+        return True
+    # Short all-caps lines like "INTRODUCTION" are almost always headings in PDFs
+    letters = [c for c in first_line if c.isalpha()]
+    return len(letters) >= 4 and first_line.isupper() and '\n' not in block.strip()
+
+
+def is_cut_point(block):
+    # Chunk boundaries that depend only on the paragraph itself, not on how much text came
+    # before it, so an edit early in a document doesn't shift every later chunk (and miss the
+    # cache for all of them). Whitespace is ignored like in the cache key.
+    fingerprint = zlib.crc32(' '.join(block.split()).encode('utf-8'))
+    return fingerprint % CUT_POINT_EVERY == 0
+
+
+def _split_oversized(block, max_tokens):
+    # Paragraph bigger than a whole chunk: fall back to sentences, then raw slices
+    pieces = []
+    current = ''
+    for sentence in _SENTENCE_SPLIT.split(block):
+        candidate = f"{current} {sentence}".strip() if current else sentence
+        if count_tokens(candidate) <= max_tokens:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        if count_tokens(sentence) <= max_tokens:
+            current = sentence
+        else:
+            step = max_tokens * CHARS_PER_TOKEN
+            for start in range(0, len(sentence), step):
+                pieces.append(sentence[start:start + step])
+            current = ''
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _paragraph_blocks(paragraph, max_tokens):
+    paragraph = paragraph.strip()
+    if not paragraph:
+        return []
+    if count_tokens(paragraph) > max_tokens:
+        return _split_oversized(paragraph, max_tokens)
+    return [paragraph]
+
+
+def iter_blocks(pieces, max_tokens=DEFAULT_CHUNK_TOKENS):
+    # pieces is any iterable of text (e.g. PDF pages); a paragraph may continue into the next piece
+    buffer = ''
+    # A run of text with no blank lines at all shouldn't grow the buffer without limit
+    max_buffer = max_tokens * CHARS_PER_TOKEN * 2
+    for piece in pieces:
+        buffer = f"{buffer}\n{piece}" if buffer else piece
+        paragraphs = _PARAGRAPH_SPLIT.split(buffer)
+        buffer = paragraphs.pop()
+        for paragraph in paragraphs:
+            yield from _paragraph_blocks(paragraph, max_tokens)
+        if len(buffer) > max_buffer:
+            blocks = _paragraph_blocks(buffer, max_tokens)
+            buffer = blocks.pop() if blocks else ''
+            yield from blocks
+    yield from _paragraph_blocks(buffer, max_tokens)
+
+
+def split_blocks(text, max_tokens=DEFAULT_CHUNK_TOKENS):
+    return list(iter_blocks([text], max_tokens))
+
+
+def iter_chunks(pieces, max_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    if overlap_tokens < 0 or overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens")
+
+    current = []
+    current_tokens = 0
+    new_tokens = 0  # tokens in the current chunk that aren't overlap from the previous one
+
+    for block in iter_blocks(pieces, max_tokens):
+        tokens = count_tokens(block)
+        if new_tokens:
+            too_big = current_tokens + tokens > max_tokens
+            # Prefer to start a new chunk at a heading once the current one is reasonably full,
+            # or at a cut point once it is two thirds full
+            section_break = is_heading(block) and current_tokens >= max_tokens // 2
+            cut_point = current_tokens >= max_tokens * 2 // 3 and is_cut_point(block)
+            if too_big or section_break or cut_point:
+                yield '\n\n'.join(b for b, _ in current)
+                # Carry trailing paragraphs into the next chunk so cards spanning a boundary keep context
+                carried = []
+                carried_tokens = 0
+                for b, t in reversed(current):
+                    if carried_tokens + t > overlap_tokens:
+                        break
+                    carried.insert(0, (b, t))
+                    carried_tokens += t
+                current = carried
+                current_tokens = carried_tokens
+                new_tokens = 0
+                while current and current_tokens + tokens > max_tokens:
+                    current_tokens -= current.pop(0)[1]
+        current.append((block, tokens))
+        current_tokens += tokens
+        new_tokens += tokens
+
+    if new_tokens:
+        yield '\n\n'.join(b for b, _ in current)
+
+
+def chunk_text(text, max_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    return list(iter_chunks([text], max_tokens, overlap_tokens))
@@ -0,0 +1,629 @@
+# cli.py
+
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from batch_api import (prepare_batches, submit_batches, refresh_batches, batches_finished, wait_for_batches,
+                       collect_batches, load_manifest, make_backend, estimated_cost, DEFAULT_POLL_INTERVAL)
+from cache import FlashcardCache
+from cards import iter_jsonl, read_header
+from chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from clients import DEFAULT_MAX_CONNECTIONS, configure, custom_base_url, run as run_shared
+from dedup import DEFAULT_DEDUP_THRESHOLD
+from engine import FlashcardEngine, DEFAULT_CONCURRENCY, DEFAULT_MODELS, DEFAULT_REQUEST_TIMEOUT, RESPONSE_FORMATS
+from exporters import DeckExporter, EXPORT_FORMATS, deck_files, export_path, parse_formats
+from html_deck import VIEWERS, VIRTUAL_THRESHOLD
+from jobs import JobStore, JobRunner, DEFAULT_JOBS, DONE, FAILED, RUNNING
+from pdf_extract import available_cpus
+from pipeline import pdf_pages, write_deck_async
+from preprocess import DEFAULT_MIN_DENSITY
+from progress import describe
+from tracing import start_run, format_summary, logger
+from watch import FolderWatcher, DEFAULT_POLL_INTERVAL as DEFAULT_WATCH_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, STATUS_FILE
+
+INPUT_EXTENSIONS = ('.pdf', '.txt', '.md')
+
+
+def find_inputs(patterns):
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                found.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith(INPUT_EXTENSIONS))
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(path for path in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS))
+    # Sorted so the output names (and therefore resume) are stable between runs
+    return sorted(set(os.path.abspath(path) for path in found))
+
+
+def output_paths(inputs, out_dir):
+    outputs = []
+    used = set()
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{stem}.html"
+        n = 2
+        while name in used:
+            name = f"{stem}_{n}.html"
+            n += 1
+        used.add(name)
+        outputs.append(os.path.join(out_dir, name))
+    return outputs
+
+
+def deck_exists(output_file, formats):
+    return os.path.exists(export_path(output_file, formats[0]))
+
+
+def read_pieces(path, pages, workers, stats):
+    if path.lower().endswith('.pdf'):
+        source = pdf_pages(path, pages, workers)
+    else:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            source = [f.read()]
+    for piece in source:
+        stats['pages'] += 1
+        yield piece
+
+
+async def process_file(path, output_file, engine, args, workers, stats):
+    # Write to .part files so a crash never leaves something that looks finished
+    partials = deck_files(output_file + '.part', args.formats)
+    try:
+        count, _ = await write_deck_async(
+            read_pieces(path, args.pages, workers, stats), partials[0],
+            chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens, engine=engine,
+            dedup_threshold=args.dedup_threshold, document_id=path,
+            deck_options=deck_options(args), skip_boilerplate=not args.keep_boilerplate,
+            min_density=args.min_density
+        )
+        if not count:
+            raise ValueError("No valid flashcards generated")
+    except BaseException:
+        for partial in partials:
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+    for partial in partials:
+        os.replace(partial, partial[:-len('.part')])
+    return count
+
+
+def engine_options(args, cache):
+    return {
+        'concurrency': args.concurrency, 'cache': cache, 'stream': True, 'models': args.models,
+        'request_timeout': args.request_timeout, 'hedge': args.hedge, 'hedge_delay': args.hedge_delay,
+        'response_format': args.response_format,
+    }
+
+
+def deck_options(args):
+    return {'shared_assets': args.shared_assets, 'viewer': args.viewer, 'sidecar': args.sidecar,
+            'formats': args.formats}
+
+
+async def run_batch(jobs, args):
+    stats = {'generated': 0, 'failed': 0, 'cards': 0, 'pages': 0}
+    limit = asyncio.Semaphore(args.jobs)
+    # Share the cores between documents instead of giving every PDF a full process pool
+    workers = max(1, available_cpus() // args.jobs)
+    cache = None if args.no_cache else FlashcardCache()
+
+    async def run(path, output_file):
+        async with limit:
+            print(f"Processing {path}")
+            try:
+                cards = await process_file(path, output_file, engine, args, workers, stats)
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"Failed {path}: {type(e).__name__}: {str(e)}")
+                return
+            stats['generated'] += 1
+            stats['cards'] += cards
+            print(f"Done {path} -> {', '.join(deck_files(output_file, args.formats))} ({cards} cards)")
+
+    async with FlashcardEngine(**engine_options(args, cache)) as engine:
+        await asyncio.gather(*(run(path, output_file) for path, output_file in jobs))
+    return stats
+
+
+def batch_command(args):
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("No PDF or text files found")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = []
+    skipped = 0
+    for path, output_file in zip(inputs, output_paths(inputs, args.out)):
+        if deck_exists(output_file, args.formats) and not args.force:
+            skipped += 1
+        else:
+            jobs.append((path, output_file))
+    if skipped:
+        print(f"Skipping {skipped} files that already have a deck (use --force to rebuild)")
+
+    started = time.perf_counter()
+    tracer = start_run(args.trace)
+    try:
+        stats = run_shared(run_batch(jobs, args))
+    finally:
+        summary = tracer.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"\nProcessed {len(inputs)} files in {elapsed:.1f}s: "
+          f"{stats['generated']} generated, {skipped} skipped, {stats['failed']} failed")
+    if elapsed > 0 and jobs:
+        print(f"{stats['cards']} cards from {stats['pages']} pages: "
+              f"{stats['cards'] / elapsed:.1f} cards/s, {stats['pages'] / elapsed:.1f} pages/s, "
+              f"{stats['generated'] * 60 / elapsed:.1f} files/min")
+    print(format_summary(summary))
+    return 1 if stats['failed'] else 0
+
+
+def offline_work_dir(args):
+    return args.work or os.path.join(args.out, '.batches')
+
+
+def has_api_key(backend, base_url=None):
+    if backend != 'local' and not os.getenv('OPENAI_API_KEY') and not custom_base_url(base_url):
+        print("No API key found! Set OPENAI_API_KEY or add it to a .env file (or use --local).")
+        return False
+    return True
+
+
+def print_batches(manifest):
+    for batch in manifest['batches']:
+        counts = f" ({batch['completed']} done, {batch['failed']} failed)" if batch.get('completed') is not None else ""
+        print(f"  {batch['file']}: {batch['id']} {batch['status']}, {batch['requests']} requests{counts}")
+
+
+def print_progress(manifest):
+    done = sum(batch.get('completed') or 0 for batch in manifest['batches'])
+    total = sum(batch['requests'] for batch in manifest['batches'])
+    print(f"  {time.strftime('%H:%M:%S')} {done}/{total} requests answered")
+
+
+def offline_submit_command(args):
+    work_dir = offline_work_dir(args)
+    previous = load_manifest(work_dir)
+    if previous and not previous['collected'] and not args.force:
+        print(f"A batch is still waiting to be collected in {work_dir}; run 'offline collect' "
+              f"(or --force to start over)")
+        return 1
+    backend_kind = 'local' if args.local else 'openai'
+    if not has_api_key(backend_kind, args.base_url):
+        return 2
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("No PDF or text files found")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+    documents = [(path, os.path.abspath(output_file)) for path, output_file in zip(inputs, output_paths(inputs, args.out))
+                 if args.force or not deck_exists(output_file, args.formats)]
+    if len(documents) < len(inputs):
+        print(f"Skipping {len(inputs) - len(documents)} files that already have a deck (use --force to rebuild)")
+    if not documents:
+        return 0
+
+    # The local stand-in's placeholder cards mustn't end up in the shared cache
+    cache = None if args.no_cache or args.local else FlashcardCache()
+    engine = FlashcardEngine(models=args.models, response_format=args.response_format, cache=cache)
+    manifest = prepare_batches(documents, work_dir, engine, args.pages, args.chunk_tokens, args.overlap_tokens,
+                               args.dedup_threshold, deck_options(args), backend_kind,
+                               not args.keep_boilerplate, args.min_density)
+    requests = sum(batch['requests'] for batch in manifest['batches'])
+    cached = sum(document['cached'] for document in manifest['documents'])
+    print(f"{len(documents)} documents: {requests} chunk requests in {len(manifest['batches'])} batch files, "
+          f"{cached} chunks already cached")
+    backend = make_backend(backend_kind, work_dir)
+    submit_batches(manifest, work_dir, backend)
+    print_batches(manifest)
+    if args.wait or not manifest['batches']:
+        return collect(manifest, work_dir, backend, cache, args.poll_interval, wait=True)
+    print(f"Check on it with 'offline status --out {args.out}', then 'offline collect --out {args.out}'")
+    return 0
+
+
+def offline_status_command(args):
+    work_dir = offline_work_dir(args)
+    manifest = load_manifest(work_dir)
+    if manifest is None:
+        print(f"No batch submitted in {work_dir}")
+        return 1
+    if not has_api_key(manifest['backend'], args.base_url):
+        return 2
+    refresh_batches(manifest, work_dir, make_backend(manifest['backend'], work_dir))
+    print_batches(manifest)
+    if manifest['collected']:
+        print("Already collected")
+    elif batches_finished(manifest):
+        print(f"Finished; run 'offline collect --out {args.out}' to write the decks")
+    return 0
+
+
+def offline_collect_command(args):
+    work_dir = offline_work_dir(args)
+    manifest = load_manifest(work_dir)
+    if manifest is None:
+        print(f"No batch submitted in {work_dir}")
+        return 1
+    if not has_api_key(manifest['backend'], args.base_url):
+        return 2
+    cache = None if args.no_cache or manifest['backend'] == 'local' else FlashcardCache()
+    return collect(manifest, work_dir, make_backend(manifest['backend'], work_dir), cache,
+                   args.poll_interval, args.wait)
+
+
+def collect(manifest, work_dir, backend, cache, poll_interval, wait):
+    if wait:
+        print("Waiting for the batches to finish (Ctrl+C stops waiting; they keep running)")
+        try:
+            wait_for_batches(manifest, work_dir, backend, poll_interval, on_poll=print_progress)
+        except KeyboardInterrupt:
+            print("\nStopped waiting; run 'offline collect' later")
+            return 130
+    else:
+        refresh_batches(manifest, work_dir, backend)
+        if not batches_finished(manifest):
+            print_batches(manifest)
+            print("Not finished yet; try again later or pass --wait")
+            return 1
+
+    tracer = start_run()
+    collect_batches(manifest, work_dir, backend, cache)
+    failed = 0
+    for document in manifest['documents']:
+        if document['status'] == 'done':
+            files = deck_files(document['output_file'], manifest['deck_options'].get('formats', ['html']))
+            print(f"Done {document['source']} -> {', '.join(files)} ({document['cards']} cards)")
+        else:
+            failed += 1
+            print(f"Failed {document['source']}: {document['error']}")
+    summary = tracer.close()
+    cost, unpriced = estimated_cost(summary)
+    print(f"\n{len(manifest['documents']) - failed} decks written, {failed} failed; "
+          f"{summary['prompt_tokens']:,} prompt + {summary['completion_tokens']:,} completion tokens, "
+          f"about ${cost:.4f} at batch prices" + (f" (no price for {', '.join(unpriced)})" if unpriced else ""))
+    if failed:
+        print("Submit the same inputs again to retry only the chunks that failed")
+    return 1 if failed else 0
+
+
+def jobs_add_command(args):
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("No PDF or text files found")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+    store = JobStore()
+    options = {
+        'pages': args.pages, 'chunk_tokens': args.chunk_tokens, 'overlap_tokens': args.overlap_tokens,
+        'dedup_threshold': args.dedup_threshold, 'deck_options': deck_options(args),
+        'skip_boilerplate': not args.keep_boilerplate, 'min_density': args.min_density,
+    }
+    for path, output_file in zip(inputs, output_paths(inputs, args.out)):
+        job_id = store.add_job(path, os.path.abspath(output_file), options=dict(options, document_id=path))
+        print(f"Queued job {job_id}: {path} -> {', '.join(deck_files(output_file, args.formats))}")
+    print("Start them with: python -m flashcard_generator jobs run")
+    return 0
+
+
+def jobs_run_command(args):
+    store = JobStore()
+    job_ids = store.unfinished_jobs(args.retry_failed)
+    if not job_ids:
+        print("No unfinished jobs" + ("" if args.retry_failed else " (use --retry-failed to rerun failed ones)"))
+        return 0
+    cache = None if args.no_cache else FlashcardCache()
+    snapshots = {}
+
+    def on_progress(job_id, event, snapshot):
+        snapshots[job_id] = snapshot
+
+    def on_update(job_id, status):
+        if status == RUNNING:
+            return
+        job = store.get_job(job_id)
+        summary = f" ({describe(snapshots[job_id])})" if job_id in snapshots else ""
+        if status == DONE:
+            files = deck_files(job['output_file'], job['options'].get('deck_options', {}).get('formats', ['html']))
+            print(f"Done job {job_id}: {job['source']} -> {', '.join(files)}{summary}")
+        else:
+            print(f"Failed job {job_id}: {job['source']}: {job['error']}{summary}")
+
+    print(f"Running {len(job_ids)} jobs, {args.jobs} at a time")
+    runner = JobRunner(store, args.jobs, on_update=on_update, on_progress=on_progress,
+                       **engine_options(args, cache))
+    tracer = start_run(args.trace)
+    try:
+        statuses = run_shared(runner.run(job_ids, args.retry_failed))
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished chunks are saved, run 'jobs run' again to continue")
+        print(format_summary(tracer.close()))
+        return 130
+    # RUNNING means another process (the GUI, or a second 'jobs run') had already claimed it
+    elsewhere = sum(1 for status in statuses.values() if status == RUNNING)
+    failed = sum(1 for status in statuses.values() if status not in (DONE, RUNNING))
+    print(f"\n{len(statuses) - failed - elsewhere} jobs done, {failed} failed"
+          + (f", {elsewhere} running in another process" if elsewhere else ""))
+    print(format_summary(tracer.close()))
+    return 1 if failed else 0
+
+
+def jobs_list_command(args):
+    jobs = JobStore().list_jobs()
+    if not jobs:
+        print("No jobs")
+        return 0
+    print(f"{'id':>5} {'status':<8} {'chunks':>9}  source")
+    for job in jobs:
+        progress = f"{job['chunks_done']}/{job['chunks']}" if job['chunks'] else "-"
+        print(f"{job['id']:>5} {job['status']:<8} {progress:>9}  {job['source']}")
+        if job['error']:
+            print(f"{'':>25}{job['error']}")
+    return 0
+
+
+def jobs_clear_command(args):
+    JobStore().clear_finished()
+    print("Removed finished jobs")
+    return 0
+
+
+def export_command(args):
+    os.makedirs(args.out, exist_ok=True)
+    failed = 0
+    for path in args.decks:
+        try:
+            title = read_header(path).get('title')
+            stem = os.path.splitext(os.path.basename(path))[0]
+            output_file = os.path.join(args.out, f"{stem}.html")
+            if os.path.abspath(path) in map(os.path.abspath, deck_files(output_file, args.formats)):
+                raise ValueError("would overwrite itself; pick another --out")
+            started = time.perf_counter()
+            with DeckExporter(output_file, args.formats, title=title, flush_each=False,
+                              viewer=args.viewer, sidecar=args.sidecar, shared_assets=args.shared_assets) as writer:
+                writer.write_all(iter_jsonl(path))
+        except (OSError, ValueError) as e:
+            failed += 1
+            print(f"Failed {path}: {type(e).__name__}: {str(e)}")
+            continue
+        print(f"{path} -> {', '.join(writer.output_files)} ({writer.count} cards in "
+              f"{time.perf_counter() - started:.1f}s)")
+    return 1 if failed else 0
+
+
+def watch_command(args):
+    for folder in args.folders:
+        if not os.path.isdir(folder):
+            print(f"Not a folder: {folder}")
+            return 2
+    stats = {'pages': 0}
+    workers = max(1, available_cpus() // args.jobs)
+    cache = None if args.no_cache else FlashcardCache()
+
+    def on_update(path, entry):
+        if entry['state'] == RUNNING:
+            print(f"Processing {path}")
+        elif entry['state'] == DONE:
+            print(f"Done {path} ({entry['cards']} cards)")
+        elif entry['state'] == FAILED:
+            print(f"Failed {path}: {entry['error']}")
+
+    async def watch():
+        async with FlashcardEngine(**engine_options(args, cache)) as engine:
+            async def process(path, output_file):
+                return await process_file(path, output_file, engine, args, workers, stats)
+            watcher = FolderWatcher(args.folders, process, INPUT_EXTENSIONS, jobs=args.jobs, formats=args.formats,
+                                    settle=args.settle, poll=args.poll, poll_interval=args.poll_interval,
+                                    on_update=on_update)
+            await watcher.run()
+
+    print(f"Watching {', '.join(args.folders)}, decks are written next to each file and progress to "
+          f"{STATUS_FILE} (Ctrl+C to stop)")
+    tracer = start_run(args.trace)
+    try:
+        run_shared(watch())
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    print(format_summary(tracer.close()))
+    return 0
+
+
+def formats_argument(value):
+    try:
+        return parse_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_format_arguments(parser):
+    parser.add_argument("--formats", type=formats_argument, default=["html"],
+                        help=f"Comma-separated outputs per deck: {', '.join(EXPORT_FORMATS)} (default: html). "
+                             f"apkg imports into Anki, jsonl can be exported again later with 'export'")
+    parser.add_argument("--viewer", choices=VIEWERS,
+                        help=f"'dom' renders every card, 'virtual' embeds the deck as JSON and only renders the "
+                             f"current card (default: virtual for decks over {VIRTUAL_THRESHOLD} cards, else dom)")
+    parser.add_argument("--sidecar", action="store_true",
+                        help="With the virtual viewer, write the cards to a separate <deck>.cards.js file")
+    parser.add_argument("--shared-assets", action="store_true",
+                        help="Write the deck CSS/JS once into --out instead of inlining it in every deck")
+
+
+def add_client_arguments(parser):
+    parser.add_argument("--base-url",
+                        help="OpenAI-compatible API to send requests to (default: OPENAI_BASE_URL or api.openai.com)")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help=f"HTTP connections kept open to the API and reused across requests; raised to "
+                             f"--concurrency if lower (default: {DEFAULT_MAX_CONNECTIONS})")
+
+
+def add_engine_arguments(parser):
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"API requests in flight across all files (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--models", type=lambda value: [m.strip() for m in value.split(',') if m.strip()],
+                        default=list(DEFAULT_MODELS),
+                        help=f"Comma-separated models to try in order (default: {','.join(DEFAULT_MODELS)})")
+    parser.add_argument("--request-timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help=f"Seconds to wait for an answer before retrying (default: {DEFAULT_REQUEST_TIMEOUT})")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a second copy of requests slower than the p95 and keep whichever answers first")
+    parser.add_argument("--hedge-delay", type=float,
+                        help="With --hedge, use a fixed delay in seconds instead of the observed p95")
+    parser.add_argument("--response-format", choices=RESPONSE_FORMATS, default="text",
+                        help="'json' asks the model for structured output instead of Q:/A: text")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the response cache")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write timing spans for the run to FILE as OpenTelemetry (OTLP) JSON")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log every timing span as it finishes")
+    add_client_arguments(parser)
+
+
+def add_deck_arguments(parser):
+    parser.add_argument("--pages", help="Only extract these PDF pages, e.g. 3-5,8")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD,
+                        help=f"Drop cards at least this similar (0-1) to an earlier one; 0 keeps them all "
+                             f"(default: {DEFAULT_DEDUP_THRESHOLD})")
+    parser.add_argument("--keep-boilerplate", action="store_true",
+                        help="Send everything, including running headers/footers, contents, references and index pages")
+    parser.add_argument("--min-density", type=float, default=DEFAULT_MIN_DENSITY,
+                        help=f"Skip chunks scoring below this (0-1) on prose density, like tables of numbers or "
+                             f"lists of one-word lines; 0 sends them all (default: {DEFAULT_MIN_DENSITY})")
+    add_format_arguments(parser)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="flashcard_generator",
+        description="Generate flashcard decks without the GUI."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Generate one deck per PDF/text file")
+    batch.add_argument("inputs", nargs="+", help="Files, directories or glob patterns")
+    batch.add_argument("--out", required=True, help="Directory to write decks to")
+    batch.add_argument("--jobs", type=int, default=4, help="Files processed at the same time (default: 4)")
+    add_engine_arguments(batch)
+    add_deck_arguments(batch)
+    batch.add_argument("--force", action="store_true", help="Rebuild decks that already exist")
+    batch.set_defaults(func=batch_command, needs_api=True)
+
+    # Persistent jobs survive a crash or Ctrl+C: "jobs run" again continues where it stopped
+    jobs = commands.add_parser("jobs", help="Queue documents as resumable jobs")
+    job_commands = jobs.add_subparsers(dest="jobs_command", required=True)
+    add = job_commands.add_parser("add", help="Queue one job per PDF/text file")
+    add.add_argument("inputs", nargs="+", help="Files, directories or glob patterns")
+    add.add_argument("--out", required=True, help="Directory to write decks to")
+    add_deck_arguments(add)
+    add.set_defaults(func=jobs_add_command)
+    run = job_commands.add_parser("run", help="Run queued and interrupted jobs")
+    run.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                     help=f"Jobs processed at the same time (default: {DEFAULT_JOBS})")
+    run.add_argument("--retry-failed", action="store_true", help="Also rerun the failed chunks of failed jobs")
+    add_engine_arguments(run)
+    run.set_defaults(func=jobs_run_command, needs_api=True)
+    job_commands.add_parser("list", help="Show all jobs").set_defaults(func=jobs_list_command)
+    job_commands.add_parser("clear", help="Forget finished jobs").set_defaults(func=jobs_clear_command)
+
+    # Batch API: half price and no per-minute limits, results within 24 hours
+    offline = commands.add_parser("offline", help="Build decks through the OpenAI Batch API")
+    offline_commands = offline.add_subparsers(dest="offline_command", required=True)
+    submit = offline_commands.add_parser("submit", help="Write every chunk into batch files and submit them")
+    submit.add_argument("inputs", nargs="+", help="Files, directories or glob patterns")
+    submit.add_argument("--models", type=lambda value: [m.strip() for m in value.split(',') if m.strip()],
+                        default=list(DEFAULT_MODELS),
+                        help="Model chain the results are cached under; batches go to the first one")
+    submit.add_argument("--response-format", choices=RESPONSE_FORMATS, default="text")
+    submit.add_argument("--force", action="store_true",
+                        help="Rebuild decks that already exist and replace an uncollected batch")
+    add_deck_arguments(submit)
+    status = offline_commands.add_parser("status", help="Show how far the submitted batches are")
+    collect_parser = offline_commands.add_parser("collect", help="Download the results and write the decks")
+    collect_parser.add_argument("--wait", action="store_true", help="Wait for unfinished batches first")
+    submit.add_argument("--wait", action="store_true", help="Wait for the results and write the decks")
+    for command in (submit, status, collect_parser):
+        command.add_argument("--out", required=True, help="Directory to write decks to")
+        command.add_argument("--work", help="Where batch files and state are kept (default: <out>/.batches)")
+        command.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                             help=f"Seconds between status checks with --wait (default: {DEFAULT_POLL_INTERVAL})")
+        command.add_argument("--no-cache", action="store_true", help="Don't read or write the response cache")
+        add_client_arguments(command)
+    submit.add_argument("--local", action="store_true",
+                        help="Answer the batch on this machine with placeholder cards, to try the flow offline")
+    submit.set_defaults(func=offline_submit_command)
+    status.set_defaults(func=offline_status_command)
+    collect_parser.set_defaults(func=offline_collect_command)
+
+    export = commands.add_parser("export", help="Write saved .jsonl decks as Anki packages, CSV or HTML")
+    export.add_argument("decks", nargs="+", help=".jsonl deck files (from --formats jsonl)")
+    export.add_argument("--out", required=True, help="Directory to write the exports to")
+    add_format_arguments(export)
+    export.set_defaults(func=export_command)
+
+    # For a shared folder instructors drop lectures into: runs until Ctrl+C
+    watch = commands.add_parser("watch", help="Watch folders and write a deck next to every PDF/text file added")
+    watch.add_argument("folders", nargs="+", help="Folders to watch, including their subfolders")
+    watch.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                       help=f"Files processed at the same time (default: {DEFAULT_JOBS})")
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                       help=f"Seconds a file has to stay unchanged before it's read, so files still being "
+                            f"copied are left alone (default: {DEFAULT_SETTLE_SECONDS:g})")
+    watch.add_argument("--poll", action="store_true",
+                       help="Rescan the folders instead of using inotify; needed on network shares")
+    watch.add_argument("--poll-interval", type=float, default=DEFAULT_WATCH_POLL_INTERVAL,
+                       help=f"Seconds between rescans when polling (default: {DEFAULT_WATCH_POLL_INTERVAL:g})")
+    add_engine_arguments(watch)
+    add_deck_arguments(watch)
+    watch.set_defaults(func=watch_command, needs_api=True)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    load_dotenv()
+    if getattr(args, 'verbose', False):
+        # Only this app's spans, not the HTTP client's or asyncio's debug chatter
+        logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+        logger.setLevel(logging.DEBUG)
+    # A local OpenAI-compatible server doesn't need a key; clients.py sends a placeholder
+    if (getattr(args, 'needs_api', False) and not os.getenv('OPENAI_API_KEY')
+            and not custom_base_url(getattr(args, 'base_url', None))):
+        print("No API key found! Set OPENAI_API_KEY or add it to a .env file (or use --base-url for a local server).")
+        return 2
+    if getattr(args, 'jobs', 1) < 1 or getattr(args, 'concurrency', 1) < 1:
+        print("--jobs and --concurrency must be at least 1")
+        return 2
+    if not 0 <= getattr(args, 'dedup_threshold', 0) <= 1:
+        print("--dedup-threshold must be between 0 and 1")
+        return 2
+    if not 0 <= getattr(args, 'min_density', 0) <= 1:
+        print("--min-density must be between 0 and 1")
+        return 2
+    if getattr(args, 'models', True) == []:
+        print("--models needs at least one model name")
+        return 2
+    if getattr(args, 'settle', 0) < 0 or getattr(args, 'poll_interval', 1) <= 0:
+        print("--settle can't be negative and --poll-interval must be more than 0")
+        return 2
+    if hasattr(args, 'max_connections'):
+        if args.max_connections < 1:
+            print("--max-connections must be at least 1")
+            return 2
+        # One pool for the whole run; it needs a connection for every request in flight
+        configure(base_url=args.base_url,
+                  max_connections=max(args.max_connections, getattr(args, 'concurrency', 1)))
+    return args.func(args)
@@ -0,0 +1,180 @@
+# clients.py
+#
+# Process-wide OpenAI clients, so connections (and their TLS handshakes) are reused across
+# requests, chunks, documents and generate_flashcards() calls instead of every engine
+# opening a pool of its own.
+#
+# An async client is tied to the event loop it first ran on, so async work runs on one
+# shared loop in a background thread: sync code hands coroutines to run(), and an engine
+# running on that loop gets the shared AsyncOpenAI from async_client(). An engine on some
+# other loop (a caller's own asyncio.run) gets a client of its own, as before.
+# get_client() is the shared sync client (the Batch API backend uses it).
+#
+# configure() sets the base URL, key, pool size and timeouts; a base URL pointing at a
+# local OpenAI-compatible server gets the same pooling, and doesn't need a real key.
+# Everything is closed at exit.
+
+import asyncio
+import atexit
+import os
+import threading
+
+DEFAULT_MAX_CONNECTIONS = 64
+# Keep every connection alive between requests; the pool never holds more than max_connections
+DEFAULT_MAX_KEEPALIVE = 64
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Per-request timeouts are the engine's job (request_timeout), this only catches hung sockets
+DEFAULT_TIMEOUT = 600.0
+# Sent when a base URL is set but no key is: local servers ignore it, the openai package insists on one
+PLACEHOLDER_API_KEY = "not-needed"
+
+
+def custom_base_url(base_url=None):
+    return base_url or os.getenv('OPENAI_BASE_URL') or None
+
+
+class ClientSettings:
+    def __init__(self, base_url=None, api_key=None, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive=DEFAULT_MAX_KEEPALIVE, keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, timeout=DEFAULT_TIMEOUT):
+        # base_url and api_key fall back to OPENAI_BASE_URL / OPENAI_API_KEY like the openai package does
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.max_keepalive = min(max_keepalive, max_connections)
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+
+    def client_options(self):
+        import httpx
+        base_url = custom_base_url(self.base_url)
+        return {
+            'base_url': base_url,
+            'api_key': self.api_key or os.getenv('OPENAI_API_KEY') or (PLACEHOLDER_API_KEY if base_url else None),
+            'timeout': httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        }
+
+    def limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive,
+                            keepalive_expiry=self.keepalive_expiry)
+
+
+class ClientManager:
+    def __init__(self, settings=None):
+        self.settings = settings or ClientSettings()
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._loop = None
+        self._thread = None
+
+    # openai takes a while to import, so it's loaded on the first request rather than at startup
+
+    def new_async_client(self):
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        # max_retries=0 because the engine does its own backoff alongside its rate limiters
+        return AsyncOpenAI(max_retries=0, http_client=DefaultAsyncHttpxClient(limits=self.settings.limits()),
+                           **self.settings.client_options())
+
+    def get_client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI, DefaultHttpxClient
+                self._client = OpenAI(http_client=DefaultHttpxClient(limits=self.settings.limits()),
+                                      **self.settings.client_options())
+            return self._client
+
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="openai-clients", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def async_client(self):
+        # (client, shared): the shared client on the shared loop, otherwise a new one the caller must close
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is None or running is not self._loop:
+            return self.new_async_client(), False
+        if self._async_client is None:
+            # Only ever touched from the shared loop's thread, so no lock needed
+            self._async_client = self.new_async_client()
+        return self._async_client, True
+
+    def run(self, coro):
+        # Runs a coroutine on the shared loop and waits for it, like asyncio.run but keeping
+        # the loop (and its connections) for next time. Ctrl+C cancels the coroutine and
+        # waits for it to clean up before re-raising
+        if self._thread is not None and threading.current_thread() is self._thread:
+            # Waiting here would block the very loop the coroutine needs
+            coro.close()
+            raise RuntimeError("run() called from the shared loop's thread; await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop())
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            try:
+                future.result()
+            except BaseException:
+                pass
+            raise
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if client is not None:
+            client.close()
+        if loop is not None:
+            async def shutdown():
+                if self._async_client is not None:
+                    await self._async_client.close()
+                    self._async_client = None
+            try:
+                asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            if not thread.is_alive():
+                loop.close()
+
+
+_manager = ClientManager()
+atexit.register(lambda: _manager.close())
+
+
+def get_manager():
+    return _manager
+
+
+def configure(**settings):
+    # Takes ClientSettings' arguments; clients made with the old settings are closed first
+    _manager.close()
+    _manager.settings = ClientSettings(**settings)
+    return _manager.settings
+
+
+def get_client():
+    return _manager.get_client()
+
+
+def async_client():
+    return _manager.async_client()
+
+
+def run(coro):
+    return _manager.run(coro)
+
+
+def close():
+    _manager.close()
@@ -0,0 +1,157 @@
+# dedup.py
+#
+# Near-duplicate detection for cards ("What is X?" / "Define X."). Cards are turned into
+# sets of word shingles, MinHash + LSH banding finds candidate pairs without comparing
+# every card to every other one, and candidates are confirmed with the exact Jaccard.
+
+import hashlib
+import re
+from array import array
+from itertools import islice
+
+from cards import split_card
+
+DEFAULT_DEDUP_THRESHOLD = 0.6
+
+# One 64 byte blake2b digest per shingle gives 16 32-bit hash values = 16 MinHash permutations
+NUM_HASHES = 16
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+# Very common buckets (e.g. every card about the same term) only get compared this far
+MAX_BUCKET_COMPARISONS = 64
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Question boilerplate and filler words that say nothing about what the card is about
+STOPWORDS = frozenset('''
+    a an the of to in on at for by with from as and or but not no is are was were be been being
+    it its this that these those there their they them he she his her we you your i
+    what which who whom whose when where why how does do did can could would should will
+    define definition describe explain name list give state identify meaning mean means
+    term called refer refers referred known main purpose example examples some any
+'''.split())
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def shingles(card):
+    question, answer = split_card(card)
+    words = [_stem(w) for w in _WORD.findall(f"{question} {answer}".lower()) if w not in STOPWORDS]
+    found = set(words)
+    found.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return frozenset(found)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    common = sum(1 for item in a if item in b)
+    return common / (len(a) + len(b) - common)
+
+
+def card_score(card):
+    # Prefer a real question with a reasonably full answer as the card to keep
+    question, answer = split_card(card)
+    return (question.endswith('?'), min(len(answer.split()), 40), -abs(len(question.split()) - 12))
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=DEFAULT_DEDUP_THRESHOLD):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        self.threshold = threshold
+        self.cards = []
+        self._shingles = []
+        self._buckets = {}
+        self._hashes = {}
+
+    def _signature(self, items):
+        hashes = self._hashes
+        rows = []
+        for item in items:
+            row = hashes.get(item)
+            if row is None:
+                row = array('I', hashlib.blake2b(item.encode('utf-8'), digest_size=64).digest())
+                # Words repeat across cards; word pairs mostly don't, so only words are remembered
+                if ' ' not in item:
+                    hashes[item] = row
+            rows.append(row)
+        return [min(column) for column in zip(*rows)]
+
+    def _bucket_keys(self, signature):
+        return [(band, *signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def matches(self, card, items=None):
+        # Indices of already indexed cards at least `threshold` similar to this one
+        items = shingles(card) if items is None else items
+        if not items:
+            return [], items, None
+        signature = self._signature(items)
+        checked = set()
+        found = []
+        for key in self._bucket_keys(signature):
+            for other in islice(self._buckets.get(key, ()), MAX_BUCKET_COMPARISONS):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if jaccard(items, self._shingles[other]) >= self.threshold:
+                    found.append(other)
+        return found, items, signature
+
+    def add(self, card, items=None, signature=None):
+        index = len(self.cards)
+        items = shingles(card) if items is None else items
+        self.cards.append(card)
+        self._shingles.append(items)
+        if items:
+            for key in self._bucket_keys(signature or self._signature(items)):
+                self._buckets.setdefault(key, []).append(index)
+        return index
+
+    def is_duplicate(self, card):
+        # Streaming use: keep the first of a group and drop later near-duplicates
+        found, items, signature = self.matches(card)
+        if found:
+            return True
+        self.add(card, items, signature)
+        return False
+
+
+def cluster_flashcards(flashcards, threshold=DEFAULT_DEDUP_THRESHOLD):
+    # Groups of near-duplicate card indices, in order of first appearance
+    index = NearDuplicateIndex(threshold)
+    parent = list(range(len(flashcards)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, card in enumerate(flashcards):
+        found, items, signature = index.matches(card)
+        for other in found:
+            a, b = root(i), root(other)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+        index.add(card, items, signature)
+
+    groups = {}
+    for i in range(len(flashcards)):
+        groups.setdefault(root(i), []).append(i)
+    return [groups[key] for key in sorted(groups)]
+
+
+def dedupe_flashcards(flashcards, threshold=DEFAULT_DEDUP_THRESHOLD):
+    # Keeps the best card of each near-duplicate group, where the group first appeared
+    kept = []
+    for group in cluster_flashcards(flashcards, threshold):
+        kept.append(max((flashcards[i] for i in group), key=card_score))
+    return kept
@@ -0,0 +1,503 @@
+# engine.py
+
+import asyncio
+import collections
+import random
+import re
+import time
+
+from cache import cache_key
+from chunking import count_tokens
+from clients import async_client
+from parsing import merge_flashcards, IncrementalCardParser, JsonCardParser
+from tracing import get_tracer
+
+SYSTEM_PROMPT = "You are an assistant that creates educational flashcards. Create 5-30 (as many as deemed fit) concise question-answer pairs from the provided text."
+USER_PROMPT = "Create flashcards from this text. Each flashcard should have a clear question and answer:\n\n{text}\n\nFormat EXACTLY as:\nQ: [Question]?\nA: [Answer]\n"
+JSON_USER_PROMPT = "Create flashcards from this text. Each flashcard should have a clear question and answer:\n\n{text}\n\nReply with JSON only, shaped as {{\"cards\": [{{\"question\": \"...\", \"answer\": \"...\"}}]}}\n"
+
+# 'json' asks for structured output so replies can't come back in a shape the parser rejects
+RESPONSE_FORMATS = ('text', 'json')
+FLASHCARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"question": {"type": "string"}, "answer": {"type": "string"}},
+                "required": ["question", "answer"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["cards"],
+    "additionalProperties": False,
+}
+# Models that accept a json_schema response_format; older ones get plain JSON mode
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+# Tried in order; gpt-4o-mini first because its cheap.
+DEFAULT_MODELS = ("gpt-4o-mini", "gpt-3.5-turbo")
+MODEL_PARAMS = {"max_tokens": 1500, "temperature": 0.5, "presence_penalty": 0.1, "frequency_penalty": 0.1}
+
+DEFAULT_CONCURRENCY = 8
+# Defaults sit under the lowest paid tier for gpt-4o-mini; raise them if your account allows more
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_MAX_RETRIES = 3  # per model in the chain
+# Seconds to wait for the API to answer, or for the next piece of a streamed answer
+DEFAULT_REQUEST_TIMEOUT = 60
+# Hedged requests wait this long until enough responses are in to use the p95
+DEFAULT_HEDGE_DELAY = 10.0
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def build_messages(text, response_format='text'):
+    prompt = JSON_USER_PROMPT if response_format == 'json' else USER_PROMPT
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt.format(text=text)}
+    ]
+
+
+def json_response_format(model):
+    if model.startswith(STRUCTURED_OUTPUT_MODELS):
+        return {"type": "json_schema", "json_schema": {"name": "flashcards", "strict": True, "schema": FLASHCARD_SCHEMA}}
+    return {"type": "json_object"}
+
+
+def parse_duration(value):
+    # OpenAI reset headers look like "1s", "6m0s" or "20ms"
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        # A single request bigger than the whole bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                pause = self.blocked_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def observe(self, remaining, reset_seconds=None):
+        # Trust the server when it says we have less headroom than we think
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_seconds:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+
+
+class FlashcardGenerationError(RuntimeError):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    # Unparseable or empty completions are worth another try too
+    return isinstance(error, ValueError)
+
+
+class FlashcardEngine:
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=1.0, max_backoff=30.0, client=None, cache=None, stream=False,
+                 models=DEFAULT_MODELS, params=None, request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                 hedge=False, hedge_delay=None, response_format='text'):
+        # hedge=True sends a second copy of a request that hasn't produced anything by the
+        # p95 latency (or hedge_delay seconds if given); whichever answers first wins
+        if not models:
+            raise ValueError("models must name at least one model")
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"response_format must be one of {', '.join(RESPONSE_FORMATS)}")
+        self.concurrency = concurrency
+        self.models = tuple(models)
+        self.params = dict(MODEL_PARAMS if params is None else params)
+        self.request_timeout = request_timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.response_format = response_format
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        # Without a client the engine borrows the shared pooled one (see clients.py)
+        self.client = client
+        self.cache = cache
+        self.stream = stream
+        self._owns_client = False
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._owns_client and self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    def _update_limits(self, headers):
+        for bucket, kind in ((self.request_bucket, 'requests'), (self.token_bucket, 'tokens')):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            bucket.observe(remaining, parse_duration(headers.get(f'x-ratelimit-reset-{kind}')))
+
+    def retry_delay(self, error, attempt):
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = None
+        if headers.get('retry-after-ms'):
+            retry_after = parse_duration(headers['retry-after-ms'] + 'ms')
+        elif headers.get('retry-after'):
+            retry_after = parse_duration(headers['retry-after'])
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Full jitter so parallel chunks that failed together don't retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    async def _acquire(self, messages, params):
+        if self.client is None:
+            client, shared = async_client()
+            self.client = client
+            self._owns_client = not shared
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        estimated = sum(count_tokens(m["content"]) for m in messages) + params.get("max_tokens", 0)
+        await self.request_bucket.acquire(1)
+        await self.token_bucket.acquire(estimated)
+
+    async def _timed(self, awaitable):
+        if self.request_timeout is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, self.request_timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"No response within {self.request_timeout}s") from None
+
+    async def complete(self, model, messages, on_sent=None, **params):
+        await self._acquire(messages, params)
+        async with self._semaphore:
+            if on_sent:
+                on_sent()
+            raw = await self._timed(self.client.chat.completions.with_raw_response.create(
+                model=model, messages=messages, **params
+            ))
+        self._update_limits(raw.headers)
+        return raw.parse()
+
+    async def stream_content(self, model, messages, on_sent=None, on_usage=None, **params):
+        await self._acquire(messages, params)
+        # The slot stays taken until the stream is drained, not just until headers arrive
+        async with self._semaphore:
+            if on_sent:
+                on_sent()
+            # include_usage adds a last chunk with the token counts and no choices
+            raw = await self._timed(self.client.chat.completions.with_raw_response.create(
+                model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params
+            ))
+            self._update_limits(raw.headers)
+            stream = raw.parse()
+            # The timeout applies to each gap in the stream, so a long answer is fine but a stall isn't
+            while True:
+                try:
+                    chunk = await self._timed(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+                if getattr(chunk, 'usage', None) and on_usage:
+                    on_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def _new_parser(self):
+        return JsonCardParser() if self.response_format == 'json' else IncrementalCardParser()
+
+    def _request_params(self, model):
+        if self.response_format == 'json':
+            return dict(self.params, response_format=json_response_format(model))
+        return self.params
+
+    async def _complete_and_parse(self, model, text, on_card=None, on_sent=None, on_usage=None):
+        if self.stream:
+            return await self._stream_and_parse(model, text, on_card, on_sent, on_usage)
+        response = await self.complete(model, build_messages(text, self.response_format), on_sent,
+                                       **self._request_params(model))
+        if response and getattr(response, 'usage', None) and on_usage:
+            on_usage(response.usage)
+        if not response or not response.choices:
+            raise ValueError("Empty response received from OpenAI API")
+        content = (response.choices[0].message.content or '').strip()
+        if not content:
+            raise ValueError("Empty content received from OpenAI API")
+        with get_tracer().span('parse', model=model):
+            parser = self._new_parser()
+            flashcards = parser.feed(content) + parser.close()
+        # If no valid flashcards were found, raise an exception to trigger fallback
+        if not flashcards:
+            raise ValueError("No valid flashcards generated")
+        if on_card:
+            for card in flashcards:
+                on_card(card)
+        return flashcards
+
+    async def _stream_and_parse(self, model, text, on_card=None, on_sent=None, on_usage=None):
+        parser = self._new_parser()
+        messages = build_messages(text, self.response_format)
+        # Parsing happens between stream chunks, so its time is summed rather than given a span
+        parsing = 0.0
+        async for delta in self.stream_content(model, messages, on_sent, on_usage, **self._request_params(model)):
+            started = time.perf_counter()
+            cards = parser.feed(delta)
+            parsing += time.perf_counter() - started
+            for card in cards:
+                if on_card:
+                    on_card(card)
+        started = time.perf_counter()
+        cards = parser.close()
+        get_tracer().add_stage('parse', parsing + time.perf_counter() - started)
+        for card in cards:
+            if on_card:
+                on_card(card)
+        if not parser.cards:
+            raise ValueError("No valid flashcards generated")
+        return parser.cards
+
+    async def _traced_request(self, model, text, on_card, on_sent, on_usage, hedged=False):
+        # The span covers waiting for a slot and rate limits too; "queued" says how much of it
+        # that was, so slow answers and self-inflicted waits can be told apart
+        started = time.monotonic()
+        sent = []
+
+        def traced_sent():
+            sent.append(time.monotonic())
+            on_sent()
+
+        with get_tracer().span('api_request', model=model, stream=self.stream, hedged=hedged) as span:
+            try:
+                cards = await self._complete_and_parse(model, text, on_card, traced_sent, on_usage)
+            finally:
+                span['queued'] = round((sent[0] if sent else time.monotonic()) - started, 3)
+            span['cards'] = len(cards)
+        return cards
+
+    def chunk_cache_key(self, text):
+        prompt = SYSTEM_PROMPT + (JSON_USER_PROMPT if self.response_format == 'json' else USER_PROMPT)
+        return cache_key(text, list(self.models), prompt, self.params)
+
+    async def generate_chunk(self, text, on_card=None, progress=None):
+        # on_card(card, model) is called for each card once the attempt that produced it has
+        # succeeded, with the model that wrote it (None for an answer from the cache, which
+        # doesn't record it); a stream that dies halfway is retried from scratch, so its
+        # cards are dropped.
+        # progress (a progress.Progress) gets the chunk, request and token events.
+        # Raises FlashcardGenerationError once every model in the chain has failed.
+        tracer = get_tracer()
+        key = None
+        if self.cache is not None:
+            key = self.chunk_cache_key(text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                tracer.count('cache_hits')
+                if on_card:
+                    for card in cached:
+                        on_card(card, None)
+                if progress:
+                    progress.emit('chunk_done', cached=True)
+                return cached
+            tracer.count('cache_misses')
+
+        if progress:
+            progress.emit('chunk_sent')
+        try:
+            with tracer.span('generate_chunk', chars=len(text)) as span:
+                flashcards = await self._generate_chunk_uncached(text, on_card, progress)
+                span['cards'] = len(flashcards)
+        except FlashcardGenerationError:
+            if progress:
+                progress.emit('chunk_failed')
+            raise
+        if key is not None:
+            self.cache.put(key, flashcards)
+        if progress:
+            progress.emit('chunk_done')
+        return flashcards
+
+    async def _generate_chunk_uncached(self, text, on_card=None, progress=None):
+        error = None
+        tracer = get_tracer()
+        for index, model in enumerate(self.models):
+            if index:
+                print(f"Falling back to {model}...")
+                tracer.count('fallbacks')
+            for attempt in range(self.max_retries):
+                try:
+                    return await self._attempt(model, text, on_card, progress)
+                except asyncio.CancelledError:
+                    # Still an Exception subclass on Python 3.7
+                    raise
+                except Exception as e:
+                    error = e
+                    tracer.count('failed_requests')
+                    if attempt == self.max_retries - 1 or not is_retryable(e):
+                        print(f"{model} failed after {attempt + 1} attempts: {type(e).__name__}: {str(e)}")
+                        break
+                    delay = self.retry_delay(e, attempt)
+                    print(f"Attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                    tracer.count('retries')
+                    with tracer.span('backoff', model=model, attempt=attempt + 1):
+                        await asyncio.sleep(delay)
+        raise FlashcardGenerationError(
+            f"All models failed ({', '.join(self.models)}): {type(error).__name__}: {str(error)}"
+        ) from error
+
+    def current_hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    async def _attempt(self, model, text, on_card=None, progress=None):
+        # One attempt against one model, hedged if enabled. Latency is measured from when the
+        # request leaves (not while it waits for a slot) to its first card, and the first copy
+        # to produce a card wins; the other is cancelled so cards never arrive from both.
+        # Cards only go to on_card once the winner has finished without an error.
+        copies = []
+        sent_at = []
+        winner = []
+        first_sent = asyncio.Event()
+        tracer = get_tracer()
+
+        def start():
+            index = len(copies)
+            sent_at.append(None)
+
+            def on_sent():
+                sent_at[index] = time.monotonic()
+                first_sent.set()
+                tracer.count('requests')
+                if progress:
+                    progress.emit('request')
+
+            def first_card(card):
+                if not winner:
+                    winner.append(index)
+                    self.latencies.append(time.monotonic() - sent_at[index])
+                    for other, task in enumerate(copies):
+                        if other != index:
+                            task.cancel()
+
+            copies.append(asyncio.ensure_future(
+                self._traced_request(model, text, first_card, on_sent, on_usage, hedged=bool(index))
+            ))
+
+        def on_usage(usage):
+            tracer.add_usage(model, usage.prompt_tokens, usage.completion_tokens)
+            if progress:
+                progress.emit('tokens', prompt_tokens=usage.prompt_tokens or 0,
+                              completion_tokens=usage.completion_tokens or 0)
+
+        start()
+        try:
+            if self.hedge:
+                # Wait for the first copy to actually go out, then give it until the hedge delay
+                sent_wait = asyncio.ensure_future(first_sent.wait())
+                try:
+                    await asyncio.wait({copies[0], sent_wait}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    sent_wait.cancel()
+                if first_sent.is_set():
+                    delay = self.current_hedge_delay()
+                    remaining = sent_at[0] + delay - time.monotonic()
+                    if remaining > 0:
+                        await asyncio.wait({copies[0]}, timeout=remaining)
+                    if not copies[0].done() and not winner:
+                        print(f"No answer from {model} after {delay:.1f}s, sending a hedged request...")
+                        tracer.count('hedges')
+                        start()
+
+            errors = []
+            pending = set(copies)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        cards = task.result()
+                        if on_card:
+                            for card in cards:
+                                on_card(card, model)
+                        return cards
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in copies:
+                task.cancel()
+
+    async def generate_many(self, chunks):
+        # All chunks go out at once; the semaphore and rate limiters decide how many are in flight
+        tasks = [asyncio.ensure_future(self.generate_chunk(chunk)) for chunk in chunks]
+        try:
+            card_lists = await asyncio.gather(*tasks)
+        finally:
+            # One chunk failing fails the document; don't leave the rest running
+            for task in tasks:
+                task.cancel()
+        return merge_flashcards(card_lists)
+
+
+async def generate_flashcards_async(chunks, **engine_options):
+    async with FlashcardEngine(**engine_options) as engine:
+        return await engine.generate_many(chunks)
@@ -0,0 +1,361 @@
+# exporters.py
+#
+# Deck outputs besides the HTML page: Anki packages (.apkg), CSV and JSON lines. Every
+# writer takes cards one at a time (or in batches through write_all) and keeps nothing
+# but the current batch in memory, so exporting a 50k card deck doesn't need the deck
+# in memory twice. DeckExporter fans the same cards out to several formats at once.
+#
+# An .apkg is a zip holding an Anki collection (SQLite, schema 11, which every Anki
+# since 2.1 imports) plus an empty media list. Notes get a guid derived from their text,
+# so importing a rebuilt deck updates the cards that are already in Anki instead of
+# adding copies.
+
+import base64
+import functools
+import csv
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from cards import FIELDS, Flashcard, JsonlWriter
+from html_deck import DeckWriter, default_output_path, split_flashcard
+
+EXTENSIONS = {'html': '.html', 'apkg': '.apkg', 'csv': '.csv', 'jsonl': '.jsonl'}
+EXPORT_FORMATS = tuple(EXTENSIONS)
+
+# Fixed so every exported deck shares one note type in Anki instead of adding a new one per import
+ANKI_MODEL_ID = 1718624061
+ANKI_MODEL_NAME = "Flashcard Generator"
+
+ANKI_SCHEMA = '''
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null, lapses integer not null,
+    left integer not null, odue integer not null, odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+'''
+
+# Built once all the cards are in, which is quicker than keeping them up to date on every insert
+ANKI_INDEXES = '''
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+'''
+
+ANKI_CSS = '''.card {
+    font-family: 'Segoe UI', Arial, sans-serif;
+    font-size: 20px;
+    text-align: center;
+}
+'''
+
+
+def export_path(output_file, fmt):
+    # deck.html -> deck.apkg; batch mode's deck.html.part becomes deck.apkg.part
+    suffix = ''
+    if output_file.endswith('.part'):
+        output_file, suffix = output_file[:-len('.part')], '.part'
+    return os.path.splitext(output_file)[0] + EXTENSIONS[fmt] + suffix
+
+
+def deck_files(output_file, formats=('html',)):
+    return [export_path(output_file, fmt) for fmt in formats]
+
+
+def parse_formats(value):
+    # "html,apkg" -> ['html', 'apkg']; for argparse, so bad names are a usage error
+    formats = []
+    for name in value.split(','):
+        name = name.strip().lower().lstrip('.')
+        if not name:
+            continue
+        if name not in EXTENSIONS:
+            raise ValueError(f"unknown format {name!r} (choose from {', '.join(EXPORT_FORMATS)})")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        raise ValueError("no formats given")
+    return formats
+
+
+def _deck_name(output_file):
+    name = os.path.basename(output_file)
+    if name.endswith('.part'):
+        name = name[:-len('.part')]
+    return os.path.splitext(name)[0]
+
+
+class CsvWriter:
+    # One row per card with a header row, the columns of the deck file format
+    def __init__(self, output_file, title=None, batch_size=1000):
+        self.output_file = output_file
+        self.batch_size = batch_size
+        self.count = 0
+        self._rows = []
+        self._file = open(output_file, 'w', encoding='utf-8', newline='', buffering=1024 * 1024)
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(FIELDS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, card):
+        self._rows.append((card.question, card.answer, card.source, card.chunk, card.page, card.model))
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self._csv.writerows(self._rows)
+            self._rows = []
+        return True
+
+    def write_all(self, cards):
+        for card in cards:
+            self.write(card)
+        return self.count
+
+    def close(self):
+        if self._file is not None:
+            self._csv.writerows(self._rows)
+            self._rows = []
+            self._file.close()
+            self._file = None
+
+
+def _anki_field(text):
+    # Anki fields are HTML
+    return html.escape(text, False).replace('\n', '<br>')
+
+
+def _anki_guid(card):
+    digest = hashlib.sha1(f"{card.question}\x1f{card.answer}".encode('utf-8')).digest()
+    return base64.b64encode(digest[:9], b'-_').decode('ascii')
+
+
+def _anki_checksum(text):
+    # What Anki uses to spot duplicate notes: first 8 hex digits of the sort field's SHA-1
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+@functools.lru_cache(maxsize=256)
+def _anki_tag(source):
+    if not source:
+        return ''
+    stem = os.path.splitext(os.path.basename(str(source)))[0]
+    tag = re.sub(r'\s+', '_', stem.strip())
+    return f" {tag} " if tag else ''
+
+
+class ApkgWriter:
+    # Cards go into a temporary collection in batches; close() fills in the deck and note
+    # type and zips the collection into the .apkg
+    def __init__(self, output_file, title=None, batch_size=1000):
+        self.output_file = output_file
+        self.title = title or _deck_name(output_file)
+        self.batch_size = batch_size
+        self.count = 0
+        self.now = int(time.time())
+        # Note and card ids are millisecond timestamps in Anki; count up from now
+        self._first_id = int(time.time() * 1000)
+        self.deck_id = 1 << 40 | _anki_checksum(self.title)
+        self._notes = []
+        self._cards = []
+        fd, self._collection = tempfile.mkstemp(suffix='.anki2', dir=os.path.dirname(os.path.abspath(output_file)))
+        os.close(fd)
+        self._db = sqlite3.connect(self._collection)
+        # A throwaway file that's zipped straight away, so skip the journal and fsyncs
+        self._db.execute('PRAGMA journal_mode = OFF')
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._db.executescript(ANKI_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush_rows(self):
+        if self._notes:
+            self._db.executemany('INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)', self._notes)
+            self._db.executemany('INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', self._cards)
+            self._notes = []
+            self._cards = []
+
+    def write(self, card):
+        note_id = self._first_id + self.count
+        front = _anki_field(card.question)
+        self._notes.append((note_id, _anki_guid(card), ANKI_MODEL_ID, self.now, -1, _anki_tag(card.source),
+                            front + '\x1f' + _anki_field(card.answer), front, _anki_checksum(card.question), 0, ''))
+        # New card, due in deck order
+        self._cards.append((note_id, note_id, self.deck_id, 0, self.now, -1, 0, 0, self.count,
+                            0, 0, 0, 0, 0, 0, 0, 0, ''))
+        self.count += 1
+        if len(self._notes) >= self.batch_size:
+            self._flush_rows()
+        return True
+
+    def write_all(self, cards):
+        for card in cards:
+            self.write(card)
+        return self.count
+
+    def _collection_row(self):
+        model = {
+            "id": ANKI_MODEL_ID, "name": ANKI_MODEL_NAME, "type": 0, "mod": self.now, "usn": -1, "sortf": 0,
+            "did": self.deck_id, "tags": [], "vers": [], "css": ANKI_CSS,
+            "flds": [{"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20,
+                      "media": []} for i, name in enumerate(("Question", "Answer"))],
+            "tmpls": [{"name": "Card 1", "ord": 0, "qfmt": "{{Question}}",
+                       "afmt": "{{FrontSide}}\n\n<hr id=answer>\n\n{{Answer}}",
+                       "did": None, "bqfmt": "", "bafmt": ""}],
+            "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage[utf8]{inputenc}\n"
+                        "\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n"
+                        "\\begin{document}\n",
+            "latexPost": "\\end{document}",
+            "req": [[0, "any", [0]]],
+        }
+
+        def deck(deck_id, name):
+            return {"id": deck_id, "name": name, "mod": self.now, "usn": -1, "desc": "", "dyn": 0, "conf": 1,
+                    "collapsed": False, "extendNew": 10, "extendRev": 50, "lrnToday": [0, 0], "revToday": [0, 0],
+                    "newToday": [0, 0], "timeToday": [0, 0]}
+
+        decks = {"1": deck(1, "Default"), str(self.deck_id): deck(self.deck_id, self.title)}
+        dconf = {"1": {
+            "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+            "replayq": True, "dyn": False,
+            "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1, "perDay": 20,
+                    "bury": True, "separate": True},
+            "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+            "rev": {"perDay": 200, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1,
+                    "bury": True},
+        }}
+        conf = {"nextPos": self.count + 1, "estTimes": True, "activeDecks": [1], "sortType": "noteFld",
+                "timeLim": 0, "sortBackwards": False, "addToCur": True, "curDeck": 1, "newBury": True,
+                "newSpread": 0, "dueCounts": True, "curModel": str(ANKI_MODEL_ID), "collapseTime": 1200}
+        return (1, self.now - self.now % 86400, self.now * 1000, self._first_id, 11, 0, 0, 0, json.dumps(conf),
+                json.dumps({str(ANKI_MODEL_ID): model}), json.dumps(decks), json.dumps(dconf), json.dumps({}))
+
+    def close(self):
+        if self._db is None:
+            return
+        try:
+            self._flush_rows()
+            self._db.execute('INSERT INTO col VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)', self._collection_row())
+            self._db.executescript(ANKI_INDEXES)
+            self._db.commit()
+            self._db.close()
+            self._db = None
+            # Level 1 packs card text nearly as small as the default level, in a fraction of the time
+            with zipfile.ZipFile(self.output_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as package:
+                package.write(self._collection, 'collection.anki2')
+                package.writestr('media', '{}')
+        finally:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            os.remove(self._collection)
+
+
+def _whole_card(card, source=None):
+    # Flashcard for a card with both sides, None (and a note) for anything else
+    parts = split_flashcard(card)
+    if parts is None:
+        print(f"Skipping malformed flashcard: {card}")
+        return None
+    return card if isinstance(card, Flashcard) else Flashcard(*parts, source)
+
+
+class DeckExporter:
+    # Writes one deck in several formats in a single pass: deck.html, deck.apkg, ...
+    # output_file names the deck (the other formats swap the extension); html_options go to
+    # DeckWriter, and flush_each only matters there, the other files are done at close().
+    # source is recorded on cards that arrive as Q:/A: strings
+    def __init__(self, output_file=None, formats=('html',), output_dir=None, title=None, flush_each=True,
+                 source=None, **html_options):
+        self.output_file = output_file or default_output_path(output_dir)
+        self.source = source
+        self.formats = list(formats) or ['html']
+        self.count = 0
+        self.writers = []
+        try:
+            for fmt in self.formats:
+                path = export_path(self.output_file, fmt)
+                if fmt == 'html':
+                    writer = DeckWriter(path, flush_each=flush_each, **html_options)
+                elif fmt == 'apkg':
+                    writer = ApkgWriter(path, title)
+                elif fmt == 'csv':
+                    writer = CsvWriter(path, title)
+                else:
+                    writer = JsonlWriter(path, title)
+                self.writers.append(writer)
+        except BaseException:
+            self.close()
+            raise
+        self.output_files = [writer.output_file for writer in self.writers]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, card):
+        card = _whole_card(card, self.source)
+        if card is None:
+            return False
+        for writer in self.writers:
+            writer.write(card)
+        self.count += 1
+        return True
+
+    def write_all(self, cards, batch_size=1000):
+        # Hand the writers whole batches, which lets the HTML writer join its fragments
+        batch = []
+        for card in cards:
+            card = _whole_card(card, self.source)
+            if card is None:
+                continue
+            batch.append(card)
+            if len(batch) >= batch_size:
+                self._write_batch(batch)
+                batch = []
+        self._write_batch(batch)
+        return self.count
+
+    def _write_batch(self, batch):
+        for writer in self.writers:
+            writer.write_all(batch)
+        self.count += len(batch)
+
+    def close(self):
+        # Close every writer even if one fails, so no file handle or temp file is left behind
+        error = None
+        for writer in self.writers:
+            try:
+                writer.close()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
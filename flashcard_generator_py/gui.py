@@ -0,0 +1,424 @@
+# gui.py
+
+import os
+import queue
+import threading
+import customtkinter as ctk
+from tkinter import filedialog
+from CTkMessagebox import CTkMessagebox
+from dotenv import load_dotenv
+from cache import FlashcardCache
+from flashcard_generator import process_pdf
+from html_deck import default_output_path
+from jobs import JobStore, JobRunner, DONE, FAILED, RUNNING, CANCELLED
+from progress import describe
+from tracing import format_summary
+
+# Tk slows to a crawl laying out megabytes of text, so bigger PDFs only show their first pages
+PREVIEW_CHARS = 100000
+PREVIEW_PAGES = 5
+
+class FlashcardGeneratorGUI:
+    def __init__(self):
+        self.window = ctk.CTk()
+        self.window.title("Flashcard Generator")
+        self.window.geometry("800x720")
+        
+        # Theme is set once in main() before the window exists
+        
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_rowconfigure(1, weight=1)
+        
+        #Header
+        self.header = ctk.CTkLabel(
+            self.window,
+            text="Flashcard Generator",
+            font=("Helvetica", 24, "bold")
+        )
+        self.header.grid(row=0, column=0, pady=20, sticky="ew")
+        
+        # Cmain frame
+        self.main_frame = ctk.CTkFrame(self.window)
+        self.main_frame.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.main_frame.grid_columnconfigure(0, weight=1)
+        self.main_frame.grid_rowconfigure(1, weight=1)
+        
+        # Create input selection 
+        self.input_frame = ctk.CTkFrame(self.main_frame)
+        self.input_frame.grid(row=0, column=0, padx=20, pady=20, sticky="ew")
+        
+        # type selector
+        self.input_type = ctk.CTkSegmentedButton(
+            self.input_frame,
+            values=["Text Input", "PDF Upload"],
+            command=self.toggle_input_type
+        )
+        self.input_type.grid(row=0, column=0, padx=20, pady=20)
+        self.input_type.set("Text Input")
+
+        # Shown instead of the full text when a large PDF is loaded
+        self.preview_label = ctk.CTkLabel(self.input_frame, text="", font=("Helvetica", 12))
+        self.clear_pdf_button = ctk.CTkButton(
+            self.input_frame,
+            text="Clear",
+            command=self.clear_pdf,
+            width=80
+        )
+        
+        # text input
+        self.text_input = ctk.CTkTextbox(
+            self.main_frame,
+            height=300,
+            font=("Helvetica", 12)
+        )
+        self.text_input.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        
+        # PDF upload button (its hidden in the beginning)
+        self.pdf_button = ctk.CTkButton(
+            self.main_frame,
+            text="Select PDF File",
+            command=self.select_pdf,
+            height=40
+        )
+        self.pdf_progress = ctk.CTkProgressBar(self.main_frame)
+
+        # Full text of a PDF too large to put in the textbox; generation uses this instead
+        self.pdf_path = None
+        self.pdf_text = None
+        
+        # Make generate button
+        self.generate_button = ctk.CTkButton(
+            self.main_frame,
+            text="Generate Flashcards",
+            command=self.generate_flashcards,
+            height=40
+        )
+        self.generate_button.grid(row=2, column=0, padx=20, pady=20, sticky="ew")
+        
+        
+        # Progress of the job started last, with a button to stop it
+        self.progress_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        self.progress_frame.grid_columnconfigure(0, weight=1)
+        self.progress = ctk.CTkProgressBar(self.progress_frame)
+        self.progress.set(0)
+        self.progress.grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        self.cancel_button = ctk.CTkButton(
+            self.progress_frame,
+            text="Cancel",
+            command=self.cancel_active_job,
+            width=80
+        )
+        self.cancel_button.grid(row=0, column=1)
+        
+        # Status label
+        self.status_label = ctk.CTkLabel(
+            self.main_frame,
+            text="",
+            font=("Helvetica", 12)
+        )
+        self.status_label.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
+
+        # Jobs are stored on disk, so anything unfinished from last time carries on here
+        self.jobs_box = ctk.CTkTextbox(self.main_frame, height=90, font=("Helvetica", 11))
+        self.jobs_box.grid(row=5, column=0, padx=20, pady=(0, 10), sticky="ew")
+        self.jobs_box.configure(state="disabled")
+        self.retry_button = ctk.CTkButton(
+            self.main_frame,
+            text="Retry Failed Jobs",
+            command=self.retry_failed_jobs,
+            height=30
+        )
+        self.retry_button.grid(row=6, column=0, padx=20, pady=(0, 20), sticky="ew")
+
+        # Run summary (time per stage, tokens, cost, cache hits) of each job as it ends
+        self.log_box = ctk.CTkTextbox(self.main_frame, height=100, font=("Courier", 11))
+        self.log_box.grid(row=7, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.log_box.configure(state="disabled")
+
+        self.session_jobs = set()
+        self.active_job = None
+        self._latest_progress = None
+        self._progress_lock = threading.Lock()
+        # Tk isn't thread-safe, so other threads queue calls here and the Tk thread runs them
+        self._ui_calls = queue.Queue()
+        self.run_ui_calls()
+        self.store = JobStore()
+        self.runner = JobRunner(self.store, on_update=self.on_job_update, on_progress=self.on_job_progress,
+                                on_summary=self.on_job_summary, cache=FlashcardCache(), stream=True)
+        self.runner.start_thread()
+        # Each job is claimed before it runs, so one 'jobs run' has already picked up is left to it
+        for job_id in self.store.unfinished_jobs():
+            self.runner.submit(job_id)
+        self.poll_jobs()
+
+    def call_in_ui(self, callback):
+        # Safe from any thread
+        self._ui_calls.put(callback)
+
+    def run_ui_calls(self):
+        while True:
+            try:
+                callback = self._ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        self.window.after(50, self.run_ui_calls)
+        
+    def toggle_input_type(self, value):
+        if value == "Text Input":
+            self.pdf_button.grid_remove()
+            self.text_input.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        else:
+            self.text_input.grid_remove()
+            self.pdf_button.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+            
+    def select_pdf(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("PDF files", "*.pdf")]
+        )
+        if not file_path:
+            return
+        # Extraction can take minutes on a big PDF, so it runs on its own thread
+        self.input_type.configure(state="disabled")
+        self.generate_button.configure(state="disabled")
+        self.pdf_button.grid_remove()
+        self.pdf_progress.set(0)
+        self.pdf_progress.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.status_label.configure(text=f"Reading {os.path.basename(file_path)}...")
+        threading.Thread(target=self.load_pdf, args=(file_path,), daemon=True).start()
+
+    def load_pdf(self, file_path):
+        name = os.path.basename(file_path)
+
+        def on_page(done, total):
+            # ~100 updates at most, however many pages there are
+            if done == total or done % max(1, total // 100) == 0:
+                self.call_in_ui(lambda: self.show_pdf_progress(name, done, total))
+
+        text = process_pdf(file_path, on_page=on_page)
+        self.call_in_ui(lambda: self.pdf_loaded(file_path, text))
+
+    def show_pdf_progress(self, name, done, total):
+        self.pdf_progress.set(done / total)
+        self.status_label.configure(text=f"Reading {name}: page {done} of {total}")
+
+    def pdf_loaded(self, file_path, text):
+        self.pdf_progress.grid_remove()
+        self.input_type.configure(state="normal")
+        self.generate_button.configure(state="normal")
+        self.status_label.configure(text="")
+        if not text:
+            self.toggle_input_type("PDF Upload")
+            CTkMessagebox(
+                title="Error",
+                message="Failed to process PDF file",
+                icon="cancel"
+            )
+            return
+
+        self.clear_pdf()
+        pages = text.split('\f')
+        if len(text) > PREVIEW_CHARS:
+            self.pdf_path = file_path
+            self.pdf_text = text
+            preview = "\n\n".join(pages[:PREVIEW_PAGES])[:PREVIEW_CHARS]
+            self.text_input.insert("1.0", preview + "\n\n[...]")
+            self.text_input.configure(state="disabled")
+            self.preview_label.configure(
+                text=f"Preview of {os.path.basename(file_path)}: first {min(PREVIEW_PAGES, len(pages))} "
+                     f"of {len(pages)} pages ({len(text):,} characters). Generate uses the whole PDF."
+            )
+            self.preview_label.grid(row=0, column=1, padx=(0, 10), pady=20, sticky="w")
+            self.clear_pdf_button.grid(row=0, column=2, padx=(0, 20), pady=20)
+        else:
+            self.text_input.insert("1.0", text)
+        self.toggle_input_type("Text Input")
+        self.input_type.set("Text Input")
+        CTkMessagebox(
+            title="Success",
+            message=f"PDF loaded successfully! ({len(pages)} pages)",
+            icon="check"
+        )
+
+    def clear_pdf(self):
+        # Leaves preview mode and empties the textbox for typing again
+        self.pdf_path = None
+        self.pdf_text = None
+        self.preview_label.grid_remove()
+        self.clear_pdf_button.grid_remove()
+        self.text_input.configure(state="normal")
+        self.text_input.delete("1.0", "end")
+
+    def generate_flashcards(self):
+        if self.pdf_text is not None:
+            source, text = self.pdf_path, self.pdf_text
+        else:
+            source, text = "text box", self.text_input.get("1.0", "end").strip()
+        if not text:
+            CTkMessagebox(
+                title="Error",
+                message="Please enter some text or upload a PDF",
+                icon="cancel"
+            )
+            return
+            
+        # Chunks are committed as they finish, so closing the app midway loses almost nothing.
+        # Sections that haven't changed since the last Generate come from the cache.
+        output_file = default_output_path()
+        job_id = self.store.add_job(source, output_file, text=text, options={'document_id': source})
+        self.session_jobs.add(job_id)
+        self.runner.submit(job_id)
+        self.active_job = job_id
+        self.status_label.configure(text=f"Generating flashcards (job {job_id})...")
+        self.progress.set(0)
+        self.cancel_button.configure(state="normal")
+        self.progress_frame.grid(row=4, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.refresh_jobs()
+
+    def on_job_progress(self, job_id, event, snapshot):
+        # Runner thread. Events can arrive hundreds of times a second, so keep only the
+        # latest snapshot and queue one call for the Tk thread to pick it up.
+        if job_id != self.active_job:
+            return
+        with self._progress_lock:
+            scheduled = self._latest_progress is not None
+            self._latest_progress = (job_id, snapshot)
+        if not scheduled:
+            self.call_in_ui(self.apply_progress)
+
+    def apply_progress(self):
+        with self._progress_lock:
+            job_id, snapshot = self._latest_progress
+            self._latest_progress = None
+        if job_id != self.active_job or snapshot['finished']:
+            return
+        self.progress.set(snapshot['fraction'])
+        self.status_label.configure(text=f"Job {job_id}: {describe(snapshot)}")
+
+    def cancel_active_job(self):
+        if self.active_job is not None:
+            self.runner.cancel(self.active_job)
+            self.cancel_button.configure(state="disabled")
+            self.status_label.configure(text=f"Cancelling job {self.active_job}...")
+
+    def finish_active_job(self, job_id):
+        if job_id == self.active_job:
+            self.active_job = None
+            self.progress_frame.grid_remove()
+
+    def on_job_update(self, job_id, status):
+        # Called from the job runner's thread; only touch widgets through call_in_ui
+        if status == RUNNING or job_id not in self.session_jobs:
+            return
+        job = self.store.get_job(job_id)
+        self.call_in_ui(lambda: self.finish_active_job(job_id))
+        if status == DONE:
+            def done():
+                self.status_label.configure(text=f"Flashcards generated successfully! (job {job_id})")
+                import webbrowser
+                webbrowser.open(f'file://{os.path.abspath(job["output_file"])}')
+            self.call_in_ui(done)
+        elif status == CANCELLED:
+            self.call_in_ui(lambda: self.status_label.configure(
+                text=f"Cancelled job {job_id}; Retry Failed Jobs picks it up again"
+            ))
+        elif status == FAILED:
+            message = f"Job {job_id} failed: {job['error']}"
+            self.call_in_ui(lambda: self.status_label.configure(text="Failed to generate flashcards"))
+            self.call_in_ui(lambda: CTkMessagebox(title="Error", message=message, icon="cancel"))
+
+    def on_job_summary(self, job_id, summary):
+        # Runner thread, like on_job_update
+        if job_id in self.session_jobs:
+            text = f"Job {job_id}: {format_summary(summary)}"
+            self.call_in_ui(lambda: self.log(text))
+
+    def log(self, text):
+        self.log_box.configure(state="normal")
+        self.log_box.insert("end", text + "\n\n")
+        self.log_box.see("end")
+        self.log_box.configure(state="disabled")
+
+    def retry_failed_jobs(self):
+        for job in self.store.list_jobs([FAILED, CANCELLED]):
+            self.session_jobs.add(job['id'])
+            self.runner.submit(job['id'], retry_failed=True)
+        self.refresh_jobs()
+
+    def refresh_jobs(self):
+        lines = []
+        for job in self.store.list_jobs()[-20:]:
+            progress = f"{job['chunks_done']}/{job['chunks']} chunks" if job['chunks'] else ""
+            source = os.path.basename(job['source'])
+            lines.append(f"#{job['id']}  {job['status']:<8} {progress:<14} {source}  {job['error'] or ''}".rstrip())
+        self.jobs_box.configure(state="normal")
+        self.jobs_box.delete("1.0", "end")
+        self.jobs_box.insert("1.0", "\n".join(reversed(lines)) or "No jobs yet")
+        self.jobs_box.configure(state="disabled")
+
+    def poll_jobs(self):
+        self.refresh_jobs()
+        self.window.after(1000, self.poll_jobs)
+        
+    def run(self):
+        self.window.mainloop()
+
+
+def setup_api_key():
+    if not os.path.exists('.env'):
+        dialog = ctk.CTkInputDialog(
+            text="Please enter your OpenAI API key:",
+            title="API Key Setup",
+        )
+        api_key = dialog.get_input()
+        
+        if api_key and api_key.strip():
+            try:
+                with open('.env', 'w') as f:
+                    f.write(f'OPENAI_API_KEY={api_key.strip()}')
+                return True
+            except Exception as e:
+                CTkMessagebox(
+                    title="Error",
+                    message=f"Failed to save API key: {str(e)}",
+                    icon="cancel"
+                )
+                return False
+        else:
+            CTkMessagebox(
+                title="Error",
+                message="No API key provided. The application requires an OpenAI API key to function.",
+                icon="cancel"
+            )
+            return False
+    return True
+
+def main():
+    # Initialize customtkinter before any GUI operations
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("green")
+    
+    # Check for API key
+    if not os.path.exists('.env'):
+        if not setup_api_key():
+            return
+    
+    load_dotenv()
+    api_key = os.getenv('OPENAI_API_KEY')
+    
+    if not api_key:
+        print("No API key found!")
+        if not setup_api_key():
+            return
+        load_dotenv()  # Reload environment after creating .env for api key
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            CTkMessagebox(
+                title="Error",
+                message="Could not load API key. Please restart the application.",
+                icon="cancel"
+            )
+            return
+    
+    app = FlashcardGeneratorGUI()
+    app.run()
@@ -0,0 +1,563 @@
+# html_deck.py
+
+import datetime
+import functools
+import html
+import json
+import os
+
+from cards import Flashcard, split_card
+
+HEAD_START = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Flashcards</title>
+'''
+
+STYLE = '''        body { 
+            font-family: 'Segoe UI', Arial, sans-serif;
+            max-width: 800px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #1a1a1a;
+            color: #fff;
+            min-height: 100vh;
+            line-height: 1.6;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+        }
+        h1 {
+            text-align: center;
+            color: #fff;
+            margin-bottom: 30px;
+            font-size: 2.5em;
+            text-shadow: 0 0 10px rgba(255,255,255,0.1);
+        }
+        #flashcards {
+            position: relative;
+            width: 100%;
+            height: 60vh;
+            min-height: 400px;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+        .flashcard { 
+            position: absolute;
+            width: 90%;
+            max-width: 600px;
+            min-height: 300px;
+            background: linear-gradient(145deg, #2d2d2d, #2a2a2a);
+            border: 1px solid #3d3d3d;
+            border-radius: 15px;
+            box-shadow: 0 4px 15px rgba(0,0,0,0.2);
+            padding: 40px;
+            display: flex;
+            flex-direction: column;
+            justify-content: center;
+            cursor: pointer;
+            transition: transform 0.6s;
+            transform-style: preserve-3d;
+            opacity: 0;
+            visibility: hidden;
+        }
+        .flashcard.active {
+            opacity: 1;
+            visibility: visible;
+        }
+        .flashcard.flipped {
+            transform: rotateX(180deg);
+        }
+        .question, .answer { 
+            backface-visibility: hidden;
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            bottom: 0;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 40px;
+            text-align: center;
+        }
+        .question {
+            font-weight: 600;
+            font-size: 1.8em;
+            color: #fff;
+            transform: rotateX(0deg);
+        }
+        .answer { 
+            color: #d4d4d4;
+            font-size: 1.4em;
+            letter-spacing: 0.2px;
+            transform: rotateX(180deg);
+            border-top: none;
+        }
+        #progress-bar {
+            position: fixed;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 4px;
+            background: #333;
+            z-index: 1000;
+        }
+        #progress-fill {
+            height: 100%;
+            width: 0%;
+            background: linear-gradient(90deg, #4CAF50, #8BC34A);
+            transition: width 0.3s ease;
+        }
+        #card-counter {
+            position: fixed;
+            top: 20px;
+            left: 50%;
+            transform: translateX(-50%);
+            background: rgba(45, 45, 45, 0.9);
+            padding: 8px 16px;
+            border-radius: 8px;
+            font-size: 1.1em;
+            z-index: 1000;
+        }
+        .navigation {
+            margin-top: 20px;
+            display: flex;
+            gap: 20px;
+            z-index: 1000;
+        }
+        .navigation button {
+            padding: 12px 24px;
+            font-size: 1.1em;
+            border: none;
+            border-radius: 8px;
+            background: #4CAF50;
+            color: white;
+            cursor: pointer;
+            transition: all 0.3s ease;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.2);
+        }
+        .navigation button:hover:not(:disabled) {
+            background: #45a049;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 12px rgba(0,0,0,0.3);
+        }
+        .navigation button:disabled {
+            background: #666;
+            cursor: not-allowed;
+            opacity: 0.5;
+        }
+        #shortcuts-info {
+            position: fixed;
+            bottom: 20px;
+            right: 20px;
+            background: rgba(45, 45, 45, 0.9);
+            padding: 10px 15px;
+            border-radius: 8px;
+            font-size: 0.8em;
+            color: #aaa;
+        }
+        @keyframes fadeIn {
+            from { opacity: 0; transform: translateY(10px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+'''
+
+SCRIPT = '''        document.addEventListener('DOMContentLoaded', function() {
+            const cards = document.querySelectorAll('.flashcard');
+            let currentCard = 0;
+
+            function showCard(index) {
+                cards.forEach((card, i) => {
+                    card.classList.remove('active');
+                    if (i === index) {
+                        card.classList.add('active');
+                    }
+                });
+                updateNavButtons();
+                updateProgress();
+            }
+
+            window.nextCard = function() {
+                if (currentCard < cards.length - 1) {
+                    currentCard++;
+                    showCard(currentCard);
+                }
+            }
+
+            window.previousCard = function() {
+                if (currentCard > 0) {
+                    currentCard--;
+                    showCard(currentCard);
+                }
+            }
+
+            function updateNavButtons() {
+                document.getElementById('prevBtn').disabled = currentCard === 0;
+                document.getElementById('nextBtn').disabled = currentCard === cards.length - 1;
+            }
+
+            function updateProgress() {
+                const progress = ((currentCard + 1) / cards.length) * 100;
+                document.getElementById('progress-fill').style.width = progress + '%';
+                document.getElementById('card-counter').textContent = `Card ${currentCard + 1} of ${cards.length}`;
+            }
+
+            document.addEventListener('keydown', (e) => {
+                if (e.code === 'ArrowLeft' && currentCard > 0) {
+                    previousCard();
+                }
+                if (e.code === 'ArrowRight' && currentCard < cards.length - 1) {
+                    nextCard();
+                }
+                if (e.code === 'Space' && cards.length) {
+                    e.preventDefault();
+                    toggleAnswer({ currentTarget: cards[currentCard] });
+                }
+            });
+
+            window.toggleAnswer = function(event) {
+                const card = event.currentTarget;
+                card.classList.toggle('flipped');
+            }
+
+            // Initialize
+            showCard(0);
+        });
+'''
+
+BODY_START = '''</head>
+<body>
+    <div id="progress-bar">
+        <div id="progress-fill"></div>
+    </div>
+    <div id="card-counter"></div>
+    <div id="flashcards">'''
+
+NAVIGATION = '''
+    </div>
+    <div class="navigation">
+        <button id="prevBtn" onclick="previousCard()">← Previous</button>
+        <button id="nextBtn" onclick="nextCard()">Next →</button>
+    </div>
+    <div id="shortcuts-info">
+        Shortcuts: ← Previous | → Next | Space Toggle
+    </div>'''
+
+PAGE_END = '''
+</body>
+</html>'''
+
+HTML_FOOTER = NAVIGATION + PAGE_END
+
+# Virtual viewer: the deck is embedded as JSON and only the current card and its
+# neighbours exist in the DOM, so navigation cost doesn't grow with deck size.
+VIRTUAL_SCRIPT = '''        document.addEventListener('DOMContentLoaded', function() {
+            const data = document.getElementById('flashcard-data');
+            const cards = window.FLASHCARDS || (data ? JSON.parse(data.textContent) : []);
+            // Only three card elements exist; card i always lives in slot i % 3
+            const slots = document.querySelectorAll('.flashcard');
+            const flipped = new Uint8Array(cards.length);
+            let currentCard = 0;
+            let activeSlot = null;
+
+            function fillSlot(index) {
+                const slot = slots[index % 3];
+                if (slot.dataset.index !== String(index)) {
+                    slot.dataset.index = index;
+                    slot.querySelector('.question').textContent = cards[index][0];
+                    slot.querySelector('.answer').textContent = cards[index][1];
+                    // Restore this card's flip state without animating it off-screen
+                    slot.style.transition = 'none';
+                    slot.classList.toggle('flipped', flipped[index] === 1);
+                    void slot.offsetWidth;
+                    slot.style.transition = '';
+                }
+            }
+
+            function showCard(index) {
+                if (activeSlot) {
+                    activeSlot.classList.remove('active');
+                }
+                for (let i = Math.max(0, index - 1); i <= Math.min(cards.length - 1, index + 1); i++) {
+                    fillSlot(i);
+                }
+                activeSlot = slots[index % 3];
+                activeSlot.classList.add('active');
+                updateNavButtons();
+                updateProgress();
+            }
+
+            window.nextCard = function() {
+                if (currentCard < cards.length - 1) {
+                    currentCard++;
+                    showCard(currentCard);
+                }
+            }
+
+            window.previousCard = function() {
+                if (currentCard > 0) {
+                    currentCard--;
+                    showCard(currentCard);
+                }
+            }
+
+            function updateNavButtons() {
+                document.getElementById('prevBtn').disabled = currentCard === 0;
+                document.getElementById('nextBtn').disabled = currentCard === cards.length - 1;
+            }
+
+            function updateProgress() {
+                const progress = ((currentCard + 1) / cards.length) * 100;
+                document.getElementById('progress-fill').style.width = progress + '%';
+                document.getElementById('card-counter').textContent = `Card ${currentCard + 1} of ${cards.length}`;
+            }
+
+            document.addEventListener('keydown', (e) => {
+                if (e.code === 'ArrowLeft' && currentCard > 0) {
+                    previousCard();
+                }
+                if (e.code === 'ArrowRight' && currentCard < cards.length - 1) {
+                    nextCard();
+                }
+                // Nothing to flip in an empty deck
+                if (e.code === 'Space' && activeSlot) {
+                    e.preventDefault();
+                    toggleAnswer({ currentTarget: activeSlot });
+                }
+            });
+
+            window.toggleAnswer = function(event) {
+                const card = event.currentTarget;
+                if (card.dataset.index === undefined) {
+                    return;
+                }
+                const index = Number(card.dataset.index);
+                flipped[index] ^= 1;
+                card.classList.toggle('flipped', flipped[index] === 1);
+            }
+
+            // Initialize
+            if (cards.length) {
+                showCard(0);
+            }
+        });
+'''
+
+VIRTUAL_SLOTS = '''
+        <div class="flashcard" onclick="toggleAnswer(event)"><div class="question"></div><div class="answer"></div></div>
+        <div class="flashcard" onclick="toggleAnswer(event)"><div class="question"></div><div class="answer"></div></div>
+        <div class="flashcard" onclick="toggleAnswer(event)"><div class="question"></div><div class="answer"></div></div>'''
+
+VIEWERS = ('dom', 'virtual')
+# With no viewer given, decks with more cards than this get the virtual viewer
+VIRTUAL_THRESHOLD = 500
+
+# Names of the shared asset files written next to decks when shared_assets=True
+STYLE_FILE = "flashcards.css"
+SCRIPT_FILE = "flashcards.js"
+VIRTUAL_SCRIPT_FILE = "flashcards-virtual.js"
+
+CARD_TEMPLATE = '''
+        <div class="flashcard" onclick="toggleAnswer(event)">
+            <div class="question">{question}</div>
+            <div class="answer">{answer}</div>
+        </div>'''
+
+
+def _viewer_script(viewer):
+    if viewer not in VIEWERS:
+        raise ValueError(f"Unknown viewer {viewer!r}, expected one of {', '.join(VIEWERS)}")
+    return (SCRIPT, SCRIPT_FILE) if viewer == 'dom' else (VIRTUAL_SCRIPT, VIRTUAL_SCRIPT_FILE)
+
+
+@functools.lru_cache(maxsize=None)
+def render_shell(shared_assets=False, viewer='dom'):
+    # The static parts of the page never change, so build them once per process
+    script, script_file = _viewer_script(viewer)
+    if shared_assets:
+        assets = (f'    <link rel="stylesheet" href="{STYLE_FILE}">\n'
+                  f'    <script src="{script_file}"></script>\n')
+    else:
+        assets = f"    <style>\n{STYLE}    </style>\n    <script>\n{script}    </script>\n"
+    if viewer == 'dom':
+        return HEAD_START + assets + BODY_START, HTML_FOOTER
+    # Card data goes between the navigation and the end of the page
+    return HEAD_START + assets + BODY_START + VIRTUAL_SLOTS + NAVIGATION, PAGE_END
+
+
+def write_shared_assets(directory, viewer='dom'):
+    # One copy of the CSS/JS for a whole folder of decks instead of one per file
+    script, script_file = _viewer_script(viewer)
+    for name, content in ((STYLE_FILE, STYLE), (script_file, script)):
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() == content:
+                    continue
+        except OSError:
+            pass
+        with open(path, "w", encoding='utf-8') as f:
+            f.write(content)
+
+
+def split_flashcard(flashcard):
+    # Takes a Flashcard or a "Q: ...\nA: ..." string; None if it isn't a whole card
+    if not isinstance(flashcard, Flashcard) and not (flashcard.strip() and 'Q:' in flashcard and 'A:' in flashcard):
+        return None
+    question, answer = split_card(flashcard)
+    if not question or not answer:
+        return None
+    return question, answer
+
+
+_CARD_START, _rest = CARD_TEMPLATE.split('{question}')
+_CARD_MIDDLE, _CARD_END = _rest.split('{answer}')
+
+
+def card_fragment(question, answer):
+    # Card text comes from the model (and the user's document), so it must not be able to inject markup.
+    # Plain concatenation is noticeably faster than str.format on 50k-card decks.
+    return _CARD_START + html.escape(question, False) + _CARD_MIDDLE + html.escape(answer, False) + _CARD_END
+
+
+def card_json(question, answer):
+    # The viewer sets textContent, so no HTML escaping; "<" is escaped so the data can't close its <script>
+    return json.dumps([question, answer], ensure_ascii=False, separators=(',', ':')).replace('<', '\\u003c')
+
+
+def sidecar_path(output_file):
+    # deck.html -> deck.cards.js; batch mode writes to deck.html.part first, so ignore that suffix
+    if output_file.endswith('.part'):
+        output_file = output_file[:-len('.part')]
+    return os.path.splitext(output_file)[0] + '.cards.js'
+
+
+def default_output_path(output_dir=None):
+    # Downloads folder unless the caller picked a directory
+    downloads_path = output_dir or os.path.join(os.path.expanduser('~'), 'Downloads')
+
+    # Gen filename with timestamp
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"flashcards_{timestamp}.html"
+    return os.path.normpath(os.path.join(downloads_path, filename))
+
+
+class DeckWriter:
+    # Writes the page card by card through a buffered file, so cost is linear in deck size.
+    # With flush_each the file is usable while generation is still running.
+    # viewer='virtual' writes cards as JSON for the virtualized viewer, either embedded in
+    # the page or, with sidecar=True, into a deck.cards.js file next to it.
+    # viewer=None picks like create_html does, but without knowing the deck size up front:
+    # the first VIRTUAL_THRESHOLD cards are held back, and the page is started with the DOM
+    # viewer if the deck ends there or the virtual one once it grows past it.
+    def __init__(self, output_file=None, flush_each=True, shared_assets=False, viewer='dom', sidecar=False):
+        self.output_file = output_file or default_output_path()
+        self.flush_each = flush_each
+        self.shared_assets = shared_assets
+        self.sidecar = sidecar
+        self.viewer = viewer
+        self.count = 0
+        self._file = None
+        self._held = None
+        if viewer is None:
+            self._held = []
+        else:
+            self._open(viewer)
+
+    def _open(self, viewer):
+        _viewer_script(viewer)
+        self.viewer = viewer
+        header, self._footer = render_shell(self.shared_assets, viewer)
+        if self.shared_assets:
+            write_shared_assets(os.path.dirname(os.path.abspath(self.output_file)), viewer)
+        self._file = open(self.output_file, "w", encoding='utf-8', buffering=1024 * 1024)
+        self._file.write(header)
+        self._data = self._file
+        self._data_end = ''
+        if viewer == 'virtual':
+            if self.sidecar:
+                data_file = sidecar_path(self.output_file)
+                self._file.write(f'\n    <script src="{os.path.basename(data_file)}"></script>')
+                self._data = open(data_file, "w", encoding='utf-8', buffering=1024 * 1024)
+                self._data.write('window.FLASHCARDS = [')
+                self._data_end = '];\n'
+            else:
+                self._file.write('\n    <script type="application/json" id="flashcard-data">[')
+                self._data_end = ']</script>'
+        if self.flush_each:
+            self._flush()
+
+    def _release(self, viewer):
+        # Starts the page now that the viewer is known and writes the held-back cards into it
+        held, self._held = self._held, None
+        self._open(viewer)
+        self._data.write(''.join(self._fragment(parts, i) for i, parts in enumerate(held)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush(self):
+        self._file.flush()
+        if self._data is not self._file:
+            self._data.flush()
+
+    def _fragment(self, parts, index):
+        if self.viewer == 'dom':
+            return card_fragment(*parts)
+        return card_json(*parts) if index == 0 else ',' + card_json(*parts)
+
+    def write(self, flashcard):
+        parts = split_flashcard(flashcard)
+        if parts is None:
+            print(f"Skipping malformed flashcard: {flashcard}")
+            return False
+        self.count += 1
+        if self._held is not None:
+            self._held.append(parts)
+            if len(self._held) > VIRTUAL_THRESHOLD:
+                self._release('virtual')
+            return True
+        self._data.write(self._fragment(parts, self.count - 1))
+        if self.flush_each:
+            self._flush()
+        return True
+
+    def write_all(self, flashcards, batch_size=1000):
+        # Join fragments in batches: far fewer write calls, and memory stays bounded for huge decks
+        batch = []
+        for flashcard in flashcards:
+            if self._held is not None:
+                self.write(flashcard)
+                continue
+            parts = split_flashcard(flashcard)
+            if parts is None:
+                print(f"Skipping malformed flashcard: {flashcard}")
+                continue
+            batch.append(self._fragment(parts, self.count + len(batch)))
+            if len(batch) >= batch_size:
+                self._data.write(''.join(batch))
+                self.count += len(batch)
+                batch = []
+        if batch:
+            self._data.write(''.join(batch))
+            self.count += len(batch)
+        if self.flush_each and self._file is not None:
+            self._flush()
+        return self.count
+
+    def close(self):
+        if self._held is not None:
+            self._release('dom')
+        if self._file is not None:
+            self._data.write(self._data_end)
+            if self._data is not self._file:
+                self._data.close()
+            self._file.write(self._footer)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,473 @@
+# jobs.py
+#
+# Persistent generation jobs. Every document becomes a job row plus one row per chunk,
+# and each chunk's cards are committed the moment its response lands, so closing the app
+# (or a crash) only loses the requests that were in flight. Rerunning a job picks up the
+# chunks that aren't done yet; the deck is written from the stored cards at the end.
+
+import asyncio
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from cache import default_cache_path
+from cards import Flashcard
+from chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from clients import get_manager
+from dedup import dedupe_flashcards, DEFAULT_DEDUP_THRESHOLD
+from engine import FlashcardEngine
+from exporters import DeckExporter, deck_files
+from parsing import merge_flashcards
+from pipeline import pdf_pages, report_changes
+from preprocess import useful_chunks, SkipReport, DEFAULT_MIN_DENSITY
+from progress import Progress
+from tracing import get_tracer, run_tracer
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+DEFAULT_JOBS = 2
+
+
+def default_jobs_path():
+    return os.path.join(os.path.dirname(default_cache_path()), 'jobs.sqlite3')
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or default_jobs_path()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    text TEXT,
+                    output_file TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    chunked INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    owner TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+                    seq INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    cards TEXT,
+                    error TEXT,
+                    model TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (job_id, seq)
+                )''')
+
+    def _connect(self):
+        # Same one-connection-per-thread setup as FlashcardCache
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add_job(self, source, output_file, text=None, options=None):
+        # source is a file path (PDF or text), or a label like "text box" when text is given.
+        # options['document_id'] names the document across runs, as in pipeline.write_deck_async
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO jobs (source, text, output_file, options, status, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (source, text, output_file, json.dumps(options or {}), PENDING, now, now)
+            )
+        return cursor.lastrowid
+
+    def get_job(self, job_id):
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+
+    def list_jobs(self, statuses=None):
+        query = '''
+            SELECT jobs.id, jobs.source, jobs.output_file, jobs.status, jobs.error, jobs.created, jobs.updated,
+                   COUNT(chunks.seq) AS chunks,
+                   COALESCE(SUM(chunks.status = 'done'), 0) AS chunks_done,
+                   COALESCE(SUM(chunks.status = 'failed'), 0) AS chunks_failed
+            FROM jobs LEFT JOIN chunks ON chunks.job_id = jobs.id'''
+        params = ()
+        if statuses:
+            query += f" WHERE jobs.status IN ({', '.join('?' * len(statuses))})"
+            params = tuple(statuses)
+        query += ' GROUP BY jobs.id ORDER BY jobs.id'
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+    def unfinished_jobs(self, retry_failed=False):
+        # Jobs left "running" may have been interrupted (a crash); claim() tells whether they were
+        statuses = [PENDING, RUNNING] + ([FAILED, CANCELLED] if retry_failed else [])
+        return [job['id'] for job in self.list_jobs(statuses)]
+
+    def claim(self, job_id, owner, statuses=(PENDING,)):
+        # Marks the job running under owner, or returns False if it isn't in one of statuses.
+        # The GUI and 'jobs run' share this store, so whoever claims a job first runs it.
+        # A job left running by a process that has exited (a crash) can be claimed too.
+        conn = self._connect()
+        placeholders = ', '.join('?' * len(statuses))
+        with conn:
+            cursor = conn.execute(
+                f'UPDATE jobs SET status = ?, owner = ?, updated = ? WHERE id = ? AND status IN ({placeholders})',
+                (RUNNING, owner, time.time(), job_id, *statuses)
+            )
+        if cursor.rowcount:
+            return True
+        row = conn.execute('SELECT status, owner FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or row['status'] != RUNNING or owner_alive(row['owner']):
+            return False
+        with conn:
+            # Only one of several processes noticing the same dead owner gets it
+            cursor = conn.execute(
+                'UPDATE jobs SET owner = ?, updated = ? WHERE id = ? AND status = ? AND owner IS ?',
+                (owner, time.time(), job_id, RUNNING, row['owner'])
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id, owner):
+        # Hands an interrupted job back to the queue, if owner still has it
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE jobs SET status = ?, owner = NULL, updated = ? WHERE id = ? AND owner = ? AND status = ?',
+                         (PENDING, time.time(), job_id, owner, RUNNING))
+
+    def set_status(self, job_id, status, error=None):
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?',
+                         (status, error, time.time(), job_id))
+
+    def set_chunks(self, job_id, chunks):
+        conn = self._connect()
+        with conn:
+            # A crash while chunking leaves chunked = 0, so anything stored before is redone
+            conn.execute('DELETE FROM chunks WHERE job_id = ?', (job_id,))
+            conn.executemany(
+                'INSERT INTO chunks (job_id, seq, text, status) VALUES (?, ?, ?, ?)',
+                ((job_id, seq, text, PENDING) for seq, text in enumerate(chunks))
+            )
+            conn.execute('UPDATE jobs SET chunked = 1, updated = ? WHERE id = ?', (time.time(), job_id))
+
+    def open_chunks(self, job_id):
+        # Everything not done yet, including chunks that failed last time
+        return list(self._connect().execute(
+            'SELECT seq, text FROM chunks WHERE job_id = ? AND status != ? ORDER BY seq', (job_id, DONE)
+        ))
+
+    def chunk_texts(self, job_id):
+        return [row[0] for row in self._connect().execute(
+            'SELECT text FROM chunks WHERE job_id = ? ORDER BY seq', (job_id,))]
+
+    def chunk_count(self, job_id):
+        return self._connect().execute('SELECT COUNT(*) FROM chunks WHERE job_id = ?', (job_id,)).fetchone()[0]
+
+    def finish_chunk(self, job_id, seq, cards, model=None):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE chunks SET status = ?, cards = ?, model = ?, error = NULL, attempts = attempts + 1 '
+                'WHERE job_id = ? AND seq = ?',
+                (DONE, json.dumps(cards, ensure_ascii=False), model, job_id, seq)
+            )
+
+    def fail_chunk(self, job_id, seq, error):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE chunks SET status = ?, error = ?, attempts = attempts + 1 WHERE job_id = ? AND seq = ?',
+                (FAILED, error, job_id, seq)
+            )
+
+    def job_cards(self, job_id):
+        # (seq, cards, model) for every finished chunk, in document order
+        for seq, cards, model in self._connect().execute(
+                'SELECT seq, cards, model FROM chunks WHERE job_id = ? AND status = ? ORDER BY seq', (job_id, DONE)):
+            yield seq, json.loads(cards), model
+
+    def remove_job(self, job_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def clear_finished(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM jobs WHERE status = ?', (DONE,))
+
+
+def new_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def owner_alive(owner):
+    # Owners look like host:pid:random. Only processes on this machine can be checked;
+    # a job running elsewhere is assumed to still be running.
+    try:
+        host, pid, _ = owner.split(':')
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    if host != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _document_chunks(job, progress):
+    options = job['options']
+    if job['text'] is not None:
+        pieces = [job['text']]
+    elif job['source'].lower().endswith('.pdf'):
+        pieces = pdf_pages(job['source'], options.get('pages'), options.get('workers'))
+    else:
+        with open(job['source'], encoding='utf-8', errors='replace') as f:
+            pieces = [f.read()]
+    report = SkipReport()
+    skip_boilerplate = options.get('skip_boilerplate', True)
+    with get_tracer().span('read_input', job=job['id']) as span:
+        chunks = list(useful_chunks(progress.pages_iter(pieces), options.get('chunk_tokens', DEFAULT_CHUNK_TOKENS),
+                                    options.get('overlap_tokens', DEFAULT_OVERLAP_TOKENS), report, skip_boilerplate,
+                                    options.get('min_density', DEFAULT_MIN_DENSITY)))
+        span['chunks'] = len(chunks)
+        span['skipped_chars'] = report.chars_skipped
+    if skip_boilerplate:
+        report.finish(f"Job {job['id']}")
+    return chunks
+
+
+class JobRunner:
+    # Runs up to `jobs` documents at once against one shared engine, so the request
+    # concurrency cap and rate limits hold across all of them.
+    # on_update(job_id, status) is called from the runner's thread after each chunk
+    # (status RUNNING) and when a job ends (DONE, FAILED or CANCELLED).
+    # on_progress(job_id, event, snapshot) gets every progress.Progress event of every job.
+    # Each job is traced on its own; on_summary(job_id, summary) gets the tracing summary
+    # when it ends (the process-wide tracer still sees everything too).
+    # Jobs are claimed in the store before they run; one claimed by another process
+    # (the GUI and 'jobs run' at the same time) is left alone and reported as RUNNING.
+    def __init__(self, store, jobs=DEFAULT_JOBS, engine=None, on_update=None, on_progress=None,
+                 on_summary=None, **engine_options):
+        self.store = store
+        self.owner = new_owner()
+        self.jobs = jobs
+        self.engine = engine
+        self.engine_options = engine_options
+        self.on_update = on_update
+        self.on_progress = on_progress
+        self.on_summary = on_summary
+        self._limit = None
+        self._loop = None
+        self._tasks = {}
+        self._cancelled = set()
+
+    def _notify(self, job_id, status):
+        if self.on_update:
+            self.on_update(job_id, status)
+
+    async def run_job(self, job_id, retry_failed=False):
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.jobs)
+        if self.engine is None:
+            self.engine = FlashcardEngine(**self.engine_options)
+        progress = Progress(
+            (lambda event, snapshot: self.on_progress(job_id, event, snapshot)) if self.on_progress else None
+        )
+        self._tasks[job_id] = asyncio.current_task()
+        claimed = False
+        tracer = None
+        try:
+            async with self._limit:
+                statuses = (PENDING, FAILED, CANCELLED) if retry_failed else (PENDING,)
+                if not self.store.claim(job_id, self.owner, statuses):
+                    job = self.store.get_job(job_id)
+                    return job and job['status']
+                claimed = True
+                job = self.store.get_job(job_id)
+                with run_tracer() as tracer:
+                    try:
+                        with tracer.span('job', job=job_id):
+                            status = await self._run(job, progress)
+                    except asyncio.CancelledError:
+                        # Still an Exception subclass on Python 3.7
+                        raise
+                    except Exception as e:
+                        self.store.set_status(job_id, FAILED, f"{type(e).__name__}: {str(e)}")
+                        status = FAILED
+        except asyncio.CancelledError:
+            if job_id not in self._cancelled:
+                # Shutting down rather than a cancel click: back in the queue so it resumes
+                if claimed:
+                    self.store.release(job_id, self.owner)
+                raise
+            self._cancelled.discard(job_id)
+            # Cancelled before its turn came; only mark it if nobody else has it by now
+            if claimed or self.store.claim(job_id, self.owner):
+                self.store.set_status(job_id, CANCELLED, "Cancelled")
+            status = CANCELLED
+        finally:
+            self._tasks.pop(job_id, None)
+        progress.emit(status)
+        self._notify(job_id, status)
+        if tracer is not None:
+            summary = tracer.close()
+            if self.on_summary:
+                self.on_summary(job_id, summary)
+        return status
+
+    def cancel(self, job_id):
+        # Safe to call from any thread; in-flight requests for the job are aborted right away
+        def cancel_task():
+            task = self._tasks.get(job_id)
+            if task is not None:
+                self._cancelled.add(job_id)
+                task.cancel()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(cancel_task)
+        else:
+            cancel_task()
+
+    async def _run(self, job, progress):
+        job_id = job['id']
+        loop = asyncio.get_running_loop()
+        if not job['chunked']:
+            # Extraction and chunking are blocking; keep them off the event loop (in this
+            # job's context, so their spans reach its tracer)
+            chunks = await loop.run_in_executor(None, contextvars.copy_context().run, _document_chunks, job, progress)
+            self.store.set_chunks(job_id, chunks)
+
+        open_chunks = self.store.open_chunks(job_id)
+        total = self.store.chunk_count(job_id)
+        # Chunks finished by an earlier run count as done straight away
+        progress.chunks_done = progress.chunks_cached = total - len(open_chunks)
+        progress.emit('chunks', total)
+
+        async def generate(seq, text):
+            # Which model wrote the chunk's cards, kept with them for the deck
+            used = {}
+            try:
+                cards = await self.engine.generate_chunk(text, on_card=lambda card, model: used.update(model=model),
+                                                         progress=progress)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.store.fail_chunk(job_id, seq, f"{type(e).__name__}: {str(e)}")
+                return False
+            self.store.finish_chunk(job_id, seq, cards, used.get('model'))
+            progress.emit('card', len(cards))
+            self._notify(job_id, RUNNING)
+            return True
+
+        results = await asyncio.gather(*(generate(seq, text) for seq, text in open_chunks))
+        failed = results.count(False)
+        if failed:
+            # Finished chunks stay stored; running the job again only retries these
+            self.store.set_status(job_id, FAILED, f"{failed} of {len(results)} chunks failed")
+            return FAILED
+        count = await loop.run_in_executor(None, contextvars.copy_context().run, self._write_deck, job)
+        if not count:
+            self.store.set_status(job_id, FAILED, "No valid flashcards generated")
+            return FAILED
+        self.store.set_status(job_id, DONE)
+        document_id = job['options'].get('document_id')
+        if document_id and self.engine.cache is not None:
+            sections = [self.engine.chunk_cache_key(text) for text in self.store.chunk_texts(job_id)]
+            report_changes(self.engine.cache, document_id, sections, os.path.basename(job['output_file']))
+        return DONE
+
+    def _write_deck(self, job):
+        options = job['options']
+        tracer = get_tracer()
+        source = job['source']
+        cards = merge_flashcards(
+            [Flashcard.from_text(card, source, seq, model=model) for card in chunk_cards]
+            for seq, chunk_cards, model in self.store.job_cards(job['id'])
+        )
+        threshold = options.get('dedup_threshold', DEFAULT_DEDUP_THRESHOLD)
+        if threshold:
+            with tracer.span('dedup', job=job['id'], cards=len(cards)):
+                cards = dedupe_flashcards(cards, threshold)
+        if not cards:
+            return 0
+        deck_options = options.get('deck_options', {})
+        partials = deck_files(job['output_file'] + '.part', deck_options.get('formats', ['html']))
+        try:
+            with tracer.span('write_html', job=job['id'], cards=len(cards)), \
+                    DeckExporter(partials[0], flush_each=False, **deck_options) as writer:
+                writer.write_all(cards)
+        except BaseException:
+            for partial in partials:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            raise
+        for partial in partials:
+            os.replace(partial, partial[:-len('.part')])
+        return writer.count
+
+    async def run(self, job_ids=None, retry_failed=False):
+        # Runs the given jobs, or every unfinished one; returns {job_id: status}
+        if job_ids is None:
+            job_ids = self.store.unfinished_jobs(retry_failed)
+        try:
+            statuses = await asyncio.gather(*(self.run_job(job_id, retry_failed) for job_id in job_ids))
+        finally:
+            await self.aclose()
+        return dict(zip(job_ids, statuses))
+
+    async def aclose(self):
+        if self.engine is not None:
+            await self.engine.aclose()
+
+    def start_thread(self):
+        # For the GUI: jobs go to the shared client loop (see clients.py), which runs in a
+        # background thread and can be submitted to from any thread
+        self._loop = get_manager().loop()
+        return self
+
+    def submit(self, job_id, retry_failed=False):
+        return asyncio.run_coroutine_threadsafe(self.run_job(job_id, retry_failed), self._loop)
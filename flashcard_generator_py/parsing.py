@@ -0,0 +1,277 @@
+# parsing.py
+
+import json
+import re
+
+# "Q: ...", "**Question 3:** ...", "- A: ...", "2) Q: ..." and so on
+_LABEL = re.compile(
+    r'^\s*(?:[-*+\u2022>]\s*|\d+[.)]\s*|#{1,6}\s*)*[*_]*\s*(q|question|a|answer)(?:\s*\d+)?\s*[*_]*\s*:\s*[*_]*\s*(.*?)\s*$',
+    re.IGNORECASE
+)
+_SEPARATOR = re.compile(r'^\s*([-*=_])\1{2,}\s*$')
+_NOT_SPACE = re.compile(r'\S')
+# Strings (possibly unterminated) and braces; braces inside strings don't count
+_BRACE_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"?|[{}]')
+
+
+def format_card(question, answer):
+    question = question.strip()
+    answer = answer.strip()
+    if not question or not answer:
+        return None
+    return f"Q: {question}\nA: {answer}"
+
+
+def is_valid_card(card):
+    lines = card.strip().split('\n')
+    return len(lines) >= 2 and lines[0].startswith('Q:') and any(l.startswith('A:') for l in lines[1:])
+
+
+def _well_formed(block):
+    # One card per blank-line-separated block; "Q: a\nA: b\nQ: c\nA: d" passes
+    # is_valid_card but is really two cards missing their blank line
+    return is_valid_card(block) and not any(l.startswith('Q:') for l in block.strip().split('\n')[1:])
+
+
+def parse_flashcards(content):
+    flashcards = []
+    cards = content.split('\n\n')
+    for card in cards:
+        if is_valid_card(card):
+            flashcards.append(card.strip())
+    return flashcards
+
+
+class LenientCardParser:
+    # Line-based parser for the Q:/A: text format, fed one streamed delta at a time.
+    # Copes with cards separated by single newlines, markdown bullets, numbering and bold
+    # labels, and keeps the good cards from a half-broken response instead of throwing the
+    # whole thing away. Cards come out as "Q: ...\nA: ...".
+    def __init__(self):
+        self.buffer = ''
+        self.cards = []
+        self._question = None
+        self._answer = None
+
+    def feed(self, delta):
+        self.buffer += delta
+        if '\n' not in self.buffer:
+            return []
+        *lines, self.buffer = self.buffer.split('\n')
+        new_cards = []
+        for line in lines:
+            self._line(line, new_cards)
+        return new_cards
+
+    def close(self):
+        new_cards = []
+        self._line(self.buffer, new_cards)
+        self.buffer = ''
+        self._flush(new_cards)
+        return new_cards
+
+    def _line(self, line, new_cards):
+        if not line.strip() or _SEPARATOR.match(line):
+            # A blank line ends a card once it has an answer; before that the question may go on
+            if self._answer is not None:
+                self._flush(new_cards)
+            return
+        label = _LABEL.match(line)
+        if label and label.group(1).lower() in ('q', 'question'):
+            self._flush(new_cards)
+            self._question = [label.group(2)]
+        elif label and self._question is not None and self._answer is None:
+            self._answer = [label.group(2)]
+        elif self._answer is not None:
+            self._answer.append(label.group(2) if label else line.rstrip())
+        elif self._question is not None:
+            self._question.append(line.rstrip())
+        # Anything before the first question ("Here are your flashcards:") is ignored
+
+    def _flush(self, new_cards):
+        if self._question is not None and self._answer is not None:
+            card = format_card('\n'.join(self._question), '\n'.join(self._answer))
+            if card:
+                self.cards.append(card)
+                new_cards.append(card)
+        self._question = None
+        self._answer = None
+
+
+def lenient_parse_flashcards(content):
+    parser = LenientCardParser()
+    parser.feed(content)
+    parser.close()
+    return parser.cards
+
+
+class IncrementalCardParser:
+    # Streaming version of parse_flashcards: each blank-line-separated block comes out as
+    # soon as the blank line after it arrives. Well-formed blocks are kept exactly as
+    # parse_flashcards keeps them; the rest go through LenientCardParser, so a reply with
+    # bullets, numbering or missing blank lines is salvaged instead of thrown away.
+    def __init__(self):
+        self.buffer = ''
+        self.cards = []
+        self._lenient = LenientCardParser()
+
+    def feed(self, delta):
+        self.buffer += delta
+        if '\n\n' not in self.buffer:
+            return []
+        *blocks, self.buffer = self.buffer.split('\n\n')
+        new_cards = []
+        for block in blocks:
+            self._block(block, new_cards)
+        return new_cards
+
+    def close(self):
+        new_cards = []
+        self._block(self.buffer, new_cards)
+        self.buffer = ''
+        self._add(self._lenient.close(), new_cards)
+        return new_cards
+
+    def _block(self, block, new_cards):
+        if _well_formed(block):
+            # Whatever the lenient parser was holding ends here
+            self._add(self._lenient.close(), new_cards)
+            self._add([block.strip()], new_cards)
+        else:
+            self._add(self._lenient.feed(block + '\n\n'), new_cards)
+
+    def _add(self, cards, new_cards):
+        self.cards.extend(cards)
+        new_cards.extend(cards)
+
+
+def parse_text_flashcards(content):
+    parser = IncrementalCardParser()
+    parser.feed(content)
+    parser.close()
+    return parser.cards
+
+
+def card_from_json(item):
+    if not isinstance(item, dict):
+        return None
+    question = item.get('question', item.get('q'))
+    answer = item.get('answer', item.get('a'))
+    if not isinstance(question, str) or not isinstance(answer, str):
+        return None
+    return format_card(question, answer)
+
+
+class JsonCardParser:
+    # Parser for structured output ({"cards": [{"question": ..., "answer": ...}, ...]}).
+    # Each card object is decoded as soon as its closing brace arrives, so streaming works
+    # and a response cut off by max_tokens still yields every complete card before the cut.
+    def __init__(self):
+        self.buffer = ''
+        self.cards = []
+        self._decoder = json.JSONDecoder()
+        self._in_array = False
+        self._done = False
+
+    def feed(self, delta):
+        self.buffer += delta
+        return self._scan()
+
+    def close(self):
+        new_cards = self._scan(final=True)
+        if not self.cards and not self._in_array:
+            # The model ignored the format and answered in text; salvage what we can
+            new_cards = parse_text_flashcards(self.buffer)
+            self.cards.extend(new_cards)
+        self.buffer = ''
+        return new_cards
+
+    def _find_array(self, buffer):
+        # The cards array is the first "[" followed by "{"; a "[" in some preamble
+        # ("Sure [see below]:") isn't. Returns None when it can't tell yet.
+        start = buffer.find('[')
+        while start != -1:
+            after = _NOT_SPACE.search(buffer, start + 1)
+            if after is None:
+                return None
+            if after.group() == '{':
+                return after.start()
+            start = buffer.find('[', start + 1)
+        return None
+
+    def _scan(self, final=False):
+        new_cards = []
+        if self._done:
+            return new_cards
+        buffer = self.buffer
+        pos = 0
+        if not self._in_array:
+            pos = self._find_array(buffer)
+            if pos is None:
+                return new_cards
+            self._in_array = True
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char in ' \t\r\n,':
+                pos += 1
+            elif char == ']':
+                self._done = True
+                break
+            elif char == '{':
+                end = _object_end(buffer, pos)
+                if end == -1:
+                    if not final:
+                        break
+                    # Cut off or unbalanced; try whatever object comes next
+                    following = buffer.find('{', pos + 1)
+                    pos = len(buffer) if following == -1 else following
+                    continue
+                try:
+                    item = self._decoder.decode(buffer[pos:end])
+                except ValueError:
+                    # A complete but broken object ({"answer": }); skip it and carry on
+                    item = None
+                pos = end
+                card = card_from_json(item)
+                if card:
+                    self.cards.append(card)
+                    new_cards.append(card)
+            else:
+                pos += 1
+        # Only the unfinished object needs to be kept around
+        self.buffer = buffer[pos:]
+        return new_cards
+
+
+def _object_end(buffer, start):
+    # Index just past the brace that closes the object opening at start, or -1 if it
+    # hasn't arrived yet
+    depth = 0
+    for token in _BRACE_TOKEN.finditer(buffer, start):
+        text = token.group()
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                return token.end()
+    return -1
+
+
+def parse_json_flashcards(content):
+    parser = JsonCardParser()
+    parser.feed(content)
+    parser.close()
+    return parser.cards
+
+
+def merge_flashcards(card_lists):
+    # Overlapping chunks can produce the exact same card twice
+    merged = []
+    seen = set()
+    for cards in card_lists:
+        for card in cards:
+            if card not in seen:
+                seen.add(card)
+                merged.append(card)
+    return merged
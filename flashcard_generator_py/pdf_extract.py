@@ -0,0 +1,212 @@
+# pdf_extract.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from tracing import get_tracer
+
+# Below this many pages the cost of starting worker processes outweighs the speedup
+MIN_PAGES_FOR_POOL = 8
+# More batches than workers so one slow (image-heavy) range doesn't hold up the rest
+BATCHES_PER_WORKER = 4
+
+
+def available_cpus():
+    # cpu_count() ignores affinity masks, which containers and CI runners often set
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# pdfminer is imported inside the functions below so it only loads once a PDF is actually opened
+
+def count_pages(file_path):
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    with open(file_path, 'rb') as fp:
+        document = PDFDocument(PDFParser(fp))
+        pages = resolve1(document.catalog.get('Pages'))
+        count = resolve1(pages.get('Count')) if pages else None
+        if isinstance(count, int):
+            return count
+        # Broken page tree: fall back to walking it
+        return sum(1 for _ in PDFPage.create_pages(document))
+
+
+def parse_page_range(spec, page_count):
+    # "3-5,8" -> [2, 3, 4, 7]; pages are 1-based for the user, 0-based for pdfminer
+    if spec is None:
+        return list(range(page_count))
+    if isinstance(spec, str):
+        numbers = []
+        for part in spec.replace(' ', '').split(','):
+            if not part:
+                continue
+            if '-' in part:
+                start, _, end = part.partition('-')
+                start = int(start) if start else 1
+                end = int(end) if end else page_count
+                numbers.extend(range(start, end + 1))
+            else:
+                numbers.append(int(part))
+    else:
+        numbers = list(spec)
+    pages = sorted(set(n - 1 for n in numbers))
+    if not pages:
+        raise ValueError("Page range is empty")
+    if pages[0] < 0 or pages[-1] >= page_count:
+        raise ValueError(f"Page range {spec!r} is outside the document (1-{page_count})")
+    return pages
+
+
+def iter_document_pages(document, page_numbers):
+    # Yields (page_no, PDFPage) for the wanted pages only. Every /Pages node says how many
+    # pages are under it (/Count), so whole subtrees before a batch are skipped without
+    # building their pages; a worker that wants pages 900-930 doesn't parse 0-899 first.
+    # Falls back to pdfminer's full walk when the tree is missing or its counts don't add up.
+    from pdfminer.pdfpage import LITERAL_PAGE, LITERAL_PAGES, PDFPage
+    from pdfminer.pdftypes import dict_value, list_value, resolve1
+
+    wanted = sorted(set(page_numbers))
+    if not wanted:
+        return
+    wanted_set = set(wanted)
+    last = wanted[-1]
+
+    def walk(ref, inherited, first, visited):
+        # Returns the number of pages under ref; yields the wanted ones from first on
+        objid = getattr(ref, 'objid', None)
+        if objid is not None:
+            if objid in visited:
+                raise ValueError("page tree has a loop")
+            visited.add(objid)
+        node = dict_value(ref).copy()
+        for key, value in inherited.items():
+            if key in PDFPage.INHERITABLE_ATTRS and key not in node:
+                node[key] = value
+        kind = node.get('Type') or node.get('type')
+        if kind is LITERAL_PAGE:
+            if first in wanted_set:
+                yield first, PDFPage(document, objid, node, None)
+            return 1
+        if kind is not LITERAL_PAGES:
+            return 0
+        count = resolve1(node.get('Count'))
+        if isinstance(count, int) and (first + count <= wanted[0] or first > last):
+            return count
+        seen = 0
+        for kid in list_value(node.get('Kids', [])):
+            if first + seen > last:
+                break
+            seen += yield from walk(kid, node, first + seen, visited)
+        if isinstance(count, int) and first + seen <= last and seen != count:
+            raise ValueError("page tree /Count doesn't match its pages")
+        return count if isinstance(count, int) else seen
+
+    found = set()
+    try:
+        if 'Pages' not in document.catalog:
+            raise ValueError("no page tree")
+        for page_no, page in walk(document.catalog['Pages'], document.catalog, 0, set()):
+            found.add(page_no)
+            yield page_no, page
+        return
+    except ValueError:
+        pass
+    for page_no, page in enumerate(PDFPage.create_pages(document)):
+        if page_no > last:
+            break
+        if page_no in wanted_set and page_no not in found:
+            yield page_no, page
+
+
+def iter_pages_in_process(file_path, page_numbers):
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfparser import PDFParser
+
+    output = StringIO()
+    rsrcmgr = PDFResourceManager(caching=True)
+    device = TextConverter(rsrcmgr, output, laparams=LAParams())
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    try:
+        with open(file_path, 'rb') as fp:
+            document = PDFDocument(PDFParser(fp), caching=True)
+            for page_no, page in iter_document_pages(document, page_numbers):
+                output.seek(0)
+                output.truncate()
+                interpreter.process_page(page)
+                # TextConverter ends every page with a form feed
+                yield page_no, output.getvalue().rstrip('\f')
+    finally:
+        device.close()
+
+
+def extract_page_batch(file_path, page_numbers):
+    # Runs inside a worker process, so everything it needs is opened here
+    texts = dict(iter_pages_in_process(file_path, page_numbers))
+    return [texts.get(page_no, '') for page_no in page_numbers]
+
+
+def _batches(pages, count):
+    size = max(1, -(-len(pages) // count))
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def iter_page_texts(file_path, pages=None, workers=None):
+    # Yields (page_number, text) in document order as soon as each batch is ready
+    page_count = count_pages(file_path)
+    page_numbers = parse_page_range(pages, page_count)
+    workers = workers or available_cpus()
+
+    if workers <= 1 or len(page_numbers) < MIN_PAGES_FOR_POOL:
+        for page_no, text in iter_pages_in_process(file_path, page_numbers):
+            yield page_no, text
+        return
+
+    batches = _batches(page_numbers, workers * BATCHES_PER_WORKER)
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(batches)))
+    futures = [pool.submit(extract_page_batch, file_path, batch) for batch in batches]
+    finished = False
+    try:
+        for batch, future in zip(batches, futures):
+            for page_no, text in zip(batch, future.result()):
+                yield page_no, text
+        finished = True
+    finally:
+        if not finished:
+            # Cancelled, or the caller stopped reading: drop the batches that haven't started
+            # instead of waiting for all of them like leaving a `with` block would
+            # (cancel_futures=True does the same, but only from Python 3.9)
+            for future in futures:
+                future.cancel()
+        pool.shutdown(wait=finished)
+
+
+def extract_pdf_text(file_path, pages=None, workers=None, on_page=None):
+    # on_page(done, total) is called after every page, from whatever thread is extracting
+    started = time.perf_counter()
+    with get_tracer().span('extract_pdf', file=os.path.basename(file_path)) as span:
+        if on_page is None:
+            texts = [text for _, text in iter_page_texts(file_path, pages, workers)]
+        else:
+            total = len(parse_page_range(pages, count_pages(file_path)))
+            texts = []
+            for _, text in iter_page_texts(file_path, pages, workers):
+                texts.append(text)
+                on_page(len(texts), total)
+        span['pages'] = len(texts)
+    elapsed = time.perf_counter() - started
+    stats = {
+        'pages': len(texts),
+        'seconds': elapsed,
+        'pages_per_second': len(texts) / elapsed if elapsed > 0 else float('inf'),
+    }
+    return '\f'.join(texts), stats
@@ -0,0 +1,193 @@
+# pipeline.py
+
+import asyncio
+import os
+import time
+
+from cache import FlashcardCache
+from cards import Flashcard
+from chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from clients import run
+from dedup import NearDuplicateIndex, DEFAULT_DEDUP_THRESHOLD
+from engine import FlashcardEngine
+from exporters import DeckExporter
+from pdf_extract import iter_page_texts
+from preprocess import useful_chunks, SkipReport, DEFAULT_MIN_DENSITY
+from tracing import get_tracer
+
+_DONE = object()
+
+
+def pdf_pages(file_path, pages=None, workers=None):
+    for _, text in iter_page_texts(file_path, pages, workers):
+        yield text
+
+
+async def _iterate_in_thread(iterator):
+    # Page extraction and chunking are blocking, so pull each item on a worker thread
+    loop = asyncio.get_running_loop()
+    tracer = get_tracer()
+    while True:
+        with tracer.span('read_input'):
+            item = await loop.run_in_executor(None, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+async def stream_flashcards(pieces, engine, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                            overlap_tokens=DEFAULT_OVERLAP_TOKENS, max_pending=None,
+                            dedup_threshold=DEFAULT_DEDUP_THRESHOLD, on_chunk=None, progress=None,
+                            skip_boilerplate=True, min_density=DEFAULT_MIN_DENSITY, report=None, source=None):
+    # Yields each chunk's cards as soon as its request succeeds, while later pages are
+    # still being extracted. Cards are Flashcards carrying source, their chunk's index and
+    # the model that wrote them.
+    # max_pending caps chunks held in memory when extraction runs far ahead of the API.
+    # Cards already yielded can't be taken back, so near-duplicates keep the first card
+    # rather than the best one like dedupe_flashcards does.
+    # report (a preprocess.SkipReport) collects what preprocessing left out.
+    max_pending = max_pending or engine.concurrency * 2
+    near_duplicates = NearDuplicateIndex(dedup_threshold) if dedup_threshold else None
+    chunks = _iterate_in_thread(useful_chunks(iter(pieces), chunk_tokens, overlap_tokens, report,
+                                              skip_boilerplate, min_density))
+    cards = asyncio.Queue()
+    next_chunk = None
+    next_card = None
+    pending = set()
+    seen = set()
+    exhausted = False
+    chunk_count = 0
+    try:
+        while True:
+            if next_chunk is None and not exhausted and len(pending) < max_pending:
+                next_chunk = asyncio.ensure_future(chunks.__anext__())
+            if next_card is None:
+                next_card = asyncio.ensure_future(cards.get())
+            waiting = set(pending)
+            if next_chunk is not None:
+                waiting.add(next_chunk)
+            if not waiting and cards.empty() and not next_card.done():
+                return
+            waiting.add(next_card)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            ready = []
+            if next_card in done:
+                ready.append(next_card.result())
+                next_card = None
+            while not cards.empty():
+                ready.append(cards.get_nowait())
+            for card in ready:
+                # Overlapping chunks (or a retried stream) can produce the exact same card twice
+                if card in seen:
+                    continue
+                seen.add(card)
+                if near_duplicates is None or not near_duplicates.is_duplicate(card):
+                    if progress:
+                        progress.emit('card')
+                    yield card
+
+            for task in done:
+                if task is next_chunk:
+                    next_chunk = None
+                    try:
+                        chunk = task.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        if progress:
+                            progress.emit('chunks', chunk_count)
+                        continue
+                    if on_chunk:
+                        on_chunk(chunk)
+
+                    def on_card(card, model, seq=chunk_count):
+                        cards.put_nowait(Flashcard.from_text(card, source, seq, model=model))
+
+                    chunk_count += 1
+                    pending.add(asyncio.ensure_future(
+                        engine.generate_chunk(chunk, on_card=on_card, progress=progress)
+                    ))
+                elif task in pending:
+                    pending.discard(task)
+                    task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in (next_chunk, next_card):
+            if task is not None:
+                task.cancel()
+
+
+async def write_deck_async(pieces, output_file=None, on_card=None, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                           overlap_tokens=DEFAULT_OVERLAP_TOKENS, engine=None, deck_options=None,
+                           dedup_threshold=DEFAULT_DEDUP_THRESHOLD, document_id=None, progress=None,
+                           skip_boilerplate=True, min_density=DEFAULT_MIN_DENSITY, **engine_options):
+    # Pass a shared engine to run several decks against one concurrency cap and rate limit.
+    # deck_options go to DeckExporter (formats, viewer, sidecar, shared_assets).
+    # document_id (a path, or e.g. "text box") names the document across runs so a rerun
+    # can report which sections changed; unchanged ones come straight from the cache.
+    # progress (a progress.Progress) gets page, chunk, card and token events as they happen.
+    # skip_boilerplate and min_density control what preprocess.py leaves out before sending.
+    if engine is None:
+        async with FlashcardEngine(**engine_options) as engine:
+            return await write_deck_async(pieces, output_file, on_card, chunk_tokens, overlap_tokens,
+                                          engine, deck_options, dedup_threshold, document_id, progress,
+                                          skip_boilerplate, min_density)
+
+    started = time.perf_counter()
+    sections = []
+    report = SkipReport()
+    tracer = get_tracer()
+    if progress:
+        pieces = progress.pages_iter(pieces)
+    try:
+        with tracer.span('document', document=str(document_id or output_file)) as span, \
+                DeckExporter(output_file, source=document_id, **(deck_options or {})) as writer:
+            name = os.path.basename(writer.output_file)
+            cards = stream_flashcards(pieces, engine, chunk_tokens, overlap_tokens, dedup_threshold=dedup_threshold,
+                                      on_chunk=lambda chunk: sections.append(engine.chunk_cache_key(chunk)),
+                                      progress=progress, skip_boilerplate=skip_boilerplate,
+                                      min_density=min_density, report=report, source=document_id)
+            async for card in cards:
+                writing = time.perf_counter()
+                written = writer.write(card)
+                tracer.add_stage('write_html', time.perf_counter() - writing)
+                if written:
+                    if writer.count == 1:
+                        print(f"{name}: first card after {time.perf_counter() - started:.1f}s")
+                        span['first_card_seconds'] = round(time.perf_counter() - started, 3)
+                    if on_card:
+                        on_card(card, writer.count)
+            span['cards'] = writer.count
+    except asyncio.CancelledError:
+        if progress:
+            progress.emit('cancelled')
+        raise
+    except Exception:
+        if progress:
+            progress.emit('failed')
+        raise
+    if progress:
+        progress.emit('done')
+    print(f"{name}: wrote {writer.count} cards in {time.perf_counter() - started:.1f}s")
+    if skip_boilerplate:
+        report.finish(name)
+    if document_id and engine.cache is not None:
+        report_changes(engine.cache, document_id, sections, name)
+    return writer.count, writer.output_file
+
+
+def report_changes(cache, document_id, sections, name):
+    # Records this run's sections (chunk cache keys) and says how many are new since the last one
+    changes = cache.update_document(document_id, sections)
+    if not changes['first_run']:
+        print(f"{name}: {changes['unchanged']} of {changes['sections']} sections unchanged, "
+              f"{changes['changed']} new or edited, {changes['removed']} removed")
+    return changes
+
+
+def generate_deck(pieces, output_file=None, on_card=None, cache=None, stream=True, **options):
+    # Streaming counterpart of generate_flashcards + create_html; pieces can be pdf_pages(...) or [text]
+    if cache is None:
+        cache = FlashcardCache()
+    return run(write_deck_async(pieces, output_file, on_card, cache=cache or None, stream=stream, **options))
@@ -0,0 +1,392 @@
+# preprocess.py
+#
+# Drops text that isn't worth paying to generate cards from, before it's chunked and sent:
+#
+# - running headers/footers and page numbers: lines at the top or bottom of a page that
+#   repeat on nearby pages (digits ignored, so "Page 12" and "Page 13" are the same line)
+# - tables of contents, reference lists and indexes: a heading like "References" starts
+#   one, and it runs on (across pages too) while its lines keep looking like entries
+#   ("Title ..... 12", "Smith, J. (2019) ...", "osmosis, 12, 45-47"). Without a heading
+#   only a table of contents on the first few pages is recognized; a list of dates or
+#   numbered facts looks too much like references or an index to guess at
+# - text with little information in it: mostly numbers and symbols, or highly repetitive
+#   (see information_density). Checked for every paragraph of a few lines or more
+#   (tables, data dumps) and again for every chunk
+#
+# Everything is local heuristics over the extracted text. All of it works a page at a time
+# with a few pages of lookahead, so it fits in the streaming pipeline, and what was dropped
+# is added up in a SkipReport. If nothing at all would be left, the document goes through
+# untouched instead.
+
+import re
+import zlib
+from collections import Counter, deque
+
+from chunking import iter_chunks, CHARS_PER_TOKEN, DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from tracing import get_tracer
+
+DEFAULT_MIN_DENSITY = 0.3
+# Header/footer lines are compared against this many pages on either side
+NEIGHBOUR_PAGES = 4
+# How far into the page (from the top and from the bottom) a header/footer can be
+EDGE_LINES = 3
+
+_DIGITS = re.compile(r'\d+')
+_PAGE_NUMBER = re.compile(r'^(page\s+)?(\d{1,4}|(?=[ivxlc])(xc|xl|l?x{0,3})(ix|iv|v?i{0,3}))(\s*(of|/)\s*\d{1,4})?$',
+                          re.IGNORECASE)
+_SECTION_HEADING = re.compile(
+    r'^(\d+(\.\d+)*\.?\s+|chapter\s+\w+[:.]?\s+)?'
+    r'(?:(table of contents|contents)|'
+    r'(references|bibliography|works cited|literature cited|cited literature|sources)|'
+    r'((subject |author |name )?index))\s*$',
+    re.IGNORECASE
+)
+_TOC_LINE = re.compile(r'^(.*[^\W\d_].*?)(\s*\.{2,}\s*|\s+)(\d{1,4}|[ivxlc]{1,6})$', re.IGNORECASE)
+_DOT_LEADER = re.compile(r'\.{3,}|(\. ){3,}')
+_CITATION = re.compile(
+    r'\(\d{4}[a-z]?\)|\b(19|20)\d{2}[a-z]?[.;,)]|\bdoi\b|https?://|\bet al\.|\bpp?\.\s*\d|\bvol\.\s*\d|'
+    r'^\[\d+\]|^\d+\.\s+[A-Z][\w\'-]+,\s|[A-Z][\w\'-]+,\s+([A-Z]\.\s*)+(,|&|and\b)',
+)
+_INDEX_LINE = re.compile(r'^[^\d]{2,}?,?\s+\d{1,4}([-–]\d{1,4})?(\s*,\s*\d{1,4}([-–]\d{1,4})?)*$|'
+                         r'^[^\d]{2,},\s+see( also)?\s', re.IGNORECASE)
+
+# Share of lines after a heading that must look like entries for the section to be dropped
+_SECTION_RULES = {
+    'contents': 0.4,
+    'references': 0.3,
+    'index': 0.4,
+}
+# A table of contents without a heading is only looked for on the first few pages, and
+# needs nearly every line to be an entry
+_CONTENTS_PAGES = 5
+_CONTENTS_WITHOUT_HEADING = 0.7
+# Below this many lines there's too little to judge a page without a heading
+_MIN_LINES_WITHOUT_HEADING = 6
+# Paragraphs shorter than this are never dropped on density alone: headings, equations, captions
+MIN_BLOCK_LINES = 5
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
+
+class SkipReport:
+    # What preprocessing left out of one document
+    def __init__(self):
+        self.pages = 0
+        self.chars_in = 0
+        self.header_lines = 0
+        self.header_chars = 0
+        self.sections = []
+        self.chunks = 0
+        self.low_density_chunks = []
+        self.low_density_blocks = 0
+        self.low_density_block_chars = 0
+
+    def add_section(self, kind, page, chars):
+        # Consecutive pages of the same section are reported as one range
+        if self.sections and self.sections[-1]['kind'] == kind and self.sections[-1]['last_page'] >= page - 1:
+            self.sections[-1]['last_page'] = page
+            self.sections[-1]['chars'] += chars
+        else:
+            self.sections.append({'kind': kind, 'first_page': page, 'last_page': page, 'chars': chars})
+
+    @property
+    def chars_skipped(self):
+        return (self.header_chars + sum(section['chars'] for section in self.sections)
+                + self.low_density_block_chars + sum(chunk['chars'] for chunk in self.low_density_chunks))
+
+    def to_dict(self):
+        return {
+            'pages': self.pages,
+            'chars_in': self.chars_in,
+            'chars_skipped': self.chars_skipped,
+            'tokens_skipped': self.chars_skipped // CHARS_PER_TOKEN,
+            'header_lines': self.header_lines,
+            'sections': list(self.sections),
+            'low_density_blocks': self.low_density_blocks,
+            'chunks': self.chunks,
+            'low_density_chunks': list(self.low_density_chunks),
+        }
+
+    def finish(self, name):
+        # Prints the report and adds it to the run summary
+        if self.chars_skipped:
+            print(f"{name}: {self.describe()}")
+        tracer = get_tracer()
+        tracer.count('preprocessed_chars', self.chars_in)
+        tracer.count('skipped_chars', self.chars_skipped)
+
+    def describe(self):
+        if not self.chars_skipped:
+            return "nothing skipped"
+        parts = []
+        if self.header_lines:
+            parts.append(f"{self.header_lines} header/footer lines")
+        for section in self.sections:
+            pages = section['first_page']
+            if section['last_page'] != pages:
+                pages = f"{pages}-{section['last_page']}"
+            parts.append(f"{section['kind']} (p. {pages})")
+        if self.low_density_blocks:
+            parts.append(f"{self.low_density_blocks} tables or blocks with little text in them")
+        if self.low_density_chunks:
+            parts.append(f"{len(self.low_density_chunks)} of {self.chunks} chunks with little text in them")
+        share = self.chars_skipped / self.chars_in if self.chars_in else 0
+        return (f"skipped {', '.join(parts)}: {self.chars_skipped:,} of {self.chars_in:,} chars "
+                f"({share:.0%}, about {self.chars_skipped // CHARS_PER_TOKEN:,} tokens)")
+
+
+def _normalize(line):
+    return _DIGITS.sub('#', ' '.join(line.lower().split()))
+
+
+def _edge_lines(lines):
+    # Indexes of the first and last few non-empty lines
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return filled[:EDGE_LINES] + [i for i in filled[-EDGE_LINES:] if i not in filled[:EDGE_LINES]]
+
+
+def _strip_headers(lines, repeated, page_numbers):
+    # Removes repeated lines (and page numbers) from the top and bottom of a page, working
+    # inwards and stopping at the first line that is neither
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    drop = set()
+    for order in (filled, filled[::-1]):
+        for i in order[:EDGE_LINES]:
+            line = lines[i].strip()
+            if _normalize(line) in repeated or (page_numbers and _PAGE_NUMBER.match(line)):
+                drop.add(i)
+            else:
+                break
+    kept = [line for i, line in enumerate(lines) if i not in drop]
+    return kept, len(drop), len('\n'.join(lines)) - len('\n'.join(kept))
+
+
+def strip_headers(pages, report=None):
+    # pages: iterable of page texts; yields them without running headers/footers
+    report = report if report is not None else SkipReport()
+    window = deque()
+    counts = Counter()
+    position = 0  # index in window of the next page to yield
+
+    def emit(index):
+        lines, edges = window[index]
+        # A header is on the edge of at least 3 pages nearby (2 in short documents)
+        threshold = 3 if len(window) >= 5 else 2
+        repeated = set(line for line in edges if counts[line] >= threshold)
+        kept, removed, chars = _strip_headers(lines, repeated, len(window) > 1)
+        report.header_lines += removed
+        report.header_chars += chars
+        return '\n'.join(kept)
+
+    for page in pages:
+        lines = page.split('\n')
+        edges = set(_normalize(lines[i]) for i in _edge_lines(lines))
+        window.append((lines, edges))
+        counts.update(edges)
+        if len(window) - position > NEIGHBOUR_PAGES:
+            yield emit(position)
+            position += 1
+            if position > NEIGHBOUR_PAGES:
+                _, old_edges = window.popleft()
+                position -= 1
+                for line in old_edges:
+                    counts[line] -= 1
+                    if not counts[line]:
+                        del counts[line]
+    while position < len(window):
+        yield emit(position)
+        position += 1
+
+
+def _entry_share(kind, lines):
+    if kind == 'contents':
+        hits = sum(1 for line in lines if _TOC_LINE.match(line) or _PAGE_NUMBER.match(line))
+    elif kind == 'references':
+        hits = sum(1 for line in lines if _CITATION.search(line))
+    else:
+        hits = sum(1 for line in lines if _INDEX_LINE.match(line) or _PAGE_NUMBER.match(line))
+    return hits / len(lines) if lines else 0.0
+
+
+def _heading_kind(line):
+    match = _SECTION_HEADING.match(line.strip())
+    if not match or len(line.strip()) > 60:
+        return None
+    if match.group(3):
+        return 'contents'
+    if match.group(4):
+        return 'references'
+    return 'index'
+
+
+def _guess_kind(lines, page_no):
+    # Text with no heading is only dropped as a table of contents near the start of the
+    # document, with dot leaders and overwhelmingly entries
+    if page_no > _CONTENTS_PAGES or len(lines) < _MIN_LINES_WITHOUT_HEADING:
+        return None
+    if sum(1 for line in lines if _DOT_LEADER.search(line)) < 3:
+        return None
+    return 'contents' if _entry_share('contents', lines) >= _CONTENTS_WITHOUT_HEADING else None
+
+
+def drop_sections(pages, report=None):
+    # pages: iterable of page texts (headers already stripped); yields them without
+    # tables of contents, reference lists and indexes
+    report = report if report is not None else SkipReport()
+    current = None
+    for page_no, page in enumerate(pages, 1):
+        lines = page.split('\n')
+        # Split the page at section headings; text before the first one continues the previous page
+        segments = [[None, []]]
+        for line in lines:
+            kind = _heading_kind(line) if line.strip() else None
+            if kind:
+                segments.append([kind, [line]])
+            else:
+                segments[-1][1].append(line)
+        kept = []
+        dropped = 0
+        for kind, segment in segments:
+            filled = [line.strip() for line in segment if line.strip()]
+            if kind is None and current is None:
+                drop = _guess_kind(filled, page_no)
+            else:
+                section = kind or current
+                body = filled[1:] if kind else filled
+                # A heading at the very bottom of a page gets the benefit of the doubt until the next page
+                if kind and len(body) < 3:
+                    drop = section
+                else:
+                    drop = section if _entry_share(section, body) >= _SECTION_RULES[section] else None
+            if not filled and kind is None:
+                kept.extend(segment)
+                continue
+            current = drop
+            if drop:
+                chars = sum(len(line) + 1 for line in segment)
+                dropped += chars
+                report.add_section(drop, page_no, chars)
+            else:
+                kept.extend(segment)
+        page = '\n'.join(kept)
+        if dropped:
+            # Each line was counted with its newline; a page has one newline fewer than lines
+            report.sections[-1]['chars'] -= dropped - (len('\n'.join(lines)) - len(page))
+        yield page
+
+
+def information_density(text):
+    # 0-1: how much of the text reads like prose. Low for tables of numbers and symbols and
+    # for text that is mostly the same thing over and over; very short lines pull it down.
+    # A plain list of single words still scores about 1/3, so notes like that get through
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    letters = sum(1 for c in chars if c.isalpha())
+    alpha_score = min(1.0, max(0.0, (letters / len(chars) - 0.5) / 0.3))
+    lines = [line for line in text.split('\n') if line.strip()]
+    words_per_line = sum(len(line.split()) for line in lines) / len(lines)
+    line_score = min(1.0, words_per_line / 3)
+    raw = text.encode('utf-8')
+    # Boilerplate repeated over and over compresses far better than real text
+    ratio = len(zlib.compress(raw, 1)) / len(raw) if len(raw) >= 200 else 0.5
+    repetition_score = min(1.0, max(0.0, (ratio - 0.08) / 0.2))
+    return alpha_score * line_score * repetition_score
+
+
+def drop_thin_blocks(pages, report=None, min_density=DEFAULT_MIN_DENSITY):
+    # Drops paragraphs of MIN_BLOCK_LINES lines or more that score under min_density
+    report = report if report is not None else SkipReport()
+    for page in pages:
+        if not min_density:
+            yield page
+            continue
+        blocks = _BLANK_LINES.split(page)
+        kept = []
+        for block in blocks:
+            lines = sum(1 for line in block.split('\n') if line.strip())
+            if lines >= MIN_BLOCK_LINES and information_density(block) < min_density:
+                report.low_density_blocks += 1
+            else:
+                kept.append(block)
+        if len(kept) == len(blocks):
+            yield page
+            continue
+        cleaned = '\n\n'.join(kept)
+        report.low_density_block_chars += len(page) - len(cleaned)
+        yield cleaned
+
+
+def _overlap(previous, chunk):
+    # Length of the paragraphs (and separator) chunk carried over from the end of previous
+    parts = chunk.split('\n\n')
+    for count in range(len(parts) - 1, 0, -1):
+        carried = '\n\n'.join(parts[:count]) + '\n\n'
+        if previous.endswith('\n\n' + carried[:-2]) or previous == carried[:-2]:
+            return len(carried)
+    return 0
+
+
+def select_chunks(chunks, report=None, min_density=DEFAULT_MIN_DENSITY):
+    # Yields the chunks worth sending. If every chunk falls below min_density the best one
+    # is still sent, so a short note never comes back with no cards at all
+    report = report if report is not None else SkipReport()
+    best = None
+    sent = 0
+    previous = ''
+    for chunk in chunks:
+        report.chunks += 1
+        score = information_density(chunk) if min_density else 1.0
+        # Only the text the chunk doesn't share with the one before counts as skipped
+        new_chars = len(chunk) - _overlap(previous, chunk)
+        previous = chunk
+        if score >= min_density:
+            sent += 1
+            yield chunk
+            continue
+        skipped = {'score': round(score, 3), 'chars': new_chars, 'preview': ' '.join(chunk.split())[:60]}
+        report.low_density_chunks.append(skipped)
+        if best is None or score > best[0]['score']:
+            best = (skipped, chunk)
+    if not sent and best is not None:
+        report.low_density_chunks.remove(best[0])
+        yield best[1]
+
+
+def clean_pages(pieces, report=None, min_density=DEFAULT_MIN_DENSITY):
+    # Pages in, pages out; a piece holding several form-feed separated pages (what
+    # process_pdf returns) is split into them first
+    report = report if report is not None else SkipReport()
+    # Pages read while nothing has come out yet, in case nothing ever does
+    unsent = []
+
+    def pages():
+        for piece in pieces:
+            for page in piece.split('\f'):
+                report.pages += 1
+                report.chars_in += len(page)
+                if unsent is not None:
+                    unsent.append(page)
+                yield page
+
+    for page in drop_thin_blocks(drop_sections(strip_headers(pages(), report), report), report, min_density):
+        if unsent is not None and page.strip():
+            unsent = None
+        yield page
+    if unsent and any(page.strip() for page in unsent):
+        # Everything looked like boilerplate. It's more likely the guesses were wrong (a
+        # timeline, a list of facts) than that someone wanted cards from nothing, so send it all
+        report.header_lines = report.header_chars = 0
+        report.sections = []
+        report.low_density_blocks = report.low_density_block_chars = 0
+        yield from unsent
+
+
+def useful_chunks(pieces, chunk_tokens=DEFAULT_CHUNK_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS, report=None,
+                  skip_boilerplate=True, min_density=DEFAULT_MIN_DENSITY):
+    # iter_chunks with the above in front; skip_boilerplate=False chunks everything as it is,
+    # min_density=0 still strips headers and sections but sends every chunk
+    if not skip_boilerplate:
+        return iter_chunks(pieces, chunk_tokens, overlap_tokens)
+    report = report if report is not None else SkipReport()
+    pages = clean_pages(pieces, report, min_density)
+    return select_chunks(iter_chunks(pages, chunk_tokens, overlap_tokens), report, min_density)
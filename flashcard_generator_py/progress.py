@@ -0,0 +1,112 @@
+# progress.py
+#
+# Progress events from the pipeline. One Progress per run counts pages, chunks, cards and
+# tokens as they happen and hands a snapshot to on_event(event, snapshot). Events:
+#   page, chunks (total now known), chunk_sent, chunk_done, chunk_failed, card, tokens,
+#   and finally done, failed or cancelled.
+# on_event runs on whatever thread did the work (the event loop, or an extraction thread
+# for "page"), so GUI code must hop to its own thread, e.g. with window.after.
+
+import time
+
+
+class Progress:
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.started = time.monotonic()
+        self.pages = 0
+        self.chunks_total = None
+        self.chunks_sent = 0
+        self.chunks_done = 0
+        self.chunks_cached = 0
+        self.chunks_failed = 0
+        self.cards = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.finished = None
+
+    def emit(self, event, amount=1, cached=False, prompt_tokens=0, completion_tokens=0):
+        if event == 'page':
+            self.pages += amount
+        elif event == 'chunks':
+            self.chunks_total = amount
+        elif event == 'chunk_sent':
+            self.chunks_sent += 1
+        elif event == 'request':
+            self.requests += 1
+        elif event == 'chunk_done':
+            self.chunks_done += 1
+            self.chunks_cached += cached
+        elif event == 'chunk_failed':
+            self.chunks_failed += 1
+        elif event == 'card':
+            self.cards += amount
+        elif event == 'tokens':
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        elif event in ('done', 'failed', 'cancelled'):
+            self.finished = event
+        if self.on_event:
+            self.on_event(event, self.snapshot())
+
+    def pages_iter(self, pieces):
+        for piece in pieces:
+            self.emit('page')
+            yield piece
+
+    def eta(self):
+        # Cached chunks finish instantly, so only chunks that hit the API set the pace
+        remaining = (self.chunks_total or 0) - self.chunks_done - self.chunks_failed
+        answered = self.chunks_done - self.chunks_cached
+        if self.chunks_total is None or remaining <= 0 or not answered:
+            return None
+        return (time.monotonic() - self.started) / answered * remaining
+
+    def fraction(self):
+        if not self.chunks_total:
+            return 0.0
+        return min(1.0, (self.chunks_done + self.chunks_failed) / self.chunks_total)
+
+    def snapshot(self):
+        return {
+            'pages': self.pages,
+            'chunks_total': self.chunks_total,
+            'chunks_sent': self.chunks_sent,
+            'chunks_done': self.chunks_done,
+            'chunks_cached': self.chunks_cached,
+            'chunks_failed': self.chunks_failed,
+            'cards': self.cards,
+            'requests': self.requests,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'elapsed': time.monotonic() - self.started,
+            'eta': self.eta(),
+            'fraction': self.fraction(),
+            'finished': self.finished,
+        }
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+def describe(snapshot):
+    # One-line summary for status bars and logs
+    parts = []
+    if snapshot['chunks_total'] is not None:
+        parts.append(f"{snapshot['chunks_done']}/{snapshot['chunks_total']} chunks")
+    elif snapshot['pages']:
+        parts.append(f"{snapshot['pages']} pages read")
+    parts.append(f"{snapshot['cards']} cards")
+    tokens = snapshot['prompt_tokens'] + snapshot['completion_tokens']
+    if tokens:
+        parts.append(f"{tokens:,} tokens")
+    if snapshot['chunks_failed']:
+        parts.append(f"{snapshot['chunks_failed']} failed")
+    if snapshot['eta'] is not None:
+        parts.append(f"~{format_duration(snapshot['eta'])} left")
+    return ", ".join(parts)
@@ -0,0 +1,9 @@
+# conftest.py
+#
+# The app's modules import each other as top-level modules (they're run from
+# flashcard_generator_py), so the tests put that directory on the path the same way.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+# test_batch_api.py
+
+import json
+import os
+
+import cli
+from batch_api import (LocalBatchBackend, collect_batches, load_manifest, prepare_batches, submit_batches,
+                       wait_for_batches)
+from cache import FlashcardCache
+from engine import FlashcardEngine
+
+NOTES = {
+    "cells.txt": "The mitochondrion is where the cell turns sugar into usable energy. "
+                 "Ribosomes read messenger RNA and build proteins from amino acids.",
+    "plants.txt": "Chlorophyll absorbs red and blue light and reflects green light. "
+                  "Stomata on the underside of leaves let carbon dioxide in and water vapour out.",
+}
+
+
+def write_notes(folder):
+    folder.mkdir()
+    for name, text in NOTES.items():
+        (folder / name).write_text(text, encoding="utf-8")
+    return [str(folder / name) for name in NOTES]
+
+
+def build(tmp_path, backend_kind, cache):
+    paths = write_notes(tmp_path / "notes")
+    documents = [(path, str(tmp_path / "decks" / (os.path.basename(path) + ".html"))) for path in paths]
+    os.makedirs(str(tmp_path / "decks"))
+    work_dir = str(tmp_path / "work")
+    engine = FlashcardEngine(cache=cache)
+    manifest = prepare_batches(documents, work_dir, engine, backend=backend_kind)
+    backend = LocalBatchBackend(os.path.join(work_dir, "local"))
+    submit_batches(manifest, work_dir, backend)
+    wait_for_batches(manifest, work_dir, backend, poll_interval=0)
+    collect_batches(manifest, work_dir, backend, cache)
+    return manifest, documents, engine
+
+
+def test_local_flow_writes_decks_without_touching_the_cache(tmp_path):
+    cache = FlashcardCache(str(tmp_path / "responses.sqlite3"))
+    manifest, documents, _ = build(tmp_path, 'local', cache)
+    assert sum(batch['requests'] for batch in manifest['batches']) == 2
+    assert [document['status'] for document in manifest['documents']] == ['done', 'done']
+    for source, output_file in documents:
+        page = open(output_file, encoding="utf-8").read()
+        assert "What is meant by" in page
+    assert cache.stats()['entries'] == 0
+    assert load_manifest(str(tmp_path / "work"))['collected']
+
+
+def test_real_backend_results_are_cached_for_resubmits(tmp_path):
+    # LocalBatchBackend answering a batch prepared for the real API, to check the caching that
+    # lets a resubmit skip chunks that already have cards
+    cache = FlashcardCache(str(tmp_path / "responses.sqlite3"))
+    _, documents, engine = build(tmp_path, 'openai', cache)
+    assert cache.stats()['entries'] == 2
+    again = prepare_batches(documents, str(tmp_path / "again"), engine)
+    assert again['batches'] == []
+    assert [document['cached'] for document in again['documents']] == [1, 1]
+
+
+def test_offline_submit_local_leaves_the_shared_cache_empty(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "load_dotenv", lambda: None)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    write_notes(tmp_path / "notes")
+    out = str(tmp_path / "decks")
+    assert cli.main(["offline", "submit", str(tmp_path / "notes"), "--out", out, "--local", "--wait",
+                     "--poll-interval", "0.01"]) == 0
+    assert "2 decks written, 0 failed" in capsys.readouterr().out
+    manifest = json.loads((tmp_path / "decks" / ".batches" / "manifest.json").read_text())
+    assert manifest['backend'] == 'local'
+    cache_file = tmp_path / "xdg" / "flashcard_generator" / "responses.sqlite3"
+    assert not cache_file.exists() or FlashcardCache(str(cache_file)).stats()['entries'] == 0
@@ -0,0 +1,105 @@
+# test_cache.py
+
+import threading
+import time
+
+import cache as cache_module
+from cache import FlashcardCache, cache_key
+
+
+def make_cache(tmp_path, **options):
+    return FlashcardCache(str(tmp_path / "responses.sqlite3"), **options)
+
+
+def table_size(cache):
+    return cache._connect().execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+
+def test_key_ignores_whitespace_but_not_model_or_params():
+    key = cache_key("The  cell\nis small.", "gpt-4o-mini", "prompt", {"temperature": 0.2})
+    assert key == cache_key(" The cell is small. ", "gpt-4o-mini", "prompt", {"temperature": 0.2})
+    assert key != cache_key("The cell is small.", "gpt-4o", "prompt", {"temperature": 0.2})
+    assert key != cache_key("The cell is small.", "gpt-4o-mini", "prompt", {"temperature": 0.7})
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("k") is None
+    cache.put("k", [["Q?", "A."]])
+    assert cache.get("k") == [["Q?", "A."]]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    cache.close()
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = make_cache(tmp_path, max_age=60)
+    cache.put("k", [["Q?", "A."]])
+    with cache._connect() as conn:
+        conn.execute('UPDATE responses SET created = ?', (time.time() - 120,))
+    assert cache.get("k") is None
+    cache.evict()
+    assert cache.stats()['entries'] == 0
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=950)
+    for i in range(10):
+        cache.put(f"k{i}", [["Q" * 40, "A" * 40]])
+        with cache._connect() as conn:
+            conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (i, f"k{i}"))
+    with cache._connect() as conn:
+        conn.execute('UPDATE responses SET accessed = 100 WHERE key = ?', ("k0",))
+    cache.put("k10", [["Q" * 40, "A" * 40]])
+    assert table_size(cache) <= 950
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+    assert cache.get("k10") is not None
+
+
+def test_running_size_follows_the_table(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10 ** 9)
+    for i in range(20):
+        cache.put(f"k{i % 7}", [["Q?", "A" * i]])
+    assert cache._size == table_size(cache)
+
+
+def test_full_pass_only_every_so_often(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, 'EVICT_EVERY', 10)
+    cache = make_cache(tmp_path, max_bytes=10 ** 9)
+    passes = []
+    original = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: (passes.append(1), original()))
+    for i in range(30):
+        cache.put(f"k{i}", [["Q?", "A."]])
+    # The first put counts the table, then once every EVICT_EVERY puts
+    assert len(passes) == 4
+
+
+def test_close_closes_every_thread_connection(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("main", [["Q?", "A."]])
+    thread = threading.Thread(target=lambda: cache.put("thread", [["Q?", "A."]]))
+    thread.start()
+    thread.join()
+    connections = list(cache._connections)
+    assert len(connections) == 2
+    cache.close()
+    assert cache._connections == []
+    for conn in connections:
+        try:
+            conn.execute('SELECT 1')
+        except Exception as e:
+            assert 'closed' in str(e)
+        else:
+            raise AssertionError("connection still open")
+    # Still usable afterwards
+    assert cache.get("thread") == [["Q?", "A."]]
+
+
+def test_update_document_compares_runs(tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.update_document("notes.pdf", ["a", "b", "c"])
+    assert first['first_run'] and first['changed'] == 3
+    second = cache.update_document("notes.pdf", ["a", "b", "d"])
+    assert (second['unchanged'], second['changed'], second['removed']) == (2, 1, 1)
@@ -0,0 +1,77 @@
+# test_cards.py
+
+import json
+
+import pytest
+
+from cards import FORMAT, VERSION, Deck, Flashcard, iter_jsonl, read_header, split_card, write_jsonl
+from exporters import DeckExporter
+
+VITAMIN = "Q: What is vitamin A: retinol or carotene?\nA: Vitamin A: retinol.\nA: carotene is turned into it."
+
+
+def test_answer_containing_a_colon_label_survives():
+    question, answer = split_card(VITAMIN)
+    assert question == "What is vitamin A: retinol or carotene?"
+    assert answer == "Vitamin A: retinol.\nA: carotene is turned into it."
+    card = Flashcard.from_text(VITAMIN)
+    assert Flashcard.from_text(card.text()) == card
+
+
+def test_one_line_cards_split_at_the_answer():
+    assert split_card("Q: Is water wet? A: Yes.") == ("Is water wet?", "Yes.")
+
+
+def test_jsonl_round_trip_through_the_memory_map(tmp_path):
+    path = str(tmp_path / "deck.jsonl")
+    cards = [
+        Flashcard("What is ATP?", "The cell's energy carrier.", "notes/Cell Biology.pdf", 0, 3, "gpt-4o-mini"),
+        Flashcard.from_text(VITAMIN, "notes/Cell Biology.pdf", 1, model="gpt-4o-mini"),
+        Flashcard("Wie heißt das Kraftwerk der Zelle?", "Mitochondrium — \"power house\"", None, 2),
+        Flashcard("Bare card?", "Yes."),
+    ]
+    assert Deck(cards, title="Cells").save(path) == 4
+    assert read_header(path) == {"format": FORMAT, "version": VERSION, "title": "Cells",
+                                 "fields": ["question", "answer", "source", "chunk", "page", "model"]}
+    deck = Deck.load(path)
+    assert deck.title == "Cells"
+    assert [card.to_row() for card in deck] == [card.to_row() for card in cards]
+    assert deck[1].answer == "Vitamin A: retinol.\nA: carotene is turned into it."
+    # Repeated source and model strings are shared between cards, not copied per card
+    assert deck[0].source is deck[1].source
+    assert deck[0].model is deck[1].model
+    # Trailing empty fields aren't written at all
+    lines = open(path, encoding="utf-8").read().splitlines()
+    assert json.loads(lines[-1]) == ["Bare card?", "Yes."]
+
+
+def test_strings_are_written_as_cards(tmp_path):
+    path = str(tmp_path / "deck.jsonl")
+    write_jsonl(path, ["Q: One?\nA: 1", VITAMIN])
+    assert [card.text() for card in iter_jsonl(path)] == ["Q: One?\nA: 1", VITAMIN]
+
+
+def test_empty_deck(tmp_path):
+    path = str(tmp_path / "deck.jsonl")
+    write_jsonl(path, [])
+    assert list(iter_jsonl(path)) == []
+
+
+def test_foreign_or_newer_files_are_refused(tmp_path):
+    other = tmp_path / "other.jsonl"
+    other.write_text('{"hello": "world"}\n')
+    with pytest.raises(ValueError):
+        list(iter_jsonl(str(other)))
+    newer = tmp_path / "newer.jsonl"
+    newer.write_text(json.dumps({"format": FORMAT, "version": VERSION + 1}) + "\n")
+    with pytest.raises(ValueError):
+        read_header(str(newer))
+
+
+def test_answer_with_a_colon_label_survives_every_export(tmp_path):
+    with DeckExporter(str(tmp_path / "deck.html"), formats=["html", "csv", "jsonl"]) as exporter:
+        exporter.write(VITAMIN)
+    [card] = iter_jsonl(str(tmp_path / "deck.jsonl"))
+    assert card.answer == "Vitamin A: retinol.\nA: carotene is turned into it."
+    assert "retinol or carotene?" in (tmp_path / "deck.csv").read_text(encoding="utf-8")
+    assert "carotene is turned into it." in (tmp_path / "deck.html").read_text(encoding="utf-8")
@@ -0,0 +1,77 @@
+# test_chunking.py
+
+import random
+
+import pytest
+
+from chunking import chunk_text, count_tokens, iter_chunks, is_heading, split_blocks
+
+
+def paragraphs(count, words=40):
+    return [" ".join(f"word{n}x{i}" for i in range(words)) + "." for n in range(count)]
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("Just one paragraph.") == ["Just one paragraph."]
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("") == []
+    assert chunk_text("   \n\n  ") == []
+
+
+def test_chunks_stay_under_budget_and_cover_everything():
+    text = "\n\n".join(paragraphs(60))
+    chunks = chunk_text(text, max_tokens=300, overlap_tokens=50)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    joined = "\n\n".join(chunks)
+    for paragraph in paragraphs(60):
+        assert paragraph in joined
+
+
+def test_overlap_carries_the_last_paragraph():
+    text = "\n\n".join(paragraphs(60))
+    chunks = chunk_text(text, max_tokens=300, overlap_tokens=150)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.split("\n\n")[-1] in chunk
+
+
+def test_oversized_paragraph_is_split():
+    sentence = "This sentence is about as long as any other sentence here. "
+    chunks = chunk_text(sentence * 200, max_tokens=100, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+
+
+def test_pages_are_joined_across_piece_boundaries():
+    # A paragraph that runs from one page into the next stays one block
+    blocks = list(split_blocks("First page ends mid\nsentence here.\n\nNext."))
+    pieces = ["First page ends mid", "sentence here.\n\nNext."]
+    assert [b for chunk in iter_chunks(pieces) for b in chunk.split("\n\n")] == blocks
+
+
+def test_edit_only_changes_nearby_chunks():
+    # Content-defined boundaries: chunks before an edit are untouched and later ones line up again
+    rng = random.Random(3)
+    parts = [" ".join(f"w{rng.randint(0, 999)}" for _ in range(rng.randint(10, 120))) + "." for _ in range(200)]
+    before = chunk_text("\n\n".join(parts), max_tokens=1500, overlap_tokens=0)
+    parts[100] = "A completely rewritten paragraph."
+    after = chunk_text("\n\n".join(parts), max_tokens=1500, overlap_tokens=0)
+    edited = next(i for i, chunk in enumerate(before) if parts[99] in chunk)
+    assert after[:edited] == before[:edited]
+    assert set(before[edited + 1:]) & set(after[edited + 1:])
+
+
+def test_headings():
+    assert is_heading("# Cell biology")
+    assert is_heading("Chapter 3 Membranes")
+    assert is_heading("2.1 Transport")
+    assert is_heading("INTRODUCTION")
+    assert not is_heading("The cell is the basic unit of life.")
+
+
+@pytest.mark.parametrize("max_tokens, overlap", [(0, 0), (100, 100), (100, -1)])
+def test_bad_budgets(max_tokens, overlap):
+    with pytest.raises(ValueError):
+        chunk_text("text", max_tokens, overlap)
@@ -0,0 +1,57 @@
+# test_clients.py
+
+import asyncio
+
+import pytest
+
+import cli
+from clients import PLACEHOLDER_API_KEY, ClientManager, ClientSettings
+
+
+@pytest.fixture
+def manager():
+    manager = ClientManager()
+    yield manager
+    manager.close()
+
+
+def test_run_uses_one_loop(manager):
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    assert manager.run(current_loop()) is manager.run(current_loop()) is manager.loop()
+
+
+def test_run_from_the_shared_loop_raises_instead_of_hanging(manager):
+    async def inner():
+        return 1
+
+    async def outer():
+        with pytest.raises(RuntimeError):
+            manager.run(inner())
+        return "ok"
+
+    future = asyncio.run_coroutine_threadsafe(outer(), manager.loop())
+    assert future.result(5) == "ok"
+
+
+def test_placeholder_key_only_with_a_base_url(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+    assert ClientSettings().client_options()['api_key'] is None
+    assert ClientSettings(base_url="http://127.0.0.1:8000/v1").client_options()['api_key'] == PLACEHOLDER_API_KEY
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:8000/v1")
+    assert ClientSettings().client_options()['api_key'] == PLACEHOLDER_API_KEY
+    assert ClientSettings(api_key="real").client_options()['api_key'] == "real"
+
+
+def test_cli_needs_a_key_unless_a_base_url_is_given(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(cli, "load_dotenv", lambda: None)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+    missing = str(tmp_path / "missing.txt")
+    assert cli.main(["batch", missing, "--out", str(tmp_path)]) == 2
+    assert "No API key found" in capsys.readouterr().out
+    # Gets past the key check to finding no inputs
+    assert cli.main(["batch", missing, "--out", str(tmp_path), "--base-url", "http://127.0.0.1:8000/v1"]) == 1
+    assert "No PDF or text files found" in capsys.readouterr().out
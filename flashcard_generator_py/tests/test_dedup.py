@@ -0,0 +1,46 @@
+# test_dedup.py
+
+import pytest
+
+from dedup import NearDuplicateIndex, cluster_flashcards, dedupe_flashcards, jaccard, shingles
+
+ATP = "Q: What is ATP?\nA: ATP is the energy currency of the cell."
+ATP_AGAIN = "Q: Define ATP.\nA: The energy currency of the cell."
+RIBOSOME = "Q: What do ribosomes do?\nA: Ribosomes build proteins from amino acids."
+MITOSIS = "Q: What happens in mitosis?\nA: One cell divides into two identical daughter cells."
+
+
+def test_shingles_ignore_question_boilerplate():
+    assert shingles("Q: What is ATP?\nA: The energy currency.") == shingles("Q: Define ATP.\nA: Energy currency")
+    assert "ribosome" in shingles(RIBOSOME)
+
+
+def test_jaccard():
+    assert jaccard(frozenset("ab"), frozenset("ab")) == 1.0
+    assert jaccard(frozenset("ab"), frozenset("bc")) == pytest.approx(1 / 3)
+    assert jaccard(frozenset(), frozenset("a")) == 0.0
+
+
+def test_streaming_index_keeps_the_first_of_a_group():
+    index = NearDuplicateIndex()
+    assert [index.is_duplicate(card) for card in (ATP, RIBOSOME, ATP_AGAIN, MITOSIS)] == [False, False, True, False]
+    assert index.cards == [ATP, RIBOSOME, MITOSIS]
+
+
+def test_clusters_and_dedupe_keep_the_best_card_in_place():
+    cards = [ATP_AGAIN, RIBOSOME, ATP, MITOSIS]
+    assert cluster_flashcards(cards) == [[0, 2], [1], [3]]
+    # The real question wins over "Define ATP." but sits where the group first appeared
+    assert dedupe_flashcards(cards) == [ATP, RIBOSOME, MITOSIS]
+
+
+def test_many_distinct_cards_survive():
+    cards = [f"Q: What is element number {n} called?\nA: It is called elem{n}ium, symbol E{n}." for n in range(300)]
+    assert len(dedupe_flashcards(cards)) == 300
+
+
+def test_threshold_must_be_a_fraction():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(0)
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(1.5)
@@ -0,0 +1,140 @@
+# test_engine.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import tracing
+from cache import FlashcardCache
+from cards import iter_jsonl
+from engine import FlashcardEngine, FlashcardGenerationError
+from flashcard_generator import generate_flashcards
+from pipeline import write_deck_async
+from progress import Progress
+
+
+def delta(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+class FakeStream:
+    # Yields the pieces in order; an exception among them is raised at that point instead
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        if not self.pieces:
+            raise StopAsyncIteration
+        piece = self.pieces.pop(0)
+        if isinstance(piece, Exception):
+            raise piece
+        return delta(piece)
+
+
+class FakeClient:
+    # Stands in for AsyncOpenAI: each request streams the next script in the list
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=self.create)))
+
+    async def create(self, **kwargs):
+        self.requests += 1
+        stream = FakeStream(self.scripts.pop(0))
+        return SimpleNamespace(headers={}, parse=lambda: stream)
+
+    async def close(self):
+        pass
+
+
+def make_engine(client, **options):
+    return FlashcardEngine(client=client, stream=True, backoff_base=0, max_backoff=0, models=("fake",), **options)
+
+
+def generate(engine, text="Some notes."):
+    received = []
+    cards = asyncio.run(engine.generate_chunk(text, on_card=lambda card, model: received.append(card)))
+    return cards, received
+
+
+def test_streamed_cards_reach_on_card_with_their_model(tmp_path):
+    client = FakeClient(["Q: One?\nA: 1\n", "Q: Two?\nA: 2\n"])
+    engine = make_engine(client, cache=FlashcardCache(str(tmp_path / "responses.sqlite3")))
+    received = []
+    for _ in range(2):
+        asyncio.run(engine.generate_chunk("Some notes.", on_card=lambda card, model: received.append((card, model))))
+    assert client.requests == 1
+    # The second time comes from the cache, which doesn't know the model
+    assert received == [("Q: One?\nA: 1", "fake"), ("Q: Two?\nA: 2", "fake"),
+                        ("Q: One?\nA: 1", None), ("Q: Two?\nA: 2", None)]
+
+
+def test_failed_stream_cards_are_dropped_on_retry():
+    # The first stream gets two cards out before it stalls; only the retry's cards count
+    client = FakeClient(
+        ["Q: Old one?\nA: 1\n", "Q: Old two?\nA: 2\n", "Q: Old three", asyncio.TimeoutError("stalled")],
+        ["Q: New one?\nA: 1\n", "Q: New two?\nA: 2\n"],
+    )
+    cards, received = generate(make_engine(client))
+    assert client.requests == 2
+    assert cards == received == ["Q: New one?\nA: 1", "Q: New two?\nA: 2"]
+
+
+def test_nothing_reaches_on_card_when_every_attempt_fails():
+    client = FakeClient(*[["Q: Half?\nA: done\n", asyncio.TimeoutError("stalled")]] * 2)
+    received = []
+    with pytest.raises(FlashcardGenerationError):
+        asyncio.run(make_engine(client, max_retries=2).generate_chunk(
+            "Notes.", on_card=lambda card, model: received.append(card)))
+    assert received == []
+
+
+def test_progress_events_from_a_retried_then_cached_chunk(tmp_path):
+    client = FakeClient(["Q: Half?\nA: done\n", asyncio.TimeoutError("stalled")], ["Q: One?\nA: 1\n"])
+    engine = make_engine(client, cache=FlashcardCache(str(tmp_path / "responses.sqlite3")))
+    events = []
+    progress = Progress(lambda event, snapshot: events.append(event))
+    progress.emit('chunks', 2)
+    for _ in range(2):
+        asyncio.run(engine.generate_chunk("Some notes.", progress=progress))
+    assert events == ['chunks', 'chunk_sent', 'request', 'request', 'chunk_done', 'chunk_done']
+    snapshot = progress.snapshot()
+    assert (snapshot['chunks_done'], snapshot['chunks_cached'], snapshot['requests']) == (2, 1, 2)
+    assert snapshot['fraction'] == 1.0
+
+
+def test_each_generate_flashcards_call_ends_with_its_own_summary(capsys):
+    outer = tracing.start_run()
+    for _ in range(2):
+        client = FakeClient(["Q: One?\nA: 1\n"])
+        cards = generate_flashcards("Some notes.", cache=False, client=client, stream=True, models=("fake",))
+        assert cards == ["Q: One?\nA: 1"]
+        output = capsys.readouterr().out
+        assert "Run summary" in output
+        assert "API: 1 requests" in output
+    # The process-wide tracer still saw both calls
+    assert outer.summary()['requests'] == 2
+    tracing.start_run()
+
+
+def test_streamed_deck_cards_know_their_chunk_and_model(tmp_path):
+    pages = [f"Page {n} explains how the {topic} works and why it matters to the rest of the cell. " * 3
+             for n, topic in enumerate(["nucleus", "ribosome", "membrane"], 1)]
+    client = FakeClient(*[[f"Q: Card {n}?\nA: Answer {n}.\n"] for n in range(20)])
+    engine = make_engine(client)
+
+    async def build():
+        return await write_deck_async(pages, str(tmp_path / "cells.html"), chunk_tokens=60, overlap_tokens=0,
+                                      engine=engine, deck_options={'formats': ['jsonl']}, document_id="cells.pdf",
+                                      skip_boilerplate=False)
+
+    count, _ = asyncio.run(build())
+    assert count == client.requests > 1
+    cards = list(iter_jsonl(str(tmp_path / "cells.jsonl")))
+    assert sorted(card.chunk for card in cards) == list(range(count))
+    assert {(card.source, card.model) for card in cards} == {("cells.pdf", "fake")}
@@ -0,0 +1,88 @@
+# test_exporters.py
+
+import csv
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from cards import FIELDS, Flashcard, iter_jsonl
+from exporters import ApkgWriter, DeckExporter, deck_files, export_path, parse_formats
+
+CARDS = [
+    Flashcard("What is ATP?", "The cell's <energy> currency,\nmade in mitochondria.", "notes/Cell Biology.pdf", 0, 3),
+    Flashcard("What do ribosomes do?", "Build proteins.", "notes/Cell Biology.pdf", 1, 4, "gpt-4o-mini"),
+]
+
+
+def test_export_paths():
+    assert export_path("decks/notes.html", "apkg") == "decks/notes.apkg"
+    assert export_path("decks/notes.html.part", "csv") == "decks/notes.csv.part"
+    assert deck_files("notes.html", ["html", "jsonl"]) == ["notes.html", "notes.jsonl"]
+
+
+def test_parse_formats():
+    assert parse_formats("html, .APKG,html") == ["html", "apkg"]
+    with pytest.raises(ValueError):
+        parse_formats("pdf")
+    with pytest.raises(ValueError):
+        parse_formats(" , ")
+
+
+def test_one_pass_writes_every_format(tmp_path):
+    with DeckExporter(str(tmp_path / "cells.html"), formats=["html", "csv", "jsonl", "apkg"]) as exporter:
+        exporter.write_all(CARDS + ["Q: Broken card without an answer"])
+    assert exporter.count == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cells.apkg", "cells.csv", "cells.html", "cells.jsonl"]
+
+    with open(tmp_path / "cells.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(FIELDS)
+    assert rows[1][:2] == ["What is ATP?", "The cell's <energy> currency,\nmade in mitochondria."]
+
+    assert list(iter_jsonl(str(tmp_path / "cells.jsonl"))) == CARDS
+    assert "What do ribosomes do?" in (tmp_path / "cells.html").read_text(encoding="utf-8")
+
+
+def test_string_cards_get_the_exporters_source(tmp_path):
+    with DeckExporter(str(tmp_path / "deck.html"), formats=["jsonl"], source="lecture.pdf") as exporter:
+        exporter.write("Q: What is a cell?\nA: The unit of life.")
+    [card] = iter_jsonl(str(tmp_path / "deck.jsonl"))
+    assert (card.question, card.answer, card.source) == ("What is a cell?", "The unit of life.", "lecture.pdf")
+
+
+def read_collection(path, tmp_path):
+    with zipfile.ZipFile(path) as package:
+        assert json.loads(package.read("media")) == {}
+        package.extract("collection.anki2", str(tmp_path))
+    return sqlite3.connect(str(tmp_path / "collection.anki2"))
+
+
+def test_apkg_collection(tmp_path):
+    with ApkgWriter(str(tmp_path / "cells.apkg"), batch_size=1) as writer:
+        writer.write_all(CARDS)
+    db = read_collection(str(tmp_path / "cells.apkg"), tmp_path)
+    notes = db.execute("SELECT guid, tags, flds, sfld FROM notes ORDER BY id").fetchall()
+    assert [note[3] for note in notes] == ["What is ATP?", "What do ribosomes do?"]
+    assert notes[0][2] == "What is ATP?\x1fThe cell's &lt;energy&gt; currency,<br>made in mitochondria."
+    assert notes[0][1] == " Cell_Biology "
+    cards = db.execute("SELECT nid, did, due FROM cards ORDER BY due").fetchall()
+    assert [card[2] for card in cards] == [0, 1]
+    decks = json.loads(db.execute("SELECT decks FROM col").fetchone()[0])
+    assert "cells" in [deck["name"] for deck in decks.values()]
+    assert all(str(card[1]) in decks for card in cards)
+    # No temporary collection left next to the package
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".anki2"] == ["collection.anki2"]
+
+
+def test_apkg_guids_are_stable_across_builds(tmp_path):
+    guids = []
+    for name in ("first.apkg", "second.apkg"):
+        with ApkgWriter(str(tmp_path / name)) as writer:
+            writer.write_all(CARDS)
+        db = read_collection(str(tmp_path / name), tmp_path / name.split(".")[0])
+        guids.append([row[0] for row in db.execute("SELECT guid FROM notes ORDER BY id")])
+        db.close()
+    assert guids[0] == guids[1]
+    assert len(set(guids[0])) == 2
@@ -0,0 +1,100 @@
+# test_html_deck.py
+
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from cli import build_parser
+from html_deck import DeckWriter, SCRIPT, VIRTUAL_SCRIPT, VIRTUAL_THRESHOLD, sidecar_path
+
+
+def cards(count):
+    return [f"Q: Question {i}?\nA: Answer {i}." for i in range(count)]
+
+
+def write_deck(path, flashcards, **options):
+    with DeckWriter(str(path), **options) as writer:
+        writer.write_all(flashcards)
+    return writer, path.read_text(encoding="utf-8")
+
+
+def test_dom_deck_escapes_card_text(tmp_path):
+    _, page = write_deck(tmp_path / "deck.html", ["Q: Is 1 < 2?\nA: <b>Yes</b>"], viewer="dom")
+    assert "Is 1 &lt; 2?" in page
+    assert "<b>Yes</b>" not in page
+
+
+def test_virtual_deck_embeds_json(tmp_path):
+    writer, page = write_deck(tmp_path / "deck.html", cards(3) + ["Q: </script>?\nA: x"], viewer="virtual")
+    data = page.split('id="flashcard-data">')[1].split("</script>")[0]
+    assert writer.count == 4
+    assert json.loads(data)[3] == ["</script>?", "x"]
+
+
+def test_sidecar(tmp_path):
+    write_deck(tmp_path / "deck.html", cards(2), viewer="virtual", sidecar=True)
+    script = open(sidecar_path(str(tmp_path / "deck.html")), encoding="utf-8").read()
+    assert script.startswith("window.FLASHCARDS = [")
+
+
+@pytest.mark.parametrize("count, viewer", [(0, "dom"), (10, "dom"), (VIRTUAL_THRESHOLD, "dom"),
+                                           (VIRTUAL_THRESHOLD + 1, "virtual"), (VIRTUAL_THRESHOLD + 50, "virtual")])
+def test_no_viewer_picks_by_deck_size(tmp_path, count, viewer):
+    # One card at a time, like the streaming pipeline writes them
+    with DeckWriter(str(tmp_path / "deck.html"), viewer=None) as writer:
+        for card in cards(count):
+            writer.write(card)
+    page = (tmp_path / "deck.html").read_text(encoding="utf-8")
+    assert writer.viewer == viewer
+    assert writer.count == count
+    if viewer == "virtual":
+        assert len(json.loads(page.split('id="flashcard-data">')[1].split("</script>")[0])) == count
+    else:
+        assert page.count('<div class="question">') == count
+
+
+def test_cli_viewer_defaults_to_automatic():
+    args = build_parser().parse_args(["batch", "notes.pdf", "--out", "decks"])
+    assert args.viewer is None
+
+
+# A few lines of fake DOM, enough to run the viewer scripts in node and press Space
+FAKE_DOM = '''
+const handlers = {};
+function element() {
+    const classes = new Set();
+    return {
+        dataset: {}, style: {}, textContent: '', disabled: false, offsetWidth: 0,
+        classList: {
+            add: c => classes.add(c), remove: c => classes.delete(c),
+            toggle: (c, on) => { if (on === undefined ? !classes.has(c) : on) classes.add(c); else classes.delete(c); },
+        },
+        querySelector: () => element(),
+    };
+}
+const elements = {};
+global.window = {};
+global.document = {
+    addEventListener: (name, fn) => { handlers[name] = fn; },
+    getElementById: id => id === 'flashcard-data' ? { textContent: '[]' } : (elements[id] = elements[id] || element()),
+    querySelectorAll: () => Object.assign([element(), element(), element()].slice(0, global.SLOTS), {
+        forEach(fn) { Array.prototype.forEach.call(this, fn); } }),
+};
+global.toggleAnswer = (...args) => window.toggleAnswer(...args);
+global.previousCard = () => window.previousCard();
+global.nextCard = () => window.nextCard();
+'''
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+@pytest.mark.parametrize("script, slots", [(VIRTUAL_SCRIPT, 3), (SCRIPT, 0)], ids=["virtual", "dom"])
+def test_space_on_an_empty_deck(script, slots):
+    program = (f"global.SLOTS = {slots};" + FAKE_DOM + script +
+               "handlers.DOMContentLoaded();"
+               "handlers.keydown({ code: 'Space', preventDefault() {} });"
+               "console.log('ok');")
+    result = subprocess.run(["node", "-e", program], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
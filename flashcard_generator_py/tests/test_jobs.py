@@ -0,0 +1,166 @@
+# test_jobs.py
+
+import asyncio
+import socket
+import subprocess
+import sys
+
+import tracing
+from cache import FlashcardCache, cache_key
+from cards import iter_jsonl
+from jobs import DONE, FAILED, PENDING, RUNNING, JobRunner, JobStore, new_owner
+
+TOPICS = ["mitochondria", "ribosomes", "chloroplasts", "lysosomes", "the nucleus", "the cell membrane"]
+
+
+def notes(topics):
+    return "\n\n".join(
+        f"The study of {topic} matters because {topic} carry out work the cell depends on. "
+        f"Biologists describe how {topic} are built, what they do and why damage to {topic} causes disease."
+        for topic in topics
+    )
+
+
+class FakeEngine:
+    # Enough of FlashcardEngine for JobRunner: one card per chunk, no API
+    concurrency = 4
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.texts = []
+
+    def chunk_cache_key(self, text):
+        return cache_key(text, ["fake"], "prompt", {})
+
+    async def generate_chunk(self, text, on_card=None, progress=None):
+        self.texts.append(text)
+        await asyncio.sleep(0)
+        cards = [f"Q: What is chunk {len(self.texts)} about?\nA: {text[:40]}"]
+        if on_card:
+            for card in cards:
+                on_card(card, "fake-model")
+        return cards
+
+    async def aclose(self):
+        pass
+
+
+def run_jobs(store, engine, job_ids=None):
+    return asyncio.run(JobRunner(store, engine=engine).run(job_ids))
+
+
+def add(store, tmp_path, name, text, **options):
+    options = dict({'chunk_tokens': 60, 'overlap_tokens': 0, 'document_id': name}, **options)
+    return store.add_job(name, str(tmp_path / f"{name}.html"), text=text, options=options)
+
+
+def test_job_writes_its_deck(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = add(store, tmp_path, "cells", notes(TOPICS), deck_options={'formats': ['html', 'jsonl']})
+    assert run_jobs(store, FakeEngine()) == {job_id: DONE}
+    assert store.get_job(job_id)['status'] == DONE
+    page = (tmp_path / "cells.html").read_text(encoding="utf-8")
+    assert "What is chunk" in page
+    cards = list(iter_jsonl(str(tmp_path / "cells.jsonl")))
+    assert cards
+    assert {(card.source, card.model) for card in cards} == {("cells", "fake-model")}
+    assert len({card.chunk for card in cards}) == len(cards)
+
+
+def test_each_job_gets_its_own_summary(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    first = add(store, tmp_path, "cells", notes(TOPICS))
+    second = add(store, tmp_path, "more cells", notes(TOPICS[:3]))
+    summaries = {}
+    runner = JobRunner(store, engine=FakeEngine(),
+                       on_summary=lambda job_id, summary: summaries.update({job_id: summary}))
+    outer = tracing.start_run()
+    assert asyncio.run(runner.run()) == {first: DONE, second: DONE}
+    assert set(summaries) == {first, second}
+    for summary in summaries.values():
+        # Spans from the extraction and deck-writing threads land in the job's own tracer
+        assert {name: stage['count'] for name, stage in summary['stages'].items()} == {
+            'job': 1, 'read_input': 1, 'dedup': 1, 'write_html': 1}
+    assert outer.summary()['stages']['job']['count'] == 2
+    tracing.start_run()
+
+
+def test_rerun_reports_unchanged_sections(tmp_path, capsys):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    cache = FlashcardCache(str(tmp_path / "cache.sqlite3"))
+    add(store, tmp_path, "cells", notes(TOPICS))
+    run_jobs(store, FakeEngine(cache))
+    first = store.chunk_count(1)
+    assert first > 2
+    assert "sections unchanged" not in capsys.readouterr().out
+
+    # Same document, last topic edited
+    job_id = add(store, tmp_path, "cells", notes(TOPICS[:-1] + ["the cytoskeleton"]))
+    run_jobs(store, FakeEngine(cache), [job_id])
+    assert f"{first - 1} of {first} sections unchanged, 1 new or edited, 1 removed" in capsys.readouterr().out
+
+
+def dead_owner():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}:deadbeef"
+
+
+def test_only_one_owner_claims_a_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job_id = JobStore(path).add_job("notes.txt", "notes.html", text="x")
+    first, second = new_owner(), new_owner()
+    # Two stores stand in for the GUI and 'jobs run'
+    assert JobStore(path).claim(job_id, first)
+    assert not JobStore(path).claim(job_id, second)
+    assert JobStore(path).get_job(job_id)['owner'] == first
+
+
+def test_job_of_a_dead_process_is_claimed_again(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.add_job("notes.txt", "notes.html", text="x")
+    assert store.claim(job_id, dead_owner())
+    owner = new_owner()
+    assert store.claim(job_id, owner)
+    assert store.get_job(job_id)['owner'] == owner
+
+
+def test_failed_jobs_only_claimed_when_retrying(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.add_job("notes.txt", "notes.html", text="x")
+    store.set_status(job_id, FAILED, "boom")
+    assert not store.claim(job_id, new_owner())
+    assert store.claim(job_id, new_owner(), (PENDING, FAILED))
+
+
+def test_runner_leaves_jobs_claimed_elsewhere_alone(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    mine = add(store, tmp_path, "mine", notes(TOPICS))
+    theirs = add(store, tmp_path, "theirs", notes(TOPICS))
+    store.claim(theirs, new_owner())
+    engine = FakeEngine()
+    assert run_jobs(store, engine) == {mine: DONE, theirs: RUNNING}
+    assert not (tmp_path / "theirs.html").exists()
+
+
+def test_interrupted_job_goes_back_to_the_queue(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = add(store, tmp_path, "cells", notes(TOPICS))
+
+    class StuckEngine(FakeEngine):
+        async def generate_chunk(self, text, on_card=None, progress=None):
+            await asyncio.sleep(60)
+
+    async def interrupt():
+        runner = JobRunner(store, engine=StuckEngine())
+        task = asyncio.ensure_future(runner.run_job(job_id))
+        while store.get_job(job_id)['status'] != RUNNING:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(interrupt())
+    job = store.get_job(job_id)
+    assert (job['status'], job['owner']) == (PENDING, None)
+    assert run_jobs(store, FakeEngine()) == {job_id: DONE}
+
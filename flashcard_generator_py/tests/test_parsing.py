@@ -0,0 +1,121 @@
+# test_parsing.py
+
+import json
+
+import pytest
+
+from parsing import (IncrementalCardParser, JsonCardParser, lenient_parse_flashcards, merge_flashcards,
+                     parse_flashcards, parse_json_flashcards, parse_text_flashcards)
+
+
+def feed_in_pieces(parser, text, size):
+    cards = []
+    for i in range(0, len(text), size):
+        cards += parser.feed(text[i:i + size])
+    return cards + parser.close()
+
+
+def test_lenient_parser_handles_markdown_and_numbering():
+    text = ("Here are your flashcards:\n\n"
+            "1. **Question:** What is ATP?\n**Answer:** The cell's energy carrier.\n"
+            "- Q: Where is it made?\n- A: In the mitochondria,\nmostly.\n"
+            "---\n"
+            "Q2: What is a ribosome?\nA2: Where proteins are built.")
+    assert lenient_parse_flashcards(text) == [
+        "Q: What is ATP?\nA: The cell's energy carrier.",
+        "Q: Where is it made?\nA: In the mitochondria,\nmostly.",
+        "Q: What is a ribosome?\nA: Where proteins are built.",
+    ]
+
+
+def test_lenient_parser_drops_questions_without_answers():
+    assert lenient_parse_flashcards("Q: Orphan?\n\nQ: Kept?\nA: Yes.\nQ: Cut off") == ["Q: Kept?\nA: Yes."]
+
+
+@pytest.mark.parametrize("size", [1, 3, 17])
+def test_text_cards_come_out_while_streaming(size):
+    text = "Q: One?\nA: 1\nQ: Two?\nA: 2\n"
+    parser = IncrementalCardParser()
+    assert feed_in_pieces(parser, text, size) == ["Q: One?\nA: 1", "Q: Two?\nA: 2"]
+
+
+WELL_FORMED = ("Here are your flashcards:\n\n"
+               "Q: What is ATP?\nA: The cell's energy carrier.\n\n"
+               "Q: Where is it made?  \nA: In the mitochondria.\nMostly in muscle cells.\n\n"
+               "Q: What is a ribosome?\nNote: in the cytoplasm\nA: Where proteins are built.\n")
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_well_formed_text_parses_exactly_as_the_strict_parser(size):
+    expected = parse_flashcards(WELL_FORMED)
+    assert len(expected) == 3
+    assert feed_in_pieces(IncrementalCardParser(), WELL_FORMED, size) == expected
+    assert parse_text_flashcards(WELL_FORMED) == expected
+
+
+def test_malformed_blocks_fall_back_to_lenient_parsing():
+    text = ("Q: What is ATP?\nA: The cell's energy carrier.\n\n"
+            "1. **Question:** What is a ribosome?\n**Answer:** Where proteins are built.\n"
+            "Q: What is DNA?\n\nA: The genetic code.\n\n"
+            "Q: What is RNA?\nA: A copy of a gene.")
+    assert parse_flashcards(text) == ["Q: What is ATP?\nA: The cell's energy carrier.",
+                                      "Q: What is RNA?\nA: A copy of a gene."]
+    assert parse_text_flashcards(text) == [
+        "Q: What is ATP?\nA: The cell's energy carrier.",
+        "Q: What is a ribosome?\nA: Where proteins are built.",
+        "Q: What is DNA?\nA: The genetic code.",
+        "Q: What is RNA?\nA: A copy of a gene.",
+    ]
+
+
+def test_cards_missing_their_blank_line_are_split():
+    assert parse_text_flashcards("Q: One?\nA: 1\nQ: Two?\nA: 2") == ["Q: One?\nA: 1", "Q: Two?\nA: 2"]
+
+
+CARDS = [{"question": "What is ATP?", "answer": "Energy {carrier}."}, {"question": "Q2?", "answer": "A \"2\"."}]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_json_cards_stream_out_as_objects_close(size):
+    text = json.dumps({"cards": CARDS})
+    parser = JsonCardParser()
+    cards = []
+    seen_before_end = False
+    for i in range(0, len(text), size):
+        cards += parser.feed(text[i:i + size])
+        seen_before_end = seen_before_end or (cards and i + size < len(text))
+    cards += parser.close()
+    assert cards == ["Q: What is ATP?\nA: Energy {carrier}.", 'Q: Q2?\nA: A "2".']
+    if size < len(text):
+        assert seen_before_end
+
+
+def test_json_cut_off_keeps_complete_cards():
+    text = json.dumps({"cards": CARDS})[:-20]
+    assert parse_json_flashcards(text) == ["Q: What is ATP?\nA: Energy {carrier}."]
+
+
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_broken_json_object_is_skipped(size):
+    text = '{"cards": [{"question":"a","answer": }, {"question": "b?", "answer": "c"}, {"q": "d?", "a": "e"}]}'
+    parser = JsonCardParser()
+    assert feed_in_pieces(parser, text, size) == ["Q: b?\nA: c", "Q: d?\nA: e"]
+
+
+def test_json_bracket_in_preamble_is_not_the_array():
+    text = 'Sure [see below]: {"cards": [{"question": "b?", "answer": "c"}]}'
+    assert parse_json_flashcards(text) == ["Q: b?\nA: c"]
+
+
+def test_text_answer_with_brackets_falls_back_to_lenient():
+    text = "Sure [see below]:\nQ: What is 2 + 2?\nA: 4 [basic arithmetic]."
+    assert parse_json_flashcards(text) == ["Q: What is 2 + 2?\nA: 4 [basic arithmetic]."]
+
+
+def test_json_items_without_strings_are_ignored():
+    text = '{"cards": [{"question": 1, "answer": "x"}, "loose", {"question": " ", "answer": "y"}]}'
+    assert parse_json_flashcards(text) == []
+
+
+def test_merge_drops_exact_duplicates_in_order():
+    assert merge_flashcards([["a", "b"], ["b", "c"], ["a"]]) == ["a", "b", "c"]
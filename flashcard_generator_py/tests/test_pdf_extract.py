@@ -0,0 +1,132 @@
+# test_pdf_extract.py
+
+import pytest
+
+import pdf_extract
+from pdf_extract import iter_page_texts, parse_page_range
+
+
+def write_pdf(path, page_count, fanout=None):
+    # One line of text per page. With fanout, pages hang off a tree of /Pages nodes with
+    # that many kids each (like most real PDFs); without, they're all kids of the root
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    next_id = [4]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0] - 1
+
+    def add_page(n, parent):
+        page_id, content_id = new_id(), new_id()
+        data = f"BT /F1 12 Tf 50 700 Td (Page number {n + 1} text) Tj ET".encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data)
+        objects[page_id] = (f"<< /Type /Page /Parent {parent} 0 R /MediaBox [0 0 612 792] "
+                            f"/Contents {content_id} 0 R >>").encode()
+        return page_id
+
+    def add_node(node_id, parent, numbers):
+        if not fanout or len(numbers) <= fanout:
+            kids = [add_page(n, node_id) for n in numbers]
+        else:
+            size = -(-len(numbers) // fanout)
+            kids = []
+            for i in range(0, len(numbers), size):
+                kid = new_id()
+                add_node(kid, node_id, numbers[i:i + size])
+                kids.append(kid)
+        parent_ref = f"/Parent {parent} 0 R " if parent else "/Resources << /Font << /F1 3 0 R >> >> "
+        objects[node_id] = (f"<< /Type /Pages {parent_ref}/Kids [{' '.join(f'{k} 0 R' for k in kids)}] "
+                            f"/Count {len(numbers)} >>").encode()
+
+    add_node(2, None, list(range(page_count)))
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (max(objects) + 1))
+        for number in range(1, max(objects) + 1):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (max(objects) + 1, xref))
+    return str(path)
+
+
+def page_number(text):
+    return int(text.split("Page number ")[1].split()[0])
+
+
+@pytest.mark.parametrize("fanout", [None, 3])
+def test_pages_come_back_in_order(tmp_path, fanout):
+    pdf = write_pdf(tmp_path / "doc.pdf", 20, fanout)
+    pages = list(iter_page_texts(pdf, workers=1))
+    assert [page_no for page_no, _ in pages] == list(range(20))
+    assert [page_number(text) for _, text in pages] == list(range(1, 21))
+
+
+@pytest.mark.parametrize("fanout", [None, 3])
+def test_page_range(tmp_path, fanout):
+    pdf = write_pdf(tmp_path / "doc.pdf", 20, fanout)
+    pages = list(iter_page_texts(pdf, "3-5,17", workers=1))
+    assert [page_number(text) for _, text in pages] == [3, 4, 5, 17]
+
+
+def test_batches_skip_the_pages_before_them(tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / "doc.pdf", 81, fanout=3)
+    from pdfminer.pdfpage import PDFPage
+    built = []
+    original = PDFPage.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(1)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(PDFPage, "__init__", counting_init)
+    texts = pdf_extract.extract_page_batch(pdf, [75, 76, 77])
+    assert [page_number(text) for text in texts] == [76, 77, 78]
+    assert len(built) == 3
+
+
+def test_parallel_matches_sequential(tmp_path):
+    pdf = write_pdf(tmp_path / "doc.pdf", 24, fanout=4)
+    sequential = list(iter_page_texts(pdf, workers=1))
+    parallel = list(iter_page_texts(pdf, workers=2))
+    assert parallel == sequential
+
+
+def test_stopping_early_cancels_pending_batches(tmp_path, monkeypatch):
+    pdf = write_pdf(tmp_path / "doc.pdf", 24)
+    pools = []
+
+    class RecordingPool(pdf_extract.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.futures = []
+            pools.append(self)
+
+        def submit(self, *args, **kwargs):
+            future = super().submit(*args, **kwargs)
+            self.futures.append(future)
+            return future
+
+        def shutdown(self, wait=True, **kwargs):
+            self.waited = wait
+            super().shutdown(wait=wait, **kwargs)
+
+    monkeypatch.setattr(pdf_extract, "ProcessPoolExecutor", RecordingPool)
+    pages = iter_page_texts(pdf, workers=2)
+    next(pages)
+    pages.close()
+    pool = pools[0]
+    assert pool.waited is False
+    assert any(future.cancelled() for future in pool.futures)
+    pool.shutdown(wait=True)
+
+
+def test_parse_page_range():
+    assert parse_page_range("3-5,8", 10) == [2, 3, 4, 7]
+    assert parse_page_range("-2", 10) == [0, 1]
+    assert parse_page_range(None, 3) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        parse_page_range("9-12", 10)
@@ -0,0 +1,113 @@
+# test_preprocess.py
+
+from preprocess import SkipReport, clean_pages, information_density, select_chunks, strip_headers, useful_chunks
+
+TIMELINE = """The First World War broke out in the summer of 1914.
+The Russian Revolution overthrew the Tsar in 1917.
+The Treaty of Versailles was signed in 1919.
+The stock market crash on Wall Street came in 1929.
+The Second World War ended in Europe in May 1945.
+The United Nations was founded in San Francisco in 1945.
+The Berlin Wall went up almost overnight in 1961.
+Apollo 11 landed the first people on the Moon in 1969.
+The Berlin Wall finally fell in November 1989."""
+
+FACTS = """Boiling point of water in Celsius is 100
+Freezing point of water in Celsius is 0
+Atomic number of carbon is 6
+Atomic number of oxygen is 8
+Number of protons in a sodium atom is 11
+Molar mass of water in grams per mole is 18
+pH of pure water at room temperature is 7
+Number of elements in the first row of the periodic table is 2
+Avogadro's number has an exponent of 23"""
+
+PROSE = ("Photosynthesis turns light into chemical energy. Plants take in carbon dioxide through "
+         "their leaves and water through their roots, and give off oxygen as a by-product. ") * 3
+
+REFERENCES = """References
+Smith, J. (2019). Cell biology. Oxford University Press.
+Jones, A. & Brown, B. (2020). Plant physiology, 3rd ed. Wiley.
+Lee, K., Park, S. and Kim, H. (2018). Light reactions. Nature, 12, 45-51.
+Garcia, M. et al. (2021). Carbon fixation. doi:10.1000/xyz123
+Wang, L. (2017). Chlorophyll. J. Bot. 4, pp. 10-19."""
+
+CONTENTS = "\n".join(f"Chapter {n} Topic number {n} ........ {n * 10}" for n in range(1, 9))
+
+
+def run(pages, **options):
+    report = SkipReport()
+    chunks = list(useful_chunks(pages, report=report, **options))
+    return chunks, report
+
+
+def test_timeline_is_not_taken_for_references():
+    chunks, report = run([TIMELINE])
+    assert chunks == [TIMELINE]
+    assert report.chars_skipped == 0
+
+
+def test_fact_list_is_not_taken_for_an_index():
+    chunks, report = run([FACTS])
+    assert chunks == [FACTS]
+    assert report.chars_skipped == 0
+
+
+def test_fact_pages_between_prose_are_kept():
+    pages = [PROSE, TIMELINE, FACTS, PROSE]
+    kept = "\n".join(clean_pages(pages))
+    assert TIMELINE in kept and FACTS in kept
+
+
+def test_references_after_a_heading_are_dropped_with_exact_counts():
+    page = PROSE + "\n" + REFERENCES
+    chunks, report = run([page])
+    assert "Smith, J." not in "".join(chunks)
+    assert [section['kind'] for section in report.sections] == ['references']
+    # The newline before the heading goes, the page's last line had none
+    assert report.chars_skipped == len(REFERENCES) + 1
+
+
+def test_whole_page_counts_never_exceed_the_page():
+    pages = [PROSE, REFERENCES]
+    _, report = run(pages)
+    assert report.sections[0]['chars'] == len(REFERENCES)
+    assert report.chars_skipped <= report.chars_in
+
+
+def test_contents_without_heading_only_near_the_start():
+    early = list(clean_pages([CONTENTS, PROSE]))
+    assert early[0] == ""
+    late = list(clean_pages([PROSE] * 6 + [CONTENTS]))
+    assert late[-1] == CONTENTS
+
+
+def test_nothing_left_means_nothing_is_dropped():
+    chunks, report = run([REFERENCES])
+    assert chunks == [REFERENCES]
+    assert report.chars_skipped == 0
+
+
+def test_running_headers_are_stripped():
+    bodies = [f"Lecture {word} covers {PROSE}" for word in ("one", "two", "three", "four", "five", "six")]
+    pages = [f"Biology 101 notes\n{body}\nPage {n}" for n, body in enumerate(bodies, 1)]
+    report = SkipReport()
+    cleaned = list(strip_headers(pages, report))
+    assert cleaned == bodies
+    assert report.header_lines == 12
+    assert report.header_chars == sum(len(page) - len(body) for page, body in zip(pages, bodies))
+
+
+def test_skipped_chunks_count_overlap_once():
+    numbers = "\n\n".join(" ".join(str(n * 7 + i) for i in range(40)) for n in range(30))
+    chunks = [PROSE] + list(useful_chunks([numbers], chunk_tokens=200, overlap_tokens=80, skip_boilerplate=False))
+    assert len(chunks) > 3
+    report = SkipReport()
+    sent = list(select_chunks(chunks, report))
+    assert sent == [PROSE]
+    assert sum(chunk['chars'] for chunk in report.low_density_chunks) <= len(numbers) + 2
+
+
+def test_density():
+    assert information_density(PROSE) > 0.9
+    assert information_density("1 2 3 4 5\n6 7 8 9 10\n" * 20) < 0.1
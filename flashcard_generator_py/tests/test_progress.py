@@ -0,0 +1,98 @@
+# test_progress.py
+
+import pytest
+
+import progress as progress_module
+from progress import Progress, describe, format_duration
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(progress_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_events_update_the_counts_and_reach_on_event():
+    events = []
+    progress = Progress(lambda event, snapshot: events.append((event, snapshot)))
+    assert list(progress.pages_iter(["page one", "page two"])) == ["page one", "page two"]
+    progress.emit('chunks', 3)
+    progress.emit('chunk_sent')
+    progress.emit('request')
+    progress.emit('tokens', prompt_tokens=120, completion_tokens=40)
+    progress.emit('card', 2)
+    progress.emit('chunk_done')
+    progress.emit('chunk_done', cached=True)
+    progress.emit('chunk_failed')
+    progress.emit('failed')
+    assert [event for event, _ in events] == ['page', 'page', 'chunks', 'chunk_sent', 'request', 'tokens', 'card',
+                                             'chunk_done', 'chunk_done', 'chunk_failed', 'failed']
+    snapshot = events[-1][1]
+    assert {name: snapshot[name] for name in ('pages', 'chunks_total', 'chunks_sent', 'chunks_done', 'chunks_cached',
+                                              'chunks_failed', 'cards', 'requests', 'prompt_tokens',
+                                              'completion_tokens', 'finished')} == {
+        'pages': 2, 'chunks_total': 3, 'chunks_sent': 1, 'chunks_done': 2, 'chunks_cached': 1, 'chunks_failed': 1,
+        'cards': 2, 'requests': 1, 'prompt_tokens': 120, 'completion_tokens': 40, 'finished': 'failed',
+    }
+    # Each event gets its own snapshot, not a view of the live counts
+    assert events[0][1]['pages'] == 1
+
+
+def test_fraction_counts_finished_and_failed_chunks():
+    progress = Progress()
+    assert progress.fraction() == 0.0
+    progress.emit('chunk_done')
+    # Total not known yet
+    assert progress.fraction() == 0.0
+    progress.emit('chunks', 4)
+    progress.emit('chunk_failed')
+    assert progress.fraction() == 0.5
+    for _ in range(4):
+        progress.emit('chunk_done')
+    assert progress.fraction() == 1.0
+
+
+def test_eta_is_paced_by_chunks_that_hit_the_api(clock):
+    progress = Progress()
+    assert progress.eta() is None
+    progress.emit('chunks', 10)
+    # Cached chunks are instant, so they alone don't give an estimate
+    progress.emit('chunk_done', cached=True)
+    progress.emit('chunk_done', cached=True)
+    assert progress.eta() is None
+    clock.now += 30
+    progress.emit('chunk_done')
+    progress.emit('chunk_done')
+    # 30s for 2 answered chunks, 6 chunks left
+    assert progress.eta() == pytest.approx(90)
+    for _ in range(6):
+        progress.emit('chunk_done')
+    assert progress.eta() is None
+
+
+def test_describe(clock):
+    progress = Progress()
+    progress.emit('page', 12)
+    assert describe(progress.snapshot()) == "12 pages read, 0 cards"
+    progress.emit('chunks', 4)
+    clock.now += 20
+    progress.emit('chunk_done')
+    progress.emit('chunk_failed')
+    progress.emit('card', 5)
+    progress.emit('tokens', prompt_tokens=1500, completion_tokens=500)
+    assert describe(progress.snapshot()) == "1/4 chunks, 5 cards, 2,000 tokens, 1 failed, ~40s left"
+
+
+def test_format_duration():
+    assert format_duration(4.6) == "5s"
+    assert format_duration(59.4) == "59s"
+    assert format_duration(125) == "2m05s"
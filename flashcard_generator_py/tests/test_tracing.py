@@ -0,0 +1,145 @@
+# test_tracing.py
+
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from clients import ClientManager
+from tracing import Tracer, format_summary, get_tracer, price_for, run_tracer, start_run
+
+
+@pytest.fixture(autouse=True)
+def fresh_run():
+    # Tests here swap the process-wide tracer; leave a clean one behind
+    yield
+    start_run()
+
+
+def test_price_for_takes_the_longest_matching_prefix():
+    assert price_for("gpt-4o") == tracing.PRICES["gpt-4o"]
+    assert price_for("gpt-4o-mini-2024-07-18") == tracing.PRICES["gpt-4o-mini"]
+    assert price_for("gpt-4.1-mini") == tracing.PRICES["gpt-4.1-mini"]
+    assert price_for("gpt-4.1-2025-04-14") == tracing.PRICES["gpt-4.1"]
+    assert price_for("llama3") is None
+
+
+def test_summary_adds_everything_up():
+    tracer = Tracer()
+    with tracer.span('api_request'):
+        pass
+    tracer.add_stage('api_request', 2.0)
+    tracer.add_stage('parse', 0.5)
+    tracer.count('requests', 3)
+    tracer.count('retries')
+    tracer.count('cache_hits', 1)
+    tracer.count('cache_misses', 3)
+    tracer.count('preprocessed_chars', 1000)
+    tracer.count('skipped_chars', 250)
+    tracer.add_usage("gpt-4o-mini", 1000000, 500000)
+    tracer.add_usage("gpt-4o-mini", 1000000, None)
+    tracer.add_usage("llama3", 10, 5)
+    summary = tracer.summary()
+    assert summary['stages']['api_request']['count'] == 2
+    assert summary['stages']['api_request']['seconds'] >= 2.0
+    assert summary['stages']['parse'] == {'count': 1, 'seconds': 0.5}
+    assert (summary['requests'], summary['retries'], summary['fallbacks']) == (3, 1, 0)
+    assert summary['cache_hit_rate'] == 0.25
+    assert summary['skipped_share'] == 0.25
+    assert summary['tokens'] == {"gpt-4o-mini": {"prompt": 2000000, "completion": 500000},
+                                 "llama3": {"prompt": 10, "completion": 5}}
+    assert (summary['prompt_tokens'], summary['completion_tokens']) == (2000010, 500005)
+    # 2M prompt tokens at $0.15 and 0.5M completion tokens at $0.60 per million
+    assert summary['cost'] == pytest.approx(0.60)
+    assert summary['unpriced_models'] == ["llama3"]
+    text = format_summary(summary)
+    assert "3 requests, 1 retries" in text
+    assert "about $0.6000 (no price for llama3)" in text
+    assert "Cache: 1 of 4 chunks from cache (25%)" in text
+
+
+def test_empty_summary_has_no_rates():
+    summary = Tracer().summary()
+    assert summary['cache_hit_rate'] is None and summary['skipped_share'] is None
+    assert "Cache:" not in format_summary(summary)
+
+
+def test_close_writes_otlp_spans(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = Tracer(str(path))
+    with tracer.span('document', document="notes.pdf") as span:
+        span['cards'] = 12
+        with tracer.span('api_request', stream=True, seconds=0.5):
+            pass
+    with pytest.raises(ValueError):
+        with tracer.span('write_html'):
+            raise ValueError("disk full")
+    tracer.close()
+
+    trace = json.loads(path.read_text())
+    [resource] = trace['resourceSpans']
+    assert resource['resource']['attributes'][0] == {"key": "service.name",
+                                                     "value": {"stringValue": "flashcard_generator"}}
+    spans = {span['name']: span for span in resource['scopeSpans'][0]['spans']}
+    assert set(spans) == {'document', 'api_request', 'write_html'}
+    assert {span['traceId'] for span in spans.values()} == {tracer.trace_id}
+    assert spans['api_request']['parentSpanId'] == spans['document']['spanId']
+    assert spans['document']['parentSpanId'] == ""
+    assert spans['write_html']['parentSpanId'] == ""
+    assert int(spans['document']['endTimeUnixNano']) >= int(spans['api_request']['endTimeUnixNano'])
+    attributes = {a['key']: a['value'] for a in spans['document']['attributes'] + spans['api_request']['attributes']}
+    assert attributes == {"document": {"stringValue": "notes.pdf"}, "cards": {"intValue": "12"},
+                          "stream": {"boolValue": True}, "seconds": {"doubleValue": 0.5}}
+    assert spans['write_html']['attributes'] == [{"key": "error", "value": {"stringValue": "ValueError"}}]
+
+
+def test_no_trace_file_keeps_no_spans():
+    tracer = Tracer()
+    with tracer.span('document'):
+        pass
+    assert tracer.spans == []
+    assert tracer.summary()['stages']['document']['count'] == 1
+
+
+def test_run_tracers_are_separate_but_feed_the_process_wide_one(tmp_path):
+    outer = start_run(str(tmp_path / "trace.json"))
+
+    async def job(name, tokens):
+        with run_tracer() as tracer:
+            await asyncio.sleep(0)
+            # A task started inside the run records into its tracer too
+            await asyncio.ensure_future(record(name, tokens))
+            return tracer.close()
+
+    async def record(name, tokens):
+        with get_tracer().span(name):
+            await asyncio.sleep(0)
+        get_tracer().add_usage("gpt-4o-mini", tokens, 0)
+
+    async def both():
+        return await asyncio.gather(job('first', 10), job('second', 20))
+
+    first, second = asyncio.run(both())
+    assert get_tracer() is outer
+    assert list(first['stages']) == ['first'] and first['prompt_tokens'] == 10
+    assert list(second['stages']) == ['second'] and second['prompt_tokens'] == 20
+    summary = outer.close()
+    assert set(summary['stages']) == {'first', 'second'}
+    assert summary['prompt_tokens'] == 30
+    spans = json.loads((tmp_path / "trace.json").read_text())['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert sorted(span['name'] for span in spans) == ['first', 'second']
+
+
+def test_run_tracer_follows_coroutines_onto_the_shared_loop():
+    manager = ClientManager()
+
+    async def current():
+        return get_tracer()
+
+    try:
+        with run_tracer() as tracer:
+            assert manager.run(current()) is tracer
+        assert manager.run(current()) is get_tracer()
+    finally:
+        manager.close()
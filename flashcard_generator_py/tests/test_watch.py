@@ -0,0 +1,132 @@
+# test_watch.py
+
+import asyncio
+import json
+import os
+
+import pytest
+
+import watch
+from jobs import DONE
+from watch import QUEUED, STATUS_FILE, FolderWatcher
+
+EXTENSIONS = ('.pdf', '.txt', '.md')
+
+
+def make_watcher(folders, process=None, **options):
+    async def write_deck(path, output_file):
+        with open(output_file, 'w') as f:
+            f.write(path)
+        return 1
+    return FolderWatcher([str(folder) for folder in folders], process or write_deck, EXTENSIONS, **options)
+
+
+def test_same_stem_inputs_get_their_own_decks(tmp_path):
+    watcher = make_watcher([tmp_path])
+    names = ["notes.pdf", "notes.txt", "notes.md", "notes.txt.pdf", "LECTURE.PDF", "notes.TXT.pdf"]
+    outputs = [os.path.basename(watcher.output_file(str(tmp_path / name))) for name in names]
+    assert outputs == ["notes.html", "notes.txt.html", "notes.md.html", "notes.txt.pdf.html", "LECTURE.html",
+                       "notes.TXT.pdf.html"]
+
+
+def test_paths_outside_the_watched_folders_are_ignored(tmp_path):
+    inner = tmp_path / "lectures" / "week1"
+    inner.mkdir(parents=True)
+    watcher = make_watcher([tmp_path / "lectures", inner])
+    assert watcher.folder_of(str(inner / "a.pdf")) == str(inner)
+    assert watcher.folder_of(str(tmp_path / "lectures" / "a.pdf")) == str(tmp_path / "lectures")
+    assert watcher.folder_of(str(tmp_path / "elsewhere.pdf")) is None
+    watcher.notice(str(tmp_path / "elsewhere.pdf"))
+    watcher.notice(str(tmp_path / "lectures2" / "a.pdf"))
+    assert watcher._settling == {}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch.time, 'monotonic', clock)
+    return clock
+
+
+def test_file_is_queued_once_it_stops_changing(tmp_path, clock):
+    async def scenario():
+        watcher = make_watcher([tmp_path], settle=2.0)
+        watcher._queue = asyncio.Queue()
+        path = tmp_path / "lecture.txt"
+        path.write_text("half")
+        watcher.notice(str(path))
+        watcher.check_settling()
+        clock.now += 1.5
+        # Still being copied in: the size changes, so the wait starts over
+        path.write_text("half and the rest")
+        watcher.check_settling()
+        clock.now += 1.5
+        watcher.check_settling()
+        assert watcher._queue.empty()
+        clock.now += 1.0
+        watcher.check_settling()
+        assert watcher._queue.get_nowait() == str(path)
+        assert watcher.entry(str(path))['state'] == QUEUED
+        # Noticing it again while queued doesn't queue it twice
+        watcher.notice(str(path))
+        assert watcher._settling == {}
+
+    asyncio.run(scenario())
+
+
+def test_deleted_while_settling_is_forgotten(tmp_path, clock):
+    watcher = make_watcher([tmp_path], settle=2.0)
+    path = tmp_path / "lecture.txt"
+    path.write_text("text")
+    watcher.notice(str(path))
+    watcher.check_settling()
+    path.unlink()
+    watcher.check_settling()
+    assert watcher._settling == {}
+
+
+def test_files_with_current_decks_are_left_alone(tmp_path, clock):
+    async def scenario():
+        watcher = make_watcher([tmp_path], settle=0)
+        watcher._queue = asyncio.Queue()
+        path = tmp_path / "lecture.pdf"
+        path.write_bytes(b"%PDF")
+        deck = tmp_path / "lecture.html"
+        deck.write_text("deck")
+        os.utime(str(deck), (os.path.getmtime(str(path)) + 10,) * 2)
+        watcher.notice(str(path))
+        watcher.check_settling()
+        watcher.check_settling()
+        assert watcher._queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_watching_builds_a_deck_for_each_file(tmp_path):
+    for name in ("notes.txt", "notes.md"):
+        (tmp_path / name).write_text(f"Some notes in {name}.")
+
+    async def scenario():
+        watcher = make_watcher([tmp_path], settle=0.05, poll=True, poll_interval=0.05)
+        task = asyncio.ensure_future(watcher.run())
+        for _ in range(200):
+            await asyncio.sleep(0.05)
+            entries = watcher.status[str(tmp_path)]
+            if len(entries) == 2 and all(entry['state'] == DONE for entry in entries.values()):
+                break
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert (tmp_path / "notes.txt.html").read_text() == str(tmp_path / "notes.txt")
+    assert (tmp_path / "notes.md.html").read_text() == str(tmp_path / "notes.md")
+    status = json.loads((tmp_path / STATUS_FILE).read_text())
+    assert {name: entry['state'] for name, entry in status['files'].items()} == {"notes.txt": DONE, "notes.md": DONE}
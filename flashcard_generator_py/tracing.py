@@ -0,0 +1,218 @@
+# tracing.py
+#
+# Timing spans, token usage and retry counts for finding where a slow run spends its time.
+# Spans are logged at DEBUG on the "flashcard_generator" logger as they finish; with a
+# trace file they are also written out as OTLP JSON (what OpenTelemetry collectors and
+# viewers read), and summary() adds everything up for the end-of-run report.
+#
+# start_run() swaps in a fresh process-wide tracer, and get_tracer() is what the pipeline
+# records into. A GUI job or a generate_flashcards() call runs under run_tracer(), which
+# gives it a tracer of its own (and its own summary) while still feeding the
+# process-wide one.
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("flashcard_generator")
+
+# USD per million (prompt, completion) tokens; the longest matching prefix wins
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_run_tracer = contextvars.ContextVar("run_tracer", default=None)
+
+
+def price_for(model):
+    matches = [prefix for prefix in PRICES if model.startswith(prefix)]
+    return PRICES[max(matches, key=len)] if matches else None
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    def __init__(self, trace_file=None, parent=None):
+        # parent gets everything recorded here as well
+        self.trace_file = trace_file
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stages = {}
+        self.counters = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        # Yields the attributes dict so the body can add results (cards=..., cached=...)
+        parent = _current_span.get()
+        span_id = os.urandom(8).hex()
+        token = _current_span.set(span_id)
+        start_ns = time.time_ns()
+        started = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            _current_span.reset(token)
+            self.add_stage(name, seconds)
+            logger.debug("%s took %.3fs %s", name, seconds, attributes)
+            self._add_span({
+                "traceId": self.trace_id,
+                "spanId": span_id,
+                "parentSpanId": parent or "",
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int(seconds * 1e9)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            })
+
+    def _add_span(self, span):
+        if self.trace_file:
+            with self._lock:
+                self.spans.append(span)
+        if self.parent:
+            self.parent._add_span(span)
+
+    def add_stage(self, name, seconds):
+        # Time that can't be a span of its own, like parsing that's interleaved with a stream
+        with self._lock:
+            count, total = self.stages.get(name, (0, 0.0))
+            self.stages[name] = (count + 1, total + seconds)
+        if self.parent:
+            self.parent.add_stage(name, seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        if self.parent:
+            self.parent.count(name, amount)
+
+    def add_usage(self, model, prompt_tokens, completion_tokens):
+        with self._lock:
+            prompt, completion = self.tokens.get(model, (0, 0))
+            self.tokens[model] = (prompt + (prompt_tokens or 0), completion + (completion_tokens or 0))
+        if self.parent:
+            self.parent.add_usage(model, prompt_tokens, completion_tokens)
+
+    def summary(self):
+        with self._lock:
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+            tokens = dict(self.tokens)
+        cost = 0.0
+        unpriced = []
+        for model, (prompt, completion) in tokens.items():
+            price = price_for(model)
+            if price is None:
+                unpriced.append(model)
+                continue
+            cost += (prompt * price[0] + completion * price[1]) / 1e6
+        hits, misses = counters.get("cache_hits", 0), counters.get("cache_misses", 0)
+        preprocessed, skipped = counters.get("preprocessed_chars", 0), counters.get("skipped_chars", 0)
+        return {
+            "elapsed": time.perf_counter() - self.started,
+            "stages": {name: {"count": count, "seconds": total} for name, (count, total) in stages.items()},
+            "requests": counters.get("requests", 0),
+            "retries": counters.get("retries", 0),
+            "fallbacks": counters.get("fallbacks", 0),
+            "hedges": counters.get("hedges", 0),
+            "failed_requests": counters.get("failed_requests", 0),
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+            "preprocessed_chars": preprocessed,
+            "skipped_chars": skipped,
+            "skipped_share": skipped / preprocessed if preprocessed else None,
+            "tokens": {model: {"prompt": p, "completion": c} for model, (p, c) in tokens.items()},
+            "prompt_tokens": sum(p for p, _ in tokens.values()),
+            "completion_tokens": sum(c for _, c in tokens.values()),
+            "cost": cost,
+            "unpriced_models": unpriced,
+        }
+
+    def close(self):
+        # Writes the trace file, if any; returns the summary
+        summary = self.summary()
+        logger.info("run summary: %s", json.dumps(summary))
+        if self.trace_file:
+            with self._lock:
+                spans = list(self.spans)
+            trace = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "flashcard_generator"}}]},
+                "scopeSpans": [{"scope": {"name": "flashcard_generator"}, "spans": spans}],
+            }]}
+            with open(self.trace_file, "w", encoding="utf-8") as f:
+                json.dump(trace, f)
+        return summary
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _run_tracer.get() or _tracer
+
+
+def start_run(trace_file=None):
+    global _tracer
+    _tracer = Tracer(trace_file)
+    return _tracer
+
+
+@contextmanager
+def run_tracer(trace_file=None):
+    # Code run inside, including tasks it starts, records into the yielded tracer. Worker
+    # threads don't inherit it: run_in_executor calls need contextvars.copy_context().run.
+    tracer = Tracer(trace_file, parent=get_tracer())
+    token = _run_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _run_tracer.reset(token)
+
+
+def format_summary(summary):
+    lines = [f"Run summary ({summary['elapsed']:.1f}s):"]
+    for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"  {name:<18} {stage['count']:>6} x {stage['seconds']:>9.2f}s")
+    lines.append("  (stages that run in parallel, like API requests, add up to more than the wall time)")
+    lines.append(f"  API: {summary['requests']} requests, {summary['retries']} retries, "
+                 f"{summary['fallbacks']} fallbacks, {summary['hedges']} hedged, {summary['failed_requests']} failed")
+    tokens = f"  Tokens: {summary['prompt_tokens']:,} prompt + {summary['completion_tokens']:,} completion"
+    if summary["prompt_tokens"] or summary["completion_tokens"]:
+        tokens += f", about ${summary['cost']:.4f}"
+        if summary["unpriced_models"]:
+            tokens += f" (no price for {', '.join(summary['unpriced_models'])})"
+    lines.append(tokens)
+    if summary["cache_hit_rate"] is not None:
+        lookups = summary["cache_hits"] + summary["cache_misses"]
+        lines.append(f"  Cache: {summary['cache_hits']} of {lookups} chunks from cache ({summary['cache_hit_rate']:.0%})")
+    if summary["skipped_share"] is not None:
+        lines.append(f"  Skipped before sending: {summary['skipped_chars']:,} of {summary['preprocessed_chars']:,} chars "
+                     f"({summary['skipped_share']:.0%}) of headers, contents, references, indexes and low-density text")
+    return "\n".join(lines)
@@ -0,0 +1,415 @@
+# watch.py
+#
+# Watch-folder mode: PDFs and text files dropped into the watched folders (or changed
+# there) get a deck written next to them. Changes come from inotify on Linux, or from
+# rescanning the folders every few seconds elsewhere and on network shares, where
+# inotify doesn't see writes made by other machines.
+#
+# A new file is only picked up once its size and mtime have stayed the same for `settle`
+# seconds, so half-copied PDFs aren't read. Ready files wait in a queue for a fixed
+# number of workers, and only the files that are settling, queued or running are held
+# in memory, so hundreds of files landing at once just make the queue longer.
+#
+# Every folder gets a status file (flashcard_status.json) saying what happened to each
+# file. It's also how a restarted watcher knows which files it already tried.
+
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+
+from exporters import deck_files, export_path
+from jobs import DEFAULT_JOBS, RUNNING, DONE, FAILED
+
+QUEUED = 'queued'
+
+STATUS_FILE = 'flashcard_status.json'
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+# The status file is rewritten at most this often, however many files change
+STATUS_INTERVAL = 1.0
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# No IN_MODIFY: a file being copied in fires it for every write, and settling only
+# needs to know the file exists, it stats it from then on
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+_EVENT = struct.Struct('iIII')
+
+
+def _hidden(name):
+    # Dotfiles, and the ~$ lock files Office and some sync tools leave next to open documents
+    return name.startswith(('.', '~$'))
+
+
+def iter_dirs(root):
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not _hidden(name)]
+        yield dirpath
+
+
+def iter_files(root, extensions):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not _hidden(name)]
+        for name in filenames:
+            if not _hidden(name) and name.lower().endswith(extensions):
+                yield os.path.join(dirpath, name)
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class InotifyWatcher:
+    name = 'inotify'
+
+    def __init__(self, notice, rescan, scan_dir):
+        self.notice = notice
+        self.rescan = rescan
+        self.scan_dir = scan_dir
+        self.fd = None
+        self.dirs = {}
+
+    def open(self, roots):
+        # Raises OSError where inotify isn't available, so the caller can fall back to polling
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise("inotify_init1")
+        try:
+            for root in roots:
+                self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _raise(self, what):
+        errno = self._get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+    def add_tree(self, root):
+        for path in iter_dirs(root):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                # ENOSPC here means fs.inotify.max_user_watches is too low for this tree
+                self._raise(f"watching {path}")
+            self.dirs[wd] = path
+
+    def read_events(self):
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, pos)
+                name = os.fsdecode(data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0'))
+                pos += _EVENT.size + length
+                self.handle(wd, mask, name)
+
+    def handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped, so nothing is known about what changed
+            self.rescan()
+            return
+        if mask & IN_IGNORED:
+            self.dirs.pop(wd, None)
+            return
+        folder = self.dirs.get(wd)
+        if folder is None or not name or _hidden(name):
+            return
+        path = os.path.join(folder, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # Files can land in a new folder before its watch exists
+                try:
+                    self.add_tree(path)
+                except OSError as e:
+                    print(f"Can't watch {path}: {e}")
+                self.scan_dir(path)
+            return
+        self.notice(path)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.fd, self.read_events)
+        try:
+            await loop.create_future()
+        finally:
+            loop.remove_reader(self.fd)
+            self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PollingWatcher:
+    name = 'polling'
+
+    def __init__(self, notice, extensions, interval=DEFAULT_POLL_INTERVAL):
+        self.notice = notice
+        self.roots = []
+        self.extensions = extensions
+        self.interval = interval
+        self.seen = {}
+
+    def open(self, roots):
+        # The first scan is the watcher's own, files already there are its caller's job
+        self.roots = roots
+        self.seen = self.snapshot()
+
+    def snapshot(self):
+        seen = {}
+        for root in self.roots:
+            for path in iter_files(root, self.extensions):
+                seen[path] = file_signature(path)
+        return seen
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            # Walking a big share takes a while, so it happens off the event loop
+            seen = await loop.run_in_executor(None, self.snapshot)
+            for path, signature in seen.items():
+                if self.seen.get(path) != signature:
+                    self.notice(path)
+            for path in self.seen.keys() - seen.keys():
+                self.notice(path)
+            self.seen = seen
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    def __init__(self, folders, process, extensions, jobs=DEFAULT_JOBS, formats=('html',), settle=DEFAULT_SETTLE_SECONDS,
+                 poll=False, poll_interval=DEFAULT_POLL_INTERVAL, on_update=None):
+        # process(path, output_file) is a coroutine function returning the number of cards;
+        # on_update(path, entry) is called whenever a file's status entry changes
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.process = process
+        self.extensions = tuple(extensions)
+        self.jobs = jobs
+        self.formats = list(formats)
+        self.settle = settle
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.on_update = on_update
+        self.watcher = None
+        self.status = {folder: self.load_status(folder) for folder in self.folders}
+        self._settling = {}
+        self._queue = None
+        self._queued = set()
+        self._running = set()
+        self._changed = set()
+        self._dirty = set()
+
+    def load_status(self, folder):
+        try:
+            with open(os.path.join(folder, STATUS_FILE), encoding='utf-8') as f:
+                files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            return {}
+        # A file that was queued or running when the last watcher stopped gets another go,
+        # and files deleted since then are forgotten
+        return {name: entry for name, entry in files.items()
+                if entry.get('state') in (DONE, FAILED) and os.path.exists(os.path.join(folder, name))}
+
+    def output_file(self, path):
+        # lecture.pdf -> lecture.html, whatever the case of .pdf. Other inputs keep their extension (notes.txt ->
+        # notes.txt.html), so notes.pdf, notes.txt and notes.md side by side get a deck
+        # each; so does a PDF named like one of them (notes.txt.pdf -> notes.txt.pdf.html)
+        stem, ext = os.path.splitext(path)
+        if ext.lower() == '.pdf' and not stem.lower().endswith(self.extensions):
+            return stem + '.html'
+        return path + '.html'
+
+    def folder_of(self, path):
+        # Most specific folder first, for when one watched folder is inside another;
+        # None for a path outside all of them
+        return max((folder for folder in self.folders if path.startswith(folder + os.sep)), key=len, default=None)
+
+    def entry(self, path):
+        folder = self.folder_of(path)
+        return self.status[folder].get(os.path.relpath(path, folder))
+
+    def update(self, path, state, **fields):
+        folder = self.folder_of(path)
+        name = os.path.relpath(path, folder)
+        if state is None:
+            if self.status[folder].pop(name, None) is not None:
+                self._dirty.add(folder)
+            return
+        entry = self.status[folder].setdefault(name, {})
+        entry.update(state=state, updated=time.time(), **fields)
+        self._dirty.add(folder)
+        if self.on_update:
+            self.on_update(path, entry)
+
+    def is_input(self, path):
+        name = os.path.basename(path)
+        return not _hidden(name) and name.lower().endswith(self.extensions)
+
+    def notice(self, path):
+        # Called by the watchers for anything that might have changed; stat()ing it is the settle loop's job
+        if not self.is_input(path) or path in self._queued or self.folder_of(path) is None:
+            return
+        if path in self._running:
+            self._changed.add(path)
+        elif path not in self._settling:
+            self._settling[path] = (None, 0.0)
+
+    def scan_dir(self, root):
+        for path in iter_files(root, self.extensions):
+            self.notice(path)
+
+    def rescan(self):
+        for folder in self.folders:
+            self.scan_dir(folder)
+
+    def up_to_date(self, path, signature):
+        entry = self.entry(path)
+        if entry and [entry.get('size'), entry.get('mtime_ns')] == list(signature):
+            # Done, or failed and not changed since: trying again would fail the same way
+            return True
+        deck = export_path(self.output_file(path), self.formats[0])
+        try:
+            # A deck newer than its source was made by us before (or by hand), either way it's current
+            return os.path.getmtime(deck) * 1e9 >= signature[1]
+        except OSError:
+            return False
+
+    def check_settling(self):
+        now = time.monotonic()
+        for path, (old, since) in list(self._settling.items()):
+            signature = file_signature(path)
+            if signature is None:
+                del self._settling[path]
+                self.update(path, None)
+            elif signature != old:
+                self._settling[path] = (signature, now)
+            elif now - since >= self.settle:
+                del self._settling[path]
+                if not self.up_to_date(path, signature):
+                    self._queued.add(path)
+                    self._queue.put_nowait(path)
+                    self.update(path, QUEUED, size=signature[0], mtime_ns=signature[1])
+
+    async def settle_loop(self):
+        while True:
+            self.check_settling()
+            await asyncio.sleep(min(0.5, self.settle / 2) or 0.1)
+
+    async def worker(self):
+        while True:
+            path = await self._queue.get()
+            self._queued.discard(path)
+            signature = file_signature(path)
+            if signature is None:
+                self.update(path, None)
+                continue
+            self._running.add(path)
+            self.update(path, RUNNING, size=signature[0], mtime_ns=signature[1], error=None)
+            output_file = self.output_file(path)
+            try:
+                cards = await self.process(path, output_file)
+            except asyncio.CancelledError:
+                self.update(path, QUEUED)
+                raise
+            except Exception as e:
+                self.update(path, FAILED, error=f"{type(e).__name__}: {e}")
+            else:
+                folder = self.folder_of(path)
+                self.update(path, DONE, cards=cards,
+                            outputs=[os.path.relpath(f, folder) for f in deck_files(output_file, self.formats)])
+            finally:
+                self._running.discard(path)
+            if path in self._changed:
+                # Changed again while its deck was being made; settle it again from scratch
+                self._changed.discard(path)
+                self.notice(path)
+
+    def write_status(self):
+        for folder in list(self._dirty):
+            self._dirty.discard(folder)
+            files = self.status[folder]
+            counts = {}
+            for entry in files.values():
+                counts[entry['state']] = counts.get(entry['state'], 0) + 1
+            status = {
+                'folder': folder,
+                'watcher': self.watcher.name if self.watcher else None,
+                'updated': time.time(),
+                'counts': counts,
+                'files': files,
+            }
+            path = os.path.join(folder, STATUS_FILE)
+            try:
+                with open(path + '.part', 'w', encoding='utf-8') as f:
+                    json.dump(status, f, indent=1)
+                os.replace(path + '.part', path)
+            except OSError as e:
+                print(f"Can't write {path}: {e}")
+
+    async def status_loop(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            self.write_status()
+
+    def open_watcher(self):
+        if not self.poll:
+            watcher = InotifyWatcher(self.notice, self.rescan, self.scan_dir)
+            try:
+                watcher.open(self.folders)
+                return watcher
+            except OSError as e:
+                print(f"inotify not available ({e}), checking for changes every {self.poll_interval:g}s instead")
+        watcher = PollingWatcher(self.notice, self.extensions, self.poll_interval)
+        watcher.open(self.folders)
+        return watcher
+
+    async def run(self):
+        # Runs until cancelled
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        # Watch first, then scan, so nothing dropped in between is missed
+        self.watcher = await loop.run_in_executor(None, self.open_watcher)
+        self.rescan()
+        for folder in self.folders:
+            self._dirty.add(folder)
+        tasks = [asyncio.ensure_future(self.watcher.run()), asyncio.ensure_future(self.settle_loop()),
+                 asyncio.ensure_future(self.status_loop())]
+        tasks += [asyncio.ensure_future(self.worker()) for _ in range(self.jobs)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.watcher.close()
+            self.write_status()